@@ -1,3 +1,32 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 
-# Create your tests here.
+
+@override_settings(ROOT_URLCONF='authentication.urls')
+class JWTLoginTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='tester', password='secret')
+
+    def test_login_issues_access_and_refresh_tokens(self):
+        response = self.client.post('/login/', {'username': 'tester', 'password': 'secret'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AccessToken(response.data['access'])['user_id'], self.user.pk)
+        self.assertIn('refresh', response.data)
+
+    def test_refresh_endpoint_issues_a_new_access_token(self):
+        login = self.client.post('/login/', {'username': 'tester', 'password': 'secret'})
+
+        response = self.client.post(reverse('token_refresh'), {'refresh': login.data['refresh']})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AccessToken(response.data['access'])['user_id'], self.user.pk)
+
+    def test_refresh_endpoint_rejects_invalid_tokens(self):
+        response = self.client.post(reverse('token_refresh'), {'refresh': 'invalid'})
+        self.assertEqual(response.status_code, 401)
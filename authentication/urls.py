@@ -1,6 +1,7 @@
 # authentication/urls.py
 
 from django.urls import path, re_path
+from rest_framework_simplejwt.views import TokenRefreshView
 
 # from authentication import views
 from authentication.views import user
@@ -12,4 +13,6 @@ urlpatterns = [
             name='token_obtain_pair'),
     re_path('profile/', user.profile,
             name='token_obtain_pair'),
+    path('token/refresh/', TokenRefreshView.as_view(),
+         name='token_refresh'),
 ]
@@ -9,6 +9,7 @@ from rest_framework.decorators import (api_view, authentication_classes,
                                        permission_classes)
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework_simplejwt.tokens import RefreshToken
 
 from authentication.serializers.user import UserSerializer
 
@@ -20,8 +21,10 @@ def login(request):
     if not user.check_password(request.data['password']):
         return Response({"Error: ": "Invalid username or password"}, status=status.HTTP_400_BAD_REQUEST)
     token, created = Token.objects.get_or_create(user=user)
+    refresh = RefreshToken.for_user(user)
     serializer_user = UserSerializer(instance=user)
-    return Response({"token:": token.key, "user": serializer_user.data}, status=status.HTTP_200_OK)
+    return Response({"token:": token.key, "access": str(refresh.access_token), "refresh": str(refresh),
+                     "user": serializer_user.data}, status=status.HTTP_200_OK)
 
 
 @api_view(['POST'])
@@ -0,0 +1,157 @@
+# core/db_router.py
+import hashlib
+import itertools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+# Replica alias serving the queries of the current request, None for the primary
+current_replica = ContextVar('current_replica', default=None)
+
+_round_robin = itertools.count()
+
+
+def get_replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def get_pin_seconds():
+    return getattr(settings, 'DATABASE_PRIMARY_PIN_SECONDS', 5)
+
+
+def next_replica():
+    """
+    Return the next configured replica alias in round-robin order, or None if there is none.
+    """
+    replicas = get_replicas()
+    if not replicas:
+        return None
+    return replicas[next(_round_robin) % len(replicas)]
+
+
+@contextmanager
+def use_replica(alias):
+    """
+    Route the reads of the enclosed block to the replica `alias` (None for the primary).
+    """
+    token = current_replica.set(alias)
+    try:
+        yield
+    finally:
+        current_replica.reset(token)
+
+
+def iter_on_replica(iterable, alias):
+    """
+    Iterate `iterable` with its reads routed to the replica `alias`.
+
+    The alias is set around each step rather than across `yield`, so it never leaks
+    into the code consuming the items.
+    """
+    iterator = iter(iterable)
+    while True:
+        with use_replica(alias):
+            item = next(iterator, StopIteration)
+        if item is StopIteration:
+            return
+        yield item
+
+
+async def aiter_on_replica(iterable, alias):
+    """
+    Async variant of `iter_on_replica`.
+    """
+    iterator = iterable.__aiter__()
+    while True:
+        with use_replica(alias):
+            try:
+                item = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+        yield item
+
+
+class ReplicaRouter:
+    """
+    Send reads to the replica selected for the current request, everything else to the primary.
+
+    Reads inside a transaction on the primary stay on the primary, so a read-modify-write
+    never mixes replica rows with its own writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = current_replica.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # Instances read from a replica are saved to the primary too
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Serve read-only requests from the replicas, round-robin, keeping read-your-writes.
+
+    After a client sends a write it is pinned to the primary for
+    `DATABASE_PRIMARY_PIN_SECONDS`, covering the replication lag. Clients are identified by
+    their `Authorization` header, or their address when they send none; pins live in the
+    default cache, which must be shared for them to reach every worker. Streamed bodies
+    read from the request's replica too.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        alias = self.replica_for(request)
+        with use_replica(alias):
+            response = self.get_response(request)
+        return self.finish(request, response, alias)
+
+    async def __acall__(self, request):
+        alias = self.replica_for(request)
+        with use_replica(alias):
+            response = await self.get_response(request)
+        return self.finish(request, response, alias)
+
+    @staticmethod
+    def pin_key(request):
+        client = request.headers.get('Authorization') or request.META.get('REMOTE_ADDR', '')
+        return 'db:primary-pin:' + hashlib.md5(client.encode(), usedforsecurity=False).hexdigest()
+
+    def replica_for(self, request):
+        if request.method not in SAFE_METHODS or not get_replicas():
+            return None
+        if caches['default'].get(self.pin_key(request)):
+            return None
+        return next_replica()
+
+    def finish(self, request, response, alias):
+        if request.method not in SAFE_METHODS and get_replicas():
+            caches['default'].set(self.pin_key(request), True, get_pin_seconds())
+        if response.streaming and alias is not None:
+            # Streamed bodies run their queries after the view returned
+            if response.is_async:
+                response.streaming_content = aiter_on_replica(response.streaming_content, alias)
+            else:
+                response.streaming_content = iter_on_replica(response.streaming_content, alias)
+        return response
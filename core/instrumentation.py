@@ -0,0 +1,257 @@
+# core/instrumentation.py
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+# Upper bounds of the histogram buckets; the implicit last bucket is +Inf
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# Label sets beyond this limit are folded into route="other", which bounds memory
+# even if unexpected route names show up
+MAX_SERIES = 500
+
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed buckets, in the Prometheus exposition model.
+    """
+
+    __slots__ = ('bounds', 'counts', 'total', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def render(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.bounds + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.total:.6f}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class Counter:
+    """
+    Monotonic counter with a small, fixed set of label values.
+    """
+
+    def __init__(self, name, description, lock):
+        self.name = name
+        self.description = description
+        self.lock = lock
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self.values.get(tuple(sorted(labels.items())), 0)
+
+    def render(self):
+        yield f'# HELP {self.name} {self.description}'
+        yield f'# TYPE {self.name} counter'
+        for key, value in sorted(self.values.items()):
+            labels = ','.join(f'{label}="{escape_label(str(label_value))}"' for label, label_value in key)
+            yield f'{self.name}{{{labels}}} {value}'
+
+
+class MetricsRegistry:
+    """
+    In-process request metrics, aggregated per (route, method, status), and counters
+    registered by the applications.
+
+    Each worker process keeps its own registry; Prometheus aggregates across workers
+    when scraping every instance.
+    """
+
+    metrics = (
+        ('http_request_duration_seconds', 'Wall time of HTTP requests.', DURATION_BUCKETS),
+        ('http_request_db_queries', 'SQL queries issued per HTTP request.', QUERY_COUNT_BUCKETS),
+        ('http_request_db_duration_seconds', 'Time spent in SQL per HTTP request.', DURATION_BUCKETS),
+    )
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+        self.counters = {}
+
+    def counter(self, name, description):
+        """
+        Return the counter registered under `name`, creating it on first use.
+        """
+        with self.lock:
+            return self.counters.setdefault(name, Counter(name, description, self.lock))
+
+    def observe(self, route, method, status, duration, queries, db_duration):
+        key = (route, method if method in METHODS else 'OTHER', str(status))
+        with self.lock:
+            histograms = self.series.get(key)
+            if histograms is None:
+                if len(self.series) >= MAX_SERIES:
+                    key = ('other',) + key[1:]
+                histograms = self.series.setdefault(
+                    key, tuple(Histogram(bounds) for _, _, bounds in self.metrics))
+            for histogram, value in zip(histograms, (duration, queries, db_duration)):
+                histogram.observe(value)
+
+    def render(self):
+        """
+        Render every series in the Prometheus text exposition format.
+        """
+        lines = []
+        with self.lock:
+            for index, (name, description, _) in enumerate(self.metrics):
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for (route, method, status), histograms in sorted(self.series.items()):
+                    labels = f'route="{escape_label(route)}",method="{method}",status="{status}"'
+                    lines.extend(histograms[index].render(name, labels))
+            for counter in self.counters.values():
+                lines.extend(counter.render())
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self.lock:
+            self.series.clear()
+            for counter in self.counters.values():
+                counter.values.clear()
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+
+class QueryTimer:
+    """
+    Database execute wrapper counting the queries of a request and the time spent in them.
+    """
+
+    __slots__ = ('queries', 'duration')
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.queries += 1
+
+
+# Timer of the request being handled. Context variables follow the request into the
+# threads `sync_to_async` runs the ORM in, which per-thread connections do not.
+current_timer = ContextVar('current_timer', default=None)
+
+
+def time_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper feeding the timer of the current request, if any.
+    """
+    timer = current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+def install_query_timer(connection, **kwargs):
+    """
+    Install `time_query` on a database connection, once.
+
+    It goes first in `execute_wrappers` so `execute_wrapper()` blocks, which pop the
+    last wrapper on exit, cannot remove it.
+    """
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, time_query)
+
+
+# Connections are per thread; each one gets the wrapper when it connects
+connection_created.connect(install_query_timer)
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+class InstrumentationMiddleware:
+    """
+    Record wall time, SQL query count and SQL time of each request.
+
+    The measurements are added to the response as `Server-Timing` metrics and aggregated
+    in `registry`, which the `/metrics` endpoint exposes. Streaming responses are measured
+    up to the point their headers are returned.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Connections of this thread may have connected before the signal was hooked
+        for alias in connections:
+            install_query_timer(connections[alias])
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer, started = QueryTimer(), time.perf_counter()
+        token = current_timer.set(timer)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        return self.finish(request, response, timer, started)
+
+    async def __acall__(self, request):
+        timer, started = QueryTimer(), time.perf_counter()
+        token = current_timer.set(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        return self.finish(request, response, timer, started)
+
+    def finish(self, request, response, timer, started):
+        duration = time.perf_counter() - started
+        response['Server-Timing'] = (
+            f'app;dur={duration * 1000:.2f}, '
+            f'db;dur={timer.duration * 1000:.2f};desc="{timer.queries} queries"')
+        registry.observe(route_name(request), request.method, response.status_code,
+                         duration, timer.queries, timer.duration)
+        return response
+
+
+def metrics(request):
+    """
+    Expose the aggregated request metrics in the Prometheus text format.
+    """
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
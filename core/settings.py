@@ -80,6 +80,8 @@ SIMPLE_JWT = {
 }
 
 MIDDLEWARE = [
+    'core.instrumentation.InstrumentationMiddleware',
+    'core.db_router.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -117,9 +119,45 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+    },
+    # Local stand-in for a read replica; copy db.sqlite3 here and list it in
+    # DATABASE_REPLICAS to route read-only requests to it
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.replica.sqlite3',
+    },
+}
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+# Aliases serving GET/HEAD/OPTIONS requests, round-robin; empty sends every query to 'default'
+DATABASE_REPLICAS = []
+# Seconds a client reads from the primary after a write, covering the replication lag
+DATABASE_PRIMARY_PIN_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Local memory is per process; use a shared backend (Redis, Memcached) when running
+# several workers so invalidations reach all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'TIMEOUT': 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
+# Per-customer read cache of loans, payments and balances
+PAYMENTS_CACHE_ALIAS = 'default'
+PAYMENTS_CACHE_TIMEOUT = 60
+# Portfolio analytics report, also discarded on every loan or payment write
+PAYMENTS_ANALYTICS_TIMEOUT = 300
+# Age in seconds a change must reach before the ledger feed and delta listings return it
+PAYMENTS_SYNC_DELAY = 0
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
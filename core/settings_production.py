@@ -0,0 +1,97 @@
+"""
+Production settings, configured from the environment.
+
+Select it with `DJANGO_SETTINGS_MODULE=core.settings_production`. The database is read
+from the `DB_*` variables of `.env_example` (PostgreSQL by default), connections are
+kept open between requests and every statement runs under a server-side timeout. The
+default cache is shared by the workers through the servers of `CACHE_LOCATION`.
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from core.settings import *  # noqa: F401,F403
+
+
+def env_bool(name, default=False):
+    return os.environ.get(name, str(default)).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_list(name, default=''):
+    return [item.strip() for item in os.environ.get(name, default).split(',') if item.strip()]
+
+
+SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+
+# DEBUG also records every executed query in `connection.queries`, which long-lived
+# workers keep growing; production never enables it
+DEBUG = env_bool('DJANGO_DEBUG')
+
+ALLOWED_HOSTS = env_list('DJANGO_ALLOWED_HOSTS', 'localhost')
+
+
+# Database
+# https://docs.djangoproject.com/en/4.2/ref/databases/#postgresql-notes
+
+DATABASES = {
+    'default': {
+        'ENGINE': os.environ.get('DB_ENGINE', 'django.db.backends.postgresql'),
+        'NAME': os.environ.get('DB_NAME', 'postgres'),
+        'USER': os.environ.get('DB_USER', 'postgres'),
+        'PASSWORD': os.environ.get('DB_PASS', ''),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        # Reuse each worker's connection across requests instead of opening one per request
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        # Check a reused connection before the request's first query, replacing it if it dropped
+        'CONN_HEALTH_CHECKS': True,
+        # `.iterator()` (exports, streaming lists) reads through server-side cursors; they
+        # must be disabled behind a transaction-pooling PgBouncer
+        'DISABLE_SERVER_SIDE_CURSORS': env_bool('DB_DISABLE_SERVER_SIDE_CURSORS'),
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 5)),
+            # Per-connection session settings, in milliseconds
+            'options': (
+                f"-c statement_timeout={int(os.environ.get('DB_STATEMENT_TIMEOUT', 30000))} "
+                f"-c idle_in_transaction_session_timeout="
+                f"{int(os.environ.get('DB_IDLE_IN_TRANSACTION_TIMEOUT', 60000))}"
+            ),
+        },
+    }
+}
+
+if 'postgresql' not in DATABASES['default']['ENGINE']:
+    DATABASES['default'].pop('OPTIONS')
+
+# Read replicas: one alias per host of DB_REPLICA_HOSTS, sharing the primary's settings
+DATABASE_REPLICAS = []
+for index, host in enumerate(env_list('DB_REPLICA_HOSTS'), start=1):
+    DATABASES[f'replica_{index}'] = {**DATABASES['default'], 'HOST': host}
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
+DATABASE_PRIMARY_PIN_SECONDS = int(os.environ.get('DB_PRIMARY_PIN_SECONDS', 5))
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# Primary pins and the per-customer read cache live in the default cache, so every
+# worker must share it; CACHE_LOCATION lists the Redis (or memcached) servers
+CACHE_LOCATION = env_list('CACHE_LOCATION')
+if CACHE_LOCATION:
+    CACHES = {
+        'default': {
+            'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.redis.RedisCache'),
+            'LOCATION': CACHE_LOCATION,
+            'TIMEOUT': int(os.environ.get('CACHE_TIMEOUT', 60)),
+            'KEY_PREFIX': os.environ.get('CACHE_KEY_PREFIX', 'payments'),
+        }
+    }
+elif DATABASE_REPLICAS:
+    raise ImproperlyConfigured(
+        'DB_REPLICA_HOSTS requires CACHE_LOCATION: primary pins kept in a per-process cache '
+        'do not reach the other workers.')
+
+# Longer than the longest transaction writing loans, payments or ledger entries
+PAYMENTS_SYNC_DELAY = int(os.environ.get('PAYMENTS_SYNC_DELAY', 5))
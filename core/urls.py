@@ -2,6 +2,7 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from core.instrumentation import metrics
 from doc.swagger import schema_view
 
 urlpatterns = [
@@ -11,6 +12,9 @@ urlpatterns = [
     path('payments/', include('payments.urls')),
     path('auth/', include('authentication.urls')),
 
+    # Prometheus metrics
+    path('metrics', metrics, name='metrics'),
+
     # Swagger UI
     path('swagger/', schema_view.with_ui('swagger',
          cache_timeout=0), name='schema-swagger-ui'),
@@ -0,0 +1,9 @@
+# payments/authentication.py
+from rest_framework.authentication import TokenAuthentication
+from rest_framework_simplejwt.authentication import \
+    JWTStatelessUserAuthentication
+
+# Signed access tokens (`Authorization: Bearer <access>`) are verified without a
+# database round-trip; legacy `Authorization: Token <key>` clients still work, at the
+# cost of the token table lookup.
+API_AUTHENTICATION_CLASSES = [JWTStatelessUserAuthentication, TokenAuthentication]
@@ -0,0 +1,149 @@
+# payments/benchmarks/seed.py
+import random
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from payments.models import Customer, Loan, LoanLedgerEntry, Payment, PaymentDetail
+
+# Portfolio sizes: customers, loans and payments
+SCALES = {
+    'smoke': {'customers': 20, 'loans': 100, 'payments': 40},
+    '1k': {'customers': 100, 'loans': 1000, 'payments': 500},
+    '100k': {'customers': 10000, 'loans': 100000, 'payments': 50000},
+    '1m': {'customers': 100000, 'loans': 1000000, 'payments': 500000},
+}
+
+# Loan status mix of a synthetic portfolio: (status, weight)
+STATUS_WEIGHTS = ((2, 60), (1, 15), (4, 20), (3, 5))
+
+CUSTOMERS_PER_CHUNK = 1000
+BATCH_SIZE = 5000
+
+
+def spread(total, buckets, index):
+    """
+    Number of items of bucket `index` when `total` items are spread evenly over `buckets`.
+    """
+    return total // buckets + (1 if index < total % buckets else 0)
+
+
+class PortfolioSeeder:
+    """
+    Generate a synthetic portfolio of customers, loans and payments with bulk inserts.
+
+    Customers are generated in chunks, together with their loans and payments, so memory
+    is bounded by the chunk size. Customer debt summaries are computed in memory and
+    inserted consistent with the generated loans, and each loan with an outstanding
+    amount gets its opening ledger entry.
+    """
+
+    def __init__(self, customers, loans, payments, seed=0, batch_size=BATCH_SIZE):
+        self.customers = customers
+        self.loans = loans
+        self.payments = payments
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+        self.token = uuid.uuid4().hex[:8]
+        self.now = timezone.now()
+        self.statuses = [status for status, _ in STATUS_WEIGHTS]
+        self.weights = [weight for _, weight in STATUS_WEIGHTS]
+
+    def run(self):
+        """
+        Insert the portfolio.
+
+        Returns:
+            dict: Number of rows inserted per model, elapsed time and rows/s.
+        """
+        started = time.perf_counter()
+        created = {'customers': 0, 'loans': 0, 'ledger_entries': 0, 'payments': 0, 'payment_details': 0}
+
+        for start in range(0, self.customers, CUSTOMERS_PER_CHUNK):
+            indexes = range(start, min(start + CUSTOMERS_PER_CHUNK, self.customers))
+            with transaction.atomic():
+                for key, count in self._seed_chunk(indexes).items():
+                    created[key] += count
+
+        elapsed = time.perf_counter() - started
+        rows = sum(created.values())
+        return {**created, 'elapsed_seconds': round(elapsed, 3),
+                'rows_per_second': round(rows / elapsed, 1) if elapsed else None}
+
+    def _seed_chunk(self, indexes):
+        customers, loans_by_customer = [], []
+        for index in indexes:
+            loans = [self._loan(index, number) for number in range(spread(self.loans, self.customers, index))]
+            total_debt = sum((loan.outstanding for loan in loans if loan.status in Loan.OPEN_STATUSES), Decimal('0'))
+            customers.append(Customer(
+                status=1, score=total_debt + self.random.randint(100, 10000), preapproved_at=self.now,
+                total_debt=total_debt, active_loans=sum(loan.status == 2 for loan in loans),
+                debt_updated_at=self.now))
+            loans_by_customer.append(loans)
+
+        Customer.objects.bulk_create(customers, batch_size=self.batch_size)
+        for customer, loans in zip(customers, loans_by_customer):
+            for loan in loans:
+                loan.customer = customer
+        loans = [loan for customer_loans in loans_by_customer for loan in customer_loans]
+        Loan.objects.bulk_create(loans, batch_size=self.batch_size)
+        entries = [
+            LoanLedgerEntry(loan=loan, customer_id=loan.customer_id, kind=1, amount=loan.outstanding,
+                            balance=loan.outstanding)
+            for loan in loans if loan.outstanding
+        ]
+        LoanLedgerEntry.objects.bulk_create(entries, batch_size=self.batch_size)
+
+        payments, details = [], []
+        for index, customer, customer_loans in zip(indexes, customers, loans_by_customer):
+            for number in range(spread(self.payments, self.customers, index)):
+                amount = Decimal(self.random.randint(100, 50000)) / 100
+                payment = Payment(
+                    external_id=f'seed-{self.token}-P{index}-{number}', total_amount=amount,
+                    status=1, paid_at=self.now, customer=customer)
+                payments.append(payment)
+                if customer_loans:
+                    details.append(PaymentDetail(
+                        payment=payment, loan=self.random.choice(customer_loans), amount=amount))
+        Payment.objects.bulk_create(payments, batch_size=self.batch_size)
+        PaymentDetail.objects.bulk_create(details, batch_size=self.batch_size)
+
+        return {'customers': len(customers), 'loans': len(loans), 'ledger_entries': len(entries),
+                'payments': len(payments), 'payment_details': len(details)}
+
+    def _loan(self, index, number):
+        status = self.random.choices(self.statuses, self.weights)[0]
+        amount = Decimal(self.random.randint(10000, 500000)) / 100
+        if status == 2:
+            outstanding = (amount * Decimal(self.random.randint(1, 100)) / 100).quantize(Decimal('0.01'))
+        elif status == 4:
+            outstanding = Decimal('0')
+        else:
+            outstanding = amount
+        return Loan(
+            external_id=f'seed-{self.token}-L{index}-{number}', amount=amount, status=status,
+            outstanding=outstanding, contract_version='v1',
+            taken_at=self.now if status in (2, 4) else None,
+            maximum_payment_date=self.now + timedelta(days=self.random.randint(-90, 365)))
+
+
+def seed_portfolio(scale=None, seed=0, batch_size=BATCH_SIZE, **sizes):
+    """
+    Seed a synthetic portfolio at a named scale, or with explicit sizes.
+
+    Parameters:
+        scale: Name of a preset in `SCALES`.
+        seed: Random seed, for reproducible portfolios.
+        batch_size: Rows per bulk insert.
+        sizes: `customers`, `loans` and `payments` counts overriding the preset.
+
+    Returns:
+        dict: Number of rows inserted per model, elapsed time and rows/s.
+    """
+    options = dict(SCALES[scale]) if scale else {'customers': 1, 'loans': 0, 'payments': 0}
+    options.update({key: value for key, value in sizes.items() if value is not None})
+    return PortfolioSeeder(seed=seed, batch_size=batch_size, **options).run()
@@ -0,0 +1,227 @@
+# payments/benchmarks/suite.py
+import json
+import os
+import statistics
+import time
+import tracemalloc
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from payments.cache import get_cache
+from payments.models import Customer, Loan, Payment
+
+# Extra wall time, in ms, tolerated on top of the relative latency budget
+LATENCY_SLACK_MS = 5.0
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+class BenchmarkContext:
+    """
+    Clients and sample rows shared by the scenarios of one run.
+    """
+
+    def __init__(self):
+        self.user, _ = User.objects.get_or_create(username='benchmark')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.async_client = AsyncClient()
+        self.async_headers = {'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+
+        self.customer = (Customer.objects.filter(active_loans__gt=0).order_by('-active_loans', 'id').first()
+                         or Customer.objects.order_by('id').first())
+        self.customer_id = str(self.customer.external_id)
+
+    def new_pending_loan(self, iteration):
+        return Loan.objects.create(
+            external_id=f'bench-activate-{iteration}-{time.monotonic_ns()}', customer=self.customer,
+            amount=Decimal('1.00'), outstanding=Decimal('1.00'))
+
+    def payment_payload(self, iteration, amount='0.01'):
+        return {
+            'external_id': f'bench-payment-{iteration}-{time.monotonic_ns()}',
+            'customer_external_id': self.customer_id, 'total_amount': amount, 'details': [],
+        }
+
+
+def get(path, **params):
+    return lambda context, iteration: context.client.get(path.format(customer=context.customer_id), params)
+
+
+def async_get(path, **params):
+    async def request(context, iteration):
+        return await context.async_client.get(
+            path.format(customer=context.customer_id), params, headers=context.async_headers)
+    return async_to_sync(request)
+
+
+def create_customer(context, iteration):
+    return context.client.post('/api/customers/', {'status': 1, 'score': '1000.00'})
+
+
+def upload_customers(context, iteration):
+    content = b'status,score\n' + b'1,100\n' * 100
+    return context.client.post('/api/customers/bulk-upload/', {
+        'file': SimpleUploadedFile('customers.csv', content)}, format='multipart')
+
+
+def create_loan(context, iteration):
+    return context.client.post('/api/loans/', {
+        'external_id': f'bench-loan-{iteration}-{time.monotonic_ns()}', 'amount': '0.01',
+        'customer': context.customer.pk})
+
+
+def activate_loan(context, iteration):
+    loan = context.new_pending_loan(iteration)
+    return context.client.put('/api/loans/activate/', {'external_id': loan.external_id})
+
+
+def create_payment(context, iteration):
+    return context.client.post('/api/payment/', context.payment_payload(iteration), format='json')
+
+
+def create_payment_batch(context, iteration):
+    payload = [context.payment_payload(f'{iteration}-{index}') for index in range(50)]
+    return context.client.post('/api/payment/batch/', payload, format='json')
+
+
+def update_loans(context, iteration):
+    payment = Payment.objects.create(
+        external_id=f'bench-update-loans-{iteration}-{time.monotonic_ns()}', customer=context.customer,
+        total_amount=Decimal('0.01'))
+    payment.update_loans()
+
+
+# Setup work of a scenario (creating the rows it acts on) is measured with it; keep it small.
+SCENARIOS = {
+    'customers.list': get('/api/customers/'),
+    'customers.list.cursor': get('/api/customers/', pagination='cursor'),
+    'customers.create': create_customer,
+    'customers.balance': get('/api/customers/balance/'),
+    'customers.bulk_upload': upload_customers,
+    'loans.list': get('/api/loans/'),
+    'loans.create': create_loan,
+    'loans.activate': activate_loan,
+    'loans.by_customer': get('/api/loans/{customer}/'),
+    'payments.create': create_payment,
+    'payments.batch': create_payment_batch,
+    'payments.by_customer': get('/api/payment/by-customer/{customer}/'),
+    'async.customers.list': async_get('/api/async/customers/'),
+    'async.customers.balance': async_get('/api/async/customers/balance/'),
+    'async.loans.by_customer': async_get('/api/async/loans/{customer}/'),
+    'async.payments.by_customer': async_get('/api/async/payment/by-customer/{customer}/'),
+    'payment.update_loans': update_loans,
+}
+
+
+def measure(scenario, context, repeat):
+    """
+    Run a scenario `repeat` times, plus one warm-up run and one traced run.
+
+    The response cache is cleared before every measured run, so cached reads are measured
+    on a miss: the budgets gate their queries and serialization, not the cache lookup.
+
+    Returns:
+        dict: Median wall time (ms), worst query count and peak traced memory (KiB).
+    """
+    scenario(context, 'warmup')
+
+    timings, query_counts = [], []
+    for iteration in range(repeat):
+        get_cache().clear()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = scenario(context, iteration)
+            if getattr(response, 'streaming', False):
+                for _ in response.streaming_content:
+                    pass
+            timings.append((time.perf_counter() - started) * 1000)
+        query_counts.append(len(queries.captured_queries))
+        if response is not None and response.status_code >= 400:
+            raise RuntimeError(f'{response.status_code}: {getattr(response, "data", response.content)}')
+
+    get_cache().clear()
+    tracemalloc.start()
+    try:
+        scenario(context, 'traced')
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'wall_ms': round(statistics.median(timings), 3),
+        'queries': max(query_counts),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+@override_settings(ROOT_URLCONF='payments.urls')
+def run_suite(repeat=5, only=None):
+    """
+    Measure every scenario against the data currently in the database.
+
+    Parameters:
+        repeat: Measured runs per scenario.
+        only: Optional iterable of scenario names to run.
+
+    Returns:
+        dict: Measurements keyed by scenario name.
+    """
+    context = BenchmarkContext()
+    return {
+        name: measure(scenario, context, repeat)
+        for name, scenario in SCENARIOS.items()
+        if not only or name in only
+    }
+
+
+def compare(results, baseline, latency_tolerance=2.0, check_latency=True):
+    """
+    Compare results with a stored baseline.
+
+    A scenario regresses when it issues more queries than its baseline, or when its wall
+    time exceeds the baseline times `latency_tolerance` plus a small fixed slack.
+
+    Returns:
+        list: Human-readable regression messages; empty when every budget holds.
+    """
+    regressions = []
+    for name, result in results.items():
+        budget = baseline.get(name)
+        if budget is None:
+            continue
+        if result['queries'] > budget['queries']:
+            regressions.append(f"{name}: {result['queries']} queries > budget {budget['queries']}")
+        max_ms = budget['wall_ms'] * latency_tolerance + LATENCY_SLACK_MS
+        if check_latency and result['wall_ms'] > max_ms:
+            regressions.append(f"{name}: {result['wall_ms']}ms > budget {round(max_ms, 3)}ms")
+    return regressions
+
+
+def load_baseline(path, scale):
+    try:
+        with open(path) as baseline_file:
+            return json.load(baseline_file).get(scale, {})
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path, scale, results):
+    try:
+        with open(path) as baseline_file:
+            baselines = json.load(baseline_file)
+    except FileNotFoundError:
+        baselines = {}
+    baselines[scale] = {name: {'queries': result['queries'], 'wall_ms': result['wall_ms']}
+                        for name, result in results.items()}
+    with open(path, 'w') as baseline_file:
+        json.dump(baselines, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write('\n')
@@ -0,0 +1,98 @@
+# payments/cache.py
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from core.instrumentation import registry
+
+requests_counter = registry.counter(
+    'payments_cache_requests_total', 'Reads of the per-customer response cache, by kind and result.')
+
+PORTFOLIO_KEY = 'payments:analytics:portfolio'
+
+
+def get_cache():
+    return caches[getattr(settings, 'PAYMENTS_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'PAYMENTS_CACHE_TIMEOUT', 60)
+
+
+def generation_key(customer_external_id):
+    return f'payments:customer:{customer_external_id}:generation'
+
+
+def cached_customer_data(kind, customer_external_id, request, conditional, build):
+    """
+    Read-through cache of the response data of a per-customer read.
+
+    Entries are keyed by the customer's `external_id`, a per-customer generation token
+    that `invalidate_customers` discards, and the request's validators, so a cached body
+    never outlives the rows its ETag was computed from.
+
+    Parameters:
+        kind: Name of the cached read, used in the hit/miss counters.
+        customer_external_id: External ID of the customer.
+        request: HTTP request.
+        conditional: `ConditionalGet` of the request.
+        build: Callable returning the response data on a miss.
+
+    Returns:
+        The cached or freshly built response data.
+    """
+    try:
+        customer_external_id = uuid.UUID(str(customer_external_id))
+    except ValueError:
+        return build()
+
+    cache = get_cache()
+    generation = cache.get(generation_key(customer_external_id))
+    if generation is None:
+        generation = uuid.uuid4().hex
+        cache.add(generation_key(customer_external_id), generation, get_timeout())
+        generation = cache.get(generation_key(customer_external_id), generation)
+
+    variant = hashlib.md5(f'{request.get_host()}|{conditional.etag}'.encode(), usedforsecurity=False).hexdigest()
+    key = f'payments:customer:{customer_external_id}:{generation}:{kind}:{variant}'
+
+    data = cache.get(key)
+    if data is not None:
+        requests_counter.inc(kind=kind, result='hit')
+        return data
+
+    requests_counter.inc(kind=kind, result='miss')
+    data = build()
+    cache.set(key, data, get_timeout())
+    return data
+
+
+def invalidate_customers(customer_ids=(), external_ids=()):
+    """
+    Discard the cached reads of the given customers, now and when the transaction commits.
+
+    Invalidating again on commit keeps a concurrent read from caching data the
+    transaction is about to change. The portfolio report, which aggregates every
+    customer, is discarded as well.
+
+    Parameters:
+        customer_ids: Primary keys of customers.
+        external_ids: External IDs of customers.
+    """
+    from payments.models import Customer
+
+    external_ids = {str(external_id) for external_id in external_ids}
+    customer_ids = set(customer_ids)
+    if customer_ids:
+        external_ids.update(
+            str(external_id) for external_id in
+            Customer.objects.filter(pk__in=customer_ids).values_list('external_id', flat=True))
+    if not external_ids:
+        return
+
+    keys = [generation_key(external_id) for external_id in external_ids] + [PORTFOLIO_KEY]
+    get_cache().delete_many(keys)
+    transaction.on_commit(lambda: get_cache().delete_many(keys))
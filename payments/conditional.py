@@ -0,0 +1,53 @@
+# payments/conditional.py
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGet:
+    """
+    Validators of a read endpoint, computed with one aggregate query.
+
+    The ETag hashes the row count and newest timestamps of the queryset behind the
+    response together with the request path and `Accept` header, so it changes whenever
+    a row is created, updated or deleted, and differs between pages and formats. Nested
+    rows rendered with each row are covered by listing their relation in `count_fields`
+    and their timestamp in `timestamp_fields`.
+    `Last-Modified` has a one second resolution and cannot see deletions; clients should
+    prefer `If-None-Match`, which takes precedence when both are sent.
+    """
+
+    def __init__(self, request, queryset, timestamp_fields=('updated_at',), count_fields=('pk',)):
+        self.request = request
+        # Distinct counts stay exact when a field follows a reverse relation
+        summary = queryset.order_by().aggregate(
+            **{f'count_{field}': Count(field, distinct=True) for field in count_fields},
+            **{f'latest_{field}': Max(field) for field in timestamp_fields})
+
+        timestamps = [summary[f'latest_{field}'] for field in timestamp_fields]
+        self.last_modified = max((timestamp for timestamp in timestamps if timestamp), default=None)
+
+        parts = [request.get_full_path(), request.META.get('HTTP_ACCEPT', '')]
+        parts.extend(str(summary[f'count_{field}']) for field in count_fields)
+        parts.extend(timestamp.isoformat() if timestamp else '' for timestamp in timestamps)
+        self.etag = quote_etag(hashlib.md5('|'.join(parts).encode(), usedforsecurity=False).hexdigest())
+
+    def not_modified(self):
+        """
+        Return a 304 (or 412) response when the client's copy is current, else None.
+        """
+        response = get_conditional_response(
+            self.request, etag=self.etag,
+            last_modified=int(self.last_modified.timestamp()) if self.last_modified else None)
+        return self.apply(response) if response is not None else None
+
+    def apply(self, response):
+        """
+        Add the validators to a response.
+        """
+        response['ETag'] = self.etag
+        if self.last_modified:
+            response['Last-Modified'] = http_date(self.last_modified.timestamp())
+        return response
@@ -0,0 +1,98 @@
+# payments/management/commands/benchmark_connections.py
+import json
+import statistics
+import time
+
+from django.core import signals
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+def run_requests(alias, conn_max_age, requests, queries):
+    """
+    Run `requests` simulated request cycles with the given `CONN_MAX_AGE`.
+
+    Each cycle sends `request_started`, runs `queries` trivial queries and sends
+    `request_finished`, so Django opens, health-checks and closes connections exactly
+    as it does between real requests.
+
+    Returns:
+        dict: Connections opened and per-request latency (ms).
+    """
+    connection = connections[alias]
+    original = connection.settings_dict['CONN_MAX_AGE']
+    opened = 0
+
+    def count(sender, connection, **kwargs):
+        nonlocal opened
+        if connection.alias == alias:
+            opened += 1
+
+    connection.close()
+    connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+    connection_created.connect(count)
+    latencies = []
+    try:
+        for _ in range(requests):
+            started = time.perf_counter()
+            signals.request_started.send(sender=__name__)
+            with connection.cursor() as cursor:
+                for _ in range(queries):
+                    cursor.execute('SELECT 1')
+                    cursor.fetchone()
+            signals.request_finished.send(sender=__name__)
+            latencies.append((time.perf_counter() - started) * 1000)
+    finally:
+        connection_created.disconnect(count)
+        connection.settings_dict['CONN_MAX_AGE'] = original
+        connection.close()
+
+    latencies.sort()
+    return {
+        'conn_max_age': conn_max_age,
+        'requests': requests,
+        'connections_opened': opened,
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p99_ms': round(latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))], 3),
+    }
+
+
+class Command(BaseCommand):
+    """
+    Measure the per-request cost of opening database connections.
+
+    Compares a connection per request (`CONN_MAX_AGE=0`) with persistent connections,
+    against the database of the active settings:
+
+        DJANGO_SETTINGS_MODULE=core.settings_production python manage.py benchmark_connections
+    """
+
+    help = 'Compare per-request latency with and without persistent database connections.'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to benchmark.')
+        parser.add_argument('--requests', type=int, default=500, help='Simulated requests per mode.')
+        parser.add_argument('--queries', type=int, default=1, help='Queries per request.')
+        parser.add_argument('--conn-max-age', type=int, default=600,
+                            help='CONN_MAX_AGE of the persistent mode.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        results = [
+            run_requests(options['database'], conn_max_age, options['requests'], options['queries'])
+            for conn_max_age in (0, options['conn_max_age'])
+        ]
+        for result in results:
+            self.stdout.write(
+                f"CONN_MAX_AGE={result['conn_max_age']:<5} {result['connections_opened']:>5} connections  "
+                f"mean={result['mean_ms']}ms p50={result['p50_ms']}ms p99={result['p99_ms']}ms")
+
+        saved = results[0]['mean_ms'] - results[1]['mean_ms']
+        self.stdout.write(self.style.SUCCESS(f'Persistent connections save {saved:.3f}ms per request.'))
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
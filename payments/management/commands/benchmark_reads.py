@@ -0,0 +1,116 @@
+# payments/management/commands/benchmark_reads.py
+import asyncio
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_level(httpx, url, headers, concurrency, total_requests, timeout):
+    """
+    Fire `total_requests` GETs at `url` from `concurrency` concurrent clients.
+
+    Returns:
+        dict: Throughput, latency percentiles (ms) and error count.
+    """
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for _ in range(total_requests):
+        queue.put_nowait(None)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(headers=headers, limits=limits, timeout=timeout) as client:
+
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                queue.get_nowait()
+                started = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'concurrency': concurrency,
+        'requests': total_requests,
+        'errors': errors,
+        'requests_per_second': round(total_requests / elapsed, 1),
+        'mean_ms': round(statistics.fmean(latencies), 2),
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+    }
+
+
+class Command(BaseCommand):
+    """
+    Compare concurrent-request throughput and tail latency of read endpoints.
+
+    Point each target at a running server, for example the sync view behind
+    `gunicorn core.wsgi` and the async view behind `uvicorn core.asgi:application`:
+
+        python manage.py benchmark_reads \\
+            --target wsgi=http://127.0.0.1:8000/payments/api/loans/<customer>/ \\
+            --target asgi=http://127.0.0.1:8001/payments/api/async/loans/<customer>/ \\
+            --token <access token> --concurrency 50 100 250 500
+    """
+
+    help = 'Benchmark read endpoints of running WSGI/ASGI servers at several concurrency levels.'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True, metavar='NAME=URL',
+                            help='Endpoint to benchmark; repeat to compare several servers or views.')
+        parser.add_argument('--token', help='JWT access token sent as a Bearer credential.')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[50, 100, 250, 500])
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per target and level.')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        try:
+            import httpx
+        except ImportError:
+            raise CommandError('benchmark_reads requires httpx (see requirements_local.txt).')
+
+        targets = []
+        for target in options['target']:
+            name, separator, url = target.partition('=')
+            if not separator or not url:
+                raise CommandError(f'Invalid target {target!r}, expected NAME=URL.')
+            targets.append((name, url))
+
+        headers = {'Authorization': f"Bearer {options['token']}"} if options['token'] else {}
+        results = []
+        for name, url in targets:
+            for concurrency in options['concurrency']:
+                result = asyncio.run(run_level(
+                    httpx, url, headers, concurrency, options['requests'], options['timeout']))
+                result['target'] = name
+                results.append(result)
+                self.stdout.write(
+                    f"{name:>10} c={concurrency:<4} {result['requests_per_second']:>9} req/s  "
+                    f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms "
+                    f"errors={result['errors']}")
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
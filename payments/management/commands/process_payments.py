@@ -0,0 +1,77 @@
+# payments/management/commands/process_payments.py
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from payments.services.payment_queue import CLAIM_SIZE, drain_pending
+
+
+class Command(BaseCommand):
+    """
+    Allocate pending payments with a pool of worker threads.
+
+    The queue is the `payments_payment` table itself: each worker claims the oldest
+    pending payments with `SELECT ... FOR UPDATE SKIP LOCKED` and applies the payments
+    of each customer in one allocation pass. No external broker is needed. Several workers
+    need a database with `SKIP LOCKED` (PostgreSQL); elsewhere a single worker runs.
+
+        python manage.py process_payments --workers 4
+        python manage.py process_payments --once
+    """
+
+    help = 'Drain the queue of pending payments.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Number of worker threads.')
+        parser.add_argument('--batch-size', type=int, default=CLAIM_SIZE, help='Payments claimed per transaction.')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty.')
+
+    def handle(self, *args, **options):
+        if options['workers'] > 1 and not connection.features.has_select_for_update_skip_locked:
+            raise CommandError('Several workers need a database supporting SELECT ... FOR UPDATE SKIP LOCKED.')
+
+        totals = {'claimed': 0, 'completed': 0, 'rejected': 0, 'failed': 0, 'abandoned': 0}
+        lock = threading.Lock()
+        stop = threading.Event()
+
+        def work():
+            while not stop.is_set():
+                report = drain_pending(options['batch_size'])
+                with lock:
+                    for key, value in report.items():
+                        totals[key] += value
+                if report['claimed'] == report['failed']:
+                    if options['once']:
+                        return
+                    stop.wait(options['poll_interval'])
+
+        def run_worker():
+            try:
+                work()
+            finally:
+                connections.close_all()
+
+        workers = []
+        try:
+            if options['workers'] <= 1:
+                work()
+            else:
+                workers = [threading.Thread(target=run_worker, daemon=True) for _ in range(options['workers'])]
+                for worker in workers:
+                    worker.start()
+                while any(worker.is_alive() for worker in workers):
+                    time.sleep(0.2)
+        except KeyboardInterrupt:
+            # Let the workers finish their current batch
+            stop.set()
+            for worker in workers:
+                worker.join()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {totals['claimed']} payments: {totals['completed']} completed, "
+            f"{totals['rejected']} rejected, {totals['failed']} failed attempts, "
+            f"{totals['abandoned']} abandoned."))
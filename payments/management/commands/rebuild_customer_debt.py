@@ -0,0 +1,66 @@
+# payments/management/commands/rebuild_customer_debt.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from payments.cache import invalidate_customers
+from payments.models import Customer
+
+
+class Command(BaseCommand):
+    """
+    Rebuild or verify the per-customer debt summary against the raw loans.
+
+    Customers are processed in primary key order, in batches, each batch aggregating
+    its loans in one query and writing the mismatched customers with one bulk update.
+    """
+
+    help = "Rebuild (or verify with --verify) the customers' total_debt and active_loans counters."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Only report mismatches; exit with an error if any is found.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of customers aggregated per query.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        verify = options['verify']
+        checked = mismatched = 0
+        last_id = 0
+
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    Customer.objects.filter(pk__gt=last_id).order_by('pk').with_computed_debt()[:batch_size])
+                if not batch:
+                    break
+                last_id = batch[-1].pk
+
+                stale = [
+                    customer for customer in batch
+                    if (customer.total_debt, customer.active_loans)
+                    != (customer.computed_debt, customer.computed_active_loans)
+                ]
+                checked += len(batch)
+                mismatched += len(stale)
+
+                for customer in stale:
+                    self.stdout.write(
+                        f'{customer.external_id}: stored ({customer.total_debt}, {customer.active_loans}) '
+                        f'!= computed ({customer.computed_debt}, {customer.computed_active_loans})')
+
+                if stale and not verify:
+                    now = timezone.now()
+                    for customer in stale:
+                        customer.total_debt = customer.computed_debt
+                        customer.active_loans = customer.computed_active_loans
+                        customer.debt_updated_at = now
+                    Customer.objects.bulk_update(stale, ['total_debt', 'active_loans', 'debt_updated_at'])
+                    invalidate_customers(external_ids=[customer.external_id for customer in stale])
+
+        if verify and mismatched:
+            raise CommandError(f'{mismatched} of {checked} customers have a stale debt summary.')
+
+        action = 'mismatched' if verify else 'rebuilt'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} customers, {mismatched} {action}.'))
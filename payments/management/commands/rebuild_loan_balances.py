@@ -0,0 +1,54 @@
+# payments/management/commands/rebuild_loan_balances.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from payments.models import Loan
+from payments.services.ledger import ledger_mismatches, rebuild_balances
+
+
+class Command(BaseCommand):
+    """
+    Rebuild or verify the loans' outstanding amounts against the loan ledger.
+
+    Loans are processed in primary key order, in batches, each batch summing its ledger
+    entries in one query and writing the mismatched loans with one update.
+    """
+
+    help = "Rebuild (or verify with --verify) the loans' outstanding amounts from the ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Only report mismatches; exit with an error if any is found.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of loans checked per query.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        verify = options['verify']
+        checked = mismatched = 0
+        last_id = 0
+
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    Loan.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+                if not batch:
+                    break
+                last_id = batch[-1]
+
+                stale = list(ledger_mismatches().filter(pk__in=batch)
+                             .values_list('pk', 'external_id', 'outstanding', 'ledger_balance'))
+                checked += len(batch)
+                mismatched += len(stale)
+
+                for _, external_id, outstanding, balance in stale:
+                    self.stdout.write(f'{external_id}: stored {outstanding} != ledger {balance}')
+
+                if stale and not verify:
+                    rebuild_balances([pk for pk, _, _, _ in stale])
+
+        if verify and mismatched:
+            raise CommandError(f'{mismatched} of {checked} loans differ from their ledger.')
+
+        action = 'mismatched' if verify else 'rebuilt'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} loans, {mismatched} {action}.'))
@@ -0,0 +1,50 @@
+# payments/management/commands/reconcile_statement.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.services.customer_upload import ROW_READERS, UPLOAD_FORMATS
+from payments.services.reconciliation import BATCH_SIZE, StatementReconciler
+
+
+class Command(BaseCommand):
+    """
+    Reconcile a bank statement file with the recorded payments.
+
+    Each CSV or JSONL line has a `reference` (payment external ID), an `amount` and a
+    `loan_external_id` and/or `customer_external_id`. Missing payments are created and
+    allocated; the file is streamed, one batch of lines at a time.
+
+        python manage.py reconcile_statement statement-2026-10-18.csv --output report.json
+    """
+
+    help = 'Match bank statement lines against payments and create the missing ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Statement file.')
+        parser.add_argument('--format', choices=UPLOAD_FORMATS,
+                            help='File format; taken from the extension by default.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Lines matched per batch.')
+        parser.add_argument('--output', help='Write the full report as JSON to this file.')
+
+    def handle(self, *args, **options):
+        statement_format = options['format'] or options['path'].rsplit('.', 1)[-1].lower()
+        if statement_format == 'ndjson':
+            statement_format = 'jsonl'
+        if statement_format not in ROW_READERS:
+            raise CommandError('Unsupported file format, use csv or jsonl (or pass --format).')
+
+        try:
+            with open(options['path'], 'rb') as statement:
+                report = StatementReconciler(options['batch_size']).run(ROW_READERS[statement_format](statement))
+        except OSError as exc:
+            raise CommandError(f'Cannot read {options["path"]}: {exc}')
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2, default=str)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled {report['lines']} lines: {report['matched']} matched, {report['new']} new "
+            f"({report['rejected']} rejected), {report['duplicate']} duplicate, {report['unmatched']} unmatched "
+            f"in {report['elapsed_seconds']}s ({report['lines_per_second']} lines/s)."))
@@ -0,0 +1,72 @@
+# payments/management/commands/run_benchmarks.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from payments.benchmarks.seed import SCALES, seed_portfolio
+from payments.benchmarks.suite import (BASELINE_PATH, SCENARIOS, compare,
+                                       load_baseline, run_suite, save_baseline)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    Benchmark every payments endpoint and `Payment.update_loans` against a seeded portfolio.
+
+    The portfolio is seeded inside a transaction that is rolled back at the end, unless
+    `--no-seed` is given to benchmark the data already in the database. The command exits
+    with an error when a query-count or latency budget of the baseline regresses.
+
+        python manage.py run_benchmarks --scale 100k --output results.json
+        python manage.py run_benchmarks --scale 1k --update-baseline
+    """
+
+    help = 'Measure wall time, query count and peak memory of the payments endpoints.'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='1k', help='Portfolio size to seed.')
+        parser.add_argument('--no-seed', action='store_true', help='Benchmark the existing data.')
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS, help='Run only these scenarios.')
+        parser.add_argument('--repeat', type=int, default=5, help='Measured runs per scenario.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline JSON file.')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Store the results as the new baseline of the scale.')
+        parser.add_argument('--latency-tolerance', type=float, default=2.0,
+                            help='Allowed wall time as a multiple of the baseline.')
+        parser.add_argument('--skip-latency', action='store_true', help='Only enforce query budgets.')
+
+    def handle(self, *args, **options):
+        results = {}
+        try:
+            with transaction.atomic():
+                if not options['no_seed']:
+                    seed_portfolio(options['scale'])
+                results = run_suite(repeat=options['repeat'], only=options['scenario'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<28} {result['wall_ms']:>10}ms {result['queries']:>4} queries {result['peak_kib']:>10} KiB")
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({'scale': options['scale'], 'results': results}, output, indent=2)
+
+        if options['update_baseline']:
+            save_baseline(options['baseline'], options['scale'], results)
+            self.stdout.write(self.style.SUCCESS(f"Baseline for {options['scale']} updated."))
+            return
+
+        regressions = compare(results, load_baseline(options['baseline'], options['scale']),
+                              options['latency_tolerance'], check_latency=not options['skip_latency'])
+        if regressions:
+            raise CommandError('Benchmark budgets regressed:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('All benchmark budgets hold.'))
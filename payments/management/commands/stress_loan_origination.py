@@ -0,0 +1,151 @@
+# payments/management/commands/stress_loan_origination.py
+import json
+import queue
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connections, transaction
+
+from payments.models import Customer, Loan, LoanLedgerEntry, Tombstone
+from payments.serializers.loan import LoanSerializer
+from payments.services.origination import originate_loan
+
+
+def originate(task):
+    customer_id, external_id, amount = task
+    serializer = LoanSerializer(data={'external_id': external_id, 'amount': amount, 'customer': customer_id})
+    serializer.is_valid(raise_exception=True)
+    return originate_loan(serializer) is not None
+
+
+def purge_customers(customer_ids):
+    """
+    Delete the customers of a run with their loans, ledger entries and tombstones.
+
+    The deletes run in one transaction, so delta sync consumers never see the tombstones
+    the loan deletes write.
+    """
+    with transaction.atomic():
+        Loan.objects.filter(customer_id__in=customer_ids).delete()
+        Customer.objects.filter(pk__in=customer_ids).delete()
+        LoanLedgerEntry.objects.filter(customer_id__in=customer_ids).delete()
+        Tombstone.objects.filter(customer_id__in=customer_ids).delete()
+
+
+def run_level(customer_count, threads, requests, amount, loans_per_customer):
+    """
+    Originate `requests` loans spread over `customer_count` fresh customers from `threads` threads.
+
+    Each customer's score admits `loans_per_customer` loans, so every customer receives
+    more requests than its limit allows and the originations compete for it.
+
+    Returns:
+        dict: Accepted, rejected and failed originations, customers over their limit,
+            elapsed time and throughput.
+    """
+    run_id = uuid.uuid4().hex[:8]
+    customers = Customer.objects.bulk_create(
+        Customer(status=1, score=amount * loans_per_customer) for _ in range(customer_count))
+    tasks = queue.SimpleQueue()
+    for index in range(requests):
+        tasks.put((customers[index % customer_count].pk, f'stress-{run_id}-{index}', amount))
+
+    counts = {'accepted': 0, 'rejected': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def work():
+        while True:
+            try:
+                task = tasks.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                result = 'accepted' if originate(task) else 'rejected'
+            except DatabaseError:
+                result = 'errors'
+            with lock:
+                counts[result] += 1
+
+    def run_worker():
+        try:
+            work()
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    if threads <= 1:
+        work()
+    else:
+        workers = [threading.Thread(target=run_worker) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    elapsed = time.perf_counter() - started
+
+    customer_ids = [customer.pk for customer in customers]
+    over_limit = sum(
+        customer.total_debt > customer.score or customer.computed_debt > customer.score
+        for customer in Customer.objects.filter(pk__in=customer_ids).with_computed_debt()
+    )
+    purge_customers(customer_ids)
+
+    return {
+        'customers': customer_count,
+        'threads': threads,
+        'requests': requests,
+        **counts,
+        'over_limit': over_limit,
+        'elapsed_s': round(elapsed, 3),
+        'originations_per_second': round(requests / elapsed, 1),
+    }
+
+
+class Command(BaseCommand):
+    """
+    Stress concurrent loan origination and check that no customer exceeds its limit.
+
+    Runs the same number of originations against 1, then more distinct customers:
+    originations of one customer serialize on its row lock, so throughput should grow
+    with the number of customers while `over_limit` stays 0. Run it against PostgreSQL;
+    SQLite serializes every writer on its database lock.
+
+        DJANGO_SETTINGS_MODULE=core.settings_production \\
+            python manage.py stress_loan_origination --threads 16 --customers 1 4 16 64
+
+    Customers, loans and ledger entries created by the run are deleted afterwards, with
+    the tombstones of those loans. The originations commit from their own connections to
+    compete for the row locks, so a run cannot be rolled back instead.
+    """
+
+    help = 'Originate loans concurrently and verify the credit limit holds.'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, nargs='+', default=[1, 4, 16, 64],
+                            help='Numbers of distinct customers to spread the originations over.')
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent origination threads.')
+        parser.add_argument('--requests', type=int, default=1000, help='Originations per level.')
+        parser.add_argument('--amount', type=Decimal, default=Decimal('100.00'), help='Amount of each loan.')
+        parser.add_argument('--loans-per-customer', type=int, default=5,
+                            help='Loans each customer\'s score admits.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        results = []
+        for customer_count in options['customers']:
+            result = run_level(customer_count, options['threads'], options['requests'],
+                               options['amount'], options['loans_per_customer'])
+            results.append(result)
+            style = self.style.SUCCESS if not result['over_limit'] else self.style.ERROR
+            self.stdout.write(style(
+                f"customers={customer_count:<5} {result['originations_per_second']:>9} originations/s  "
+                f"accepted={result['accepted']} rejected={result['rejected']} errors={result['errors']} "
+                f"over_limit={result['over_limit']}"))
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
@@ -0,0 +1,72 @@
+# payments/management/commands/sweep_overdue_loans.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from payments.services.overdue import CHUNK_SIZE, finish_sweep, start_sweep, sweep_chunk
+
+
+class Command(BaseCommand):
+    """
+    Move active loans past their maximum payment date to overdue, and fully repaid
+    active loans to paid.
+
+    Loans are swept in primary key order, one short transaction per chunk, and the
+    position is persisted after each chunk: an interrupted run resumes where it stopped,
+    with the cutoff time it started with.
+
+        python manage.py sweep_overdue_loans --chunk-size 1000 --pause 0.05
+    """
+
+    help = 'Apply overdue and paid transitions to active loans in resumable chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Loans locked and updated per transaction.')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between chunks, to yield to live traffic.')
+        parser.add_argument('--max-chunks', type=int, default=None,
+                            help='Stop after this many chunks; the next run resumes from there.')
+        parser.add_argument('--restart', action='store_true', help='Discard the progress of an unfinished run.')
+
+    def handle(self, *args, **options):
+        cursor = start_sweep(restart=options['restart'])
+        if cursor.last_id:
+            self.stdout.write(f'Resuming the sweep at cutoff {cursor.cutoff.isoformat()} after loan {cursor.last_id}.')
+
+        totals = {'scanned': 0, 'overdue': 0, 'paid': 0}
+        last_id = cursor.last_id
+        chunks = 0
+        started = time.perf_counter()
+        finished = False
+
+        try:
+            while options['max_chunks'] is None or chunks < options['max_chunks']:
+                report = sweep_chunk(cursor.cutoff, last_id, options['chunk_size'])
+                if report['last_id'] is None:
+                    finished = True
+                    break
+                last_id = report['last_id']
+                chunks += 1
+                for key in totals:
+                    totals[key] += report[key]
+
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'Chunk {chunks}: up to loan {last_id}, {self.rate(totals, started)}')
+                if options['pause']:
+                    time.sleep(options['pause'])
+        except KeyboardInterrupt:
+            self.stdout.write(f'Interrupted after loan {last_id}; run again to resume.')
+
+        if finished:
+            cursor.refresh_from_db()
+            finish_sweep(cursor)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Swept {totals['scanned']} loans: {totals['overdue']} overdue, {totals['paid']} paid, "
+            f"{self.rate(totals, started)}" + ('.' if finished else f'; resumable after loan {last_id}.')))
+
+    @staticmethod
+    def rate(totals, started):
+        elapsed = time.perf_counter() - started
+        return f"{totals['scanned'] / elapsed if elapsed else 0:.0f} rows/s"
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.13 on 2026-10-18 08:51
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='rejected_loans',
+            field=models.ManyToManyField(blank=True, related_name='rejected_payments', to='payments.loan'),
+        ),
+        migrations.AddField(
+            model_name='paymentdetail',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='paymentdetail',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='preapproved_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='paymentdetail',
+            name='amount',
+            field=models.DecimalField(decimal_places=2, max_digits=12),
+        ),
+    ]
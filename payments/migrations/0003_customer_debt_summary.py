@@ -0,0 +1,48 @@
+# Generated by Django 4.2.13 on 2026-10-18 08:53
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def backfill_debt_summary(apps, schema_editor):
+    Customer = apps.get_model('payments', 'Customer')
+    Loan = apps.get_model('payments', 'Loan')
+
+    open_loans = Loan.objects.filter(customer=OuterRef('pk'), status__in=[1, 2]).values('customer')
+    active_loans = Loan.objects.filter(customer=OuterRef('pk'), status=2).values('customer')
+    Customer.objects.update(
+        total_debt=Coalesce(
+            Subquery(open_loans.annotate(total=Sum('outstanding')).values('total')), Value(Decimal('0'))),
+        active_loans=Coalesce(
+            Subquery(active_loans.annotate(total=Count('id')).values('total')), Value(0)),
+        debt_updated_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_paymentdetail_timestamps_and_rejected_loans'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='active_loans',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='debt_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='total_debt',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.RunPython(backfill_debt_summary, migrations.RunPython.noop),
+    ]
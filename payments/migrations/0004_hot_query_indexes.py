@@ -0,0 +1,33 @@
+# Generated by Django 4.2.13 on 2026-10-18 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_customer_debt_summary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['created_at', 'id'], name='customer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['customer', 'status', 'created_at', 'id'], name='loan_customer_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(condition=models.Q(('status__in', [1, 2])), fields=['customer', 'outstanding'], name='loan_open_debt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['customer', 'created_at', 'id'], name='payment_customer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentdetail',
+            index=models.Index(fields=['loan', 'created_at'], name='paymentdetail_loan_created_idx'),
+        ),
+    ]
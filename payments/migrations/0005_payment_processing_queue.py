@@ -0,0 +1,27 @@
+# Generated by Django 4.2.13 on 2026-10-18 09:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='pending_targets',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='status',
+            field=models.SmallIntegerField(choices=[(1, 'completed'), (2, 'rejected'), (3, 'pending')], default=1),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('status', 3)), fields=['created_at', 'id'], name='payment_pending_idx'),
+        ),
+    ]
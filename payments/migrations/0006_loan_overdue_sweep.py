@@ -0,0 +1,41 @@
+# Generated by Django 4.2.13 on 2026-10-18 09:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_payment_processing_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SweepCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=60, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('cutoff', models.DateTimeField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='loan',
+            name='loan_open_debt_idx',
+        ),
+        migrations.AlterField(
+            model_name='loan',
+            name='status',
+            field=models.SmallIntegerField(choices=[(1, 'pending'), (2, 'active'), (3, 'rejected'), (4, 'paid'), (5, 'overdue')], default=1),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(condition=models.Q(('status__in', [1, 2, 5])), fields=['customer', 'outstanding'], name='loan_open_debt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(condition=models.Q(('status', 2)), fields=['id'], name='loan_active_sweep_idx'),
+        ),
+    ]
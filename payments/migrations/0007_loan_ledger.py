@@ -0,0 +1,36 @@
+# Generated by Django 4.2.13 on 2026-10-18 09:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_loan_overdue_sweep'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.SmallIntegerField(choices=[(1, 'opening'), (2, 'origination'), (3, 'payment'), (4, 'adjustment')])),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('customer', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='ledger_entries', to='payments.customer')),
+                ('loan', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='ledger_entries', to='payments.loan')),
+                ('payment', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='ledger_entries', to='payments.payment')),
+            ],
+        ),
+        # Opening balance of the existing loans, so their ledger sums match `outstanding`
+        migrations.RunSQL(
+            """
+            INSERT INTO payments_loanledgerentry (kind, amount, balance, created_at, loan_id, customer_id)
+            SELECT 1, outstanding, outstanding, CURRENT_TIMESTAMP, id, customer_id
+            FROM payments_loan WHERE outstanding <> 0 ORDER BY id
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
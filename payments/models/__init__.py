@@ -2,3 +2,6 @@
 from .customer import Customer
 from .loan import Loan
 from .payment import Payment, PaymentDetail
+from .ledger import LoanLedgerEntry
+from .sweep import SweepCursor
+from .tombstone import Tombstone
@@ -1,8 +1,42 @@
 # payments/models/customer.py
 
 import uuid
+from decimal import Decimal
 
 from django.db import models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+class CustomerQuerySet(models.QuerySet):
+
+    def with_balance(self):
+        """
+        Annotate each customer with its available amount, read from the debt summary.
+
+        Returns:
+            CustomerQuerySet: Customers annotated with `available_amount`.
+        """
+        return self.annotate(available_amount=ExpressionWrapper(
+            F('score') - F('total_debt'), output_field=DecimalField(max_digits=14, decimal_places=2)))
+
+    def with_computed_debt(self):
+        """
+        Annotate each customer with its debt summary aggregated from the raw loans.
+
+        Used to rebuild and verify the maintained `total_debt` and `active_loans` counters.
+
+        Returns:
+            CustomerQuerySet: Customers annotated with `computed_debt` and `computed_active_loans`.
+        """
+        from payments.models.loan import Loan
+
+        return self.annotate(
+            computed_debt=Coalesce(
+                Sum('loans__outstanding', filter=Q(loans__status__in=Loan.OPEN_STATUSES)),
+                Value(Decimal('0')), output_field=DecimalField(max_digits=14, decimal_places=2)),
+            computed_active_loans=Count('loans', filter=Q(loans__status__in=Loan.PAYABLE_STATUSES)),
+        )
 
 
 class Customer(models.Model):
@@ -19,5 +53,18 @@ class Customer(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Debt summary maintained by the loan and payment write paths
+    total_debt = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    active_loans = models.PositiveIntegerField(default=0)
+    debt_updated_at = models.DateTimeField(null=True, blank=True)
+
+    objects = CustomerQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Customer listing in keyset pagination order
+            models.Index(fields=['created_at', 'id'], name='customer_created_idx'),
+        ]
+
     def __str__(self):
         return str(self.external_id)
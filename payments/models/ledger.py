@@ -0,0 +1,37 @@
+# models/ledger.py
+from django.db import models
+
+
+class LoanLedgerEntry(models.Model):
+    """
+    One movement of a loan's outstanding balance. Entries are only ever inserted.
+
+    `amount` is the signed change of the balance and `balance` the outstanding amount
+    right after it, so the sum of a loan's entries equals its `outstanding`. The primary
+    key orders the entries and is the cursor of the change feed.
+
+    The references are kept without database constraints: the history outlives the
+    loans, customers and payments it describes.
+    """
+
+    KIND_CHOICES = (
+        (1, 'opening'),
+        (2, 'origination'),
+        (3, 'payment'),
+        (4, 'adjustment'),
+    )
+
+    kind = models.SmallIntegerField(choices=KIND_CHOICES)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    loan = models.ForeignKey(
+        'Loan', related_name='ledger_entries', on_delete=models.DO_NOTHING, db_constraint=False)
+    customer = models.ForeignKey(
+        'Customer', related_name='ledger_entries', on_delete=models.DO_NOTHING, db_constraint=False)
+    payment = models.ForeignKey(
+        'Payment', related_name='ledger_entries', on_delete=models.DO_NOTHING, db_constraint=False,
+        null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.loan_id}: {self.amount}'
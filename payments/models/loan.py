@@ -1,6 +1,5 @@
 # models/loan.py
-from django.db import models
-from django.db.models import Sum
+from django.db import models, transaction
 from django.utils import timezone
 
 from payments.models.customer import Customer
@@ -12,8 +11,18 @@ class Loan(models.Model):
         (2, 'active'),
         (3, 'rejected'),
         (4, 'paid'),
+        (5, 'overdue'),
     )
 
+    # Statuses whose outstanding amount counts towards the customer's debt
+    OPEN_STATUSES = (1, 2, 5)
+
+    # Taken loans still being repaid: allocated to by payments, counted in `active_loans`
+    PAYABLE_STATUSES = (2, 5)
+
+    # Debt contribution of a loan loaded without status, outstanding or customer
+    UNKNOWN_DEBT = object()
+
     external_id = models.CharField(max_length=60, unique=True)
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     contract_version = models.CharField(max_length=30, blank=True, null=True)
@@ -27,10 +36,121 @@ class Loan(models.Model):
     customer = models.ForeignKey(
         Customer, related_name='loans', on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            # Allocation waterfall: a customer's loans in one status, oldest first
+            models.Index(fields=['customer', 'status', 'created_at', 'id'], name='loan_customer_status_idx'),
+            # Debt summary refresh and verification: outstanding of open loans only
+            models.Index(fields=['customer', 'outstanding'], name='loan_open_debt_idx',
+                         condition=models.Q(status__in=[1, 2, 5])),
+            # Overdue sweep: active loans in primary key order
+            models.Index(fields=['id'], name='loan_active_sweep_idx', condition=models.Q(status=2)),
+            # Delta sync: loans changed since a timestamp, overall or for one customer
+            models.Index(fields=['updated_at', 'id'], name='loan_updated_idx'),
+            models.Index(fields=['customer', 'updated_at', 'id'], name='loan_customer_updated_idx'),
+        ]
+
+    # Contribution last written to the customer's debt summary, None until saved
+    _recorded_debt = None
+
+    # Outstanding amount last written to the ledger, None until saved
+    _recorded_outstanding = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if {'status', 'outstanding', 'customer_id'}.issubset(instance.__dict__):
+            instance._recorded_debt = instance.debt_contribution()
+        else:
+            instance._recorded_debt = cls.UNKNOWN_DEBT
+        instance._recorded_outstanding = instance.__dict__.get('outstanding', cls.UNKNOWN_DEBT)
+        return instance
+
+    def debt_contribution(self):
+        """
+        Return what the loan adds to its customer's debt summary.
+
+        Returns:
+            tuple: (customer_id, open outstanding amount, active loan count).
+        """
+        if self.pk is None:  # Deleted
+            return (self.customer_id, 0, 0)
+        return self.contribution(self.customer_id, self.status, self.outstanding)
+
+    @classmethod
+    def contribution(cls, customer_id, status, outstanding):
+        debt = outstanding if status in cls.OPEN_STATUSES else 0
+        return (customer_id, debt, int(status in cls.PAYABLE_STATUSES))
+
+    def debt_customer_ids(self):
+        """
+        Return the customers whose debt summary a write of this loan changes.
+        """
+        customer_ids = {self.customer_id}
+        if isinstance(self._recorded_debt, tuple):
+            customer_ids.add(self._recorded_debt[0])
+        return customer_ids
+
+    def lock_committed_state(self, update_fields=None):
+        """
+        Lock the loan's customers and re-read the loan's committed debt fields.
+
+        The instance may have been read before a concurrent payment or sweep changed the
+        row, so the contribution recorded in the debt summary and the ledger is taken from
+        the committed row, and the debt fields the write leaves out of `update_fields` are
+        refreshed from it. Must be called inside `transaction.atomic()`.
+
+        Parameters:
+            update_fields: Fields about to be saved, None for all of them.
+        """
+        from payments.services.locking import lock_customers
+
+        # Lock order: the customer before its loans
+        locked = lock_customers(self.debt_customer_ids())
+        row = type(self)._base_manager.filter(pk=self.pk).values('customer_id', 'status', 'outstanding').first()
+        if row is None:
+            return
+        if row['customer_id'] not in locked:  # Moved by a concurrent write
+            locked.update(lock_customers([row['customer_id']]))
+
+        if update_fields is not None:
+            written = {self._meta.get_field(name).attname for name in update_fields}
+            for attname, value in row.items():
+                if attname not in written:
+                    setattr(self, attname, value)
+        self._recorded_debt = self.contribution(row['customer_id'], row['status'], row['outstanding'])
+        self._recorded_outstanding = row['outstanding']
+        if not type(self).customer.is_cached(self) and self.customer_id in locked:
+            # Spares the cache invalidation a query for the customer's external ID
+            type(self).customer.field.set_cached_value(self, locked[self.customer_id])
+
     def save(self, *args, **kwargs):
+        from payments.services.debt import record_debt_changes
+        from payments.services.ledger import ADJUSTMENT, ORIGINATION, record_balance_changes
+
         if self.status == 2 and not self.taken_at:
             self.taken_at = timezone.now()
-        super().save(*args, **kwargs)
+
+        update_fields = kwargs.get('update_fields')
+        changes_debt = update_fields is None or {'status', 'outstanding', 'customer'} & set(update_fields)
+        changes_balance = update_fields is None or 'outstanding' in update_fields
+        adding = self._state.adding
+        # Like Model.save_base, no savepoint: a failed write rolls back the caller's transaction
+        with transaction.atomic(savepoint=False):
+            if changes_debt and not adding:
+                self.lock_committed_state(update_fields)
+            super().save(*args, **kwargs)
+            if changes_debt:
+                record_debt_changes([self])
+            if changes_balance:
+                record_balance_changes([self], ORIGINATION if adding else ADJUSTMENT)
+
+    def delete(self, *args, **kwargs):
+        # The customer's debt summary is refreshed by the post_delete receiver, which
+        # queryset deletes reach too; the customer is locked first here to keep lock order
+        with transaction.atomic(savepoint=False):
+            self.lock_committed_state()
+            return super().delete(*args, **kwargs)
 
     def clean(self):
         if self.status == 2 and self.outstanding == 0:
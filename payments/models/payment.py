@@ -9,6 +9,8 @@ class Payment(models.Model):
     STATUS_CHOICES = (
         (1, 'completed'),
         (2, 'rejected'),
+        (3, 'pending'),
+        (4, 'failed'),
     )
 
     external_id = models.CharField(max_length=60, unique=True)
@@ -21,45 +23,48 @@ class Payment(models.Model):
         Customer, related_name='payments', on_delete=models.CASCADE)
     rejected_loans = models.ManyToManyField(
         'Loan', related_name='rejected_payments', blank=True)
+    # Declared `[loan_id, amount]` details of a pending payment, applied by the worker
+    pending_targets = models.JSONField(null=True, blank=True)
+    # Failed allocation attempts of a pending payment, and when the worker may retry it
+    attempts = models.PositiveSmallIntegerField(default=0)
+    retry_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Payment history of a customer, in listing order
+            models.Index(fields=['customer', 'created_at', 'id'], name='payment_customer_created_idx'),
+            # Queue of pending payments, drained oldest first
+            models.Index(fields=['created_at', 'id'], name='payment_pending_idx',
+                         condition=models.Q(status=3)),
+            # Delta sync: payments of a customer changed since a timestamp
+            models.Index(fields=['customer', 'updated_at', 'id'], name='payment_customer_updated_idx'),
+        ]
 
     def __str__(self):
         return self.external_id
 
     def save(self, *args, **kwargs):
-        if self.status == 1:
+        if self.status == 1 and not self.paid_at:
             self.paid_at = timezone.now()
         super().save(*args, **kwargs)
 
-        if self.status == 1:
-            self.update_loans()
-
-    def update_loans(self):
-        remaining_amount = self.total_amount
-        loans = Loan.objects.filter(
-            customer=self.customer, status=2).order_by('created_at')
+    def update_loans(self, targets=()):
+        """
+        Allocate the payment to the customer's active loans, oldest first.
 
-        for loan in loans:
-            if remaining_amount <= 0:
-                break
+        Delegates to the set-based allocation engine, which locks the loans once and
+        writes every balance change in bulk. Flags the payment as rejected when it
+        exceeds the customer's active debt.
 
-            if loan.status != 2:  # Verificar si el préstamo está activo
-                self.rejected_loans.add(loan)
-                continue  # Pasar al siguiente préstamo
+        Parameters:
+            targets: Iterable of `(loan_id, amount)` pairs to apply before the waterfall.
 
-            if remaining_amount >= loan.outstanding:
-                remaining_amount -= loan.outstanding
-                loan.outstanding = 0
-                loan.status = 4  # paid
-            else:
-                loan.outstanding -= remaining_amount
-                remaining_amount = 0
+        Returns:
+            Decimal: Amount of the payment that could not be allocated.
+        """
+        from payments.services.allocation import allocate_payment
 
-            loan.save()
-
-        if remaining_amount > 0:
-            # Si hay saldo restante en el pago, registrar el préstamo rechazado en el pago
-            self.status = 2  # Cambiar el estado del pago a rechazado
-            self.save()
+        return allocate_payment(self, targets)
 
 
 class PaymentDetail(models.Model):
@@ -70,3 +75,9 @@ class PaymentDetail(models.Model):
         Payment, related_name='details', on_delete=models.CASCADE)
     loan = models.ForeignKey(
         Loan, related_name='payment_details', on_delete=models.CASCADE)
+
+    class Meta:
+        indexes = [
+            # Payment history of a loan, oldest first
+            models.Index(fields=['loan', 'created_at'], name='paymentdetail_loan_created_idx'),
+        ]
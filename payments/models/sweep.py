@@ -0,0 +1,20 @@
+# models/sweep.py
+from django.db import models
+
+
+class SweepCursor(models.Model):
+    """
+    Progress of a chunked sweep over a table, so an interrupted run can resume.
+
+    A run in progress has a `cutoff`, the reference time every chunk of the run uses,
+    and `last_id`, the primary key of the last row swept.
+    """
+
+    name = models.CharField(max_length=60, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    cutoff = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,34 @@
+# models/tombstone.py
+from django.db import models
+from django.utils import timezone
+
+
+class Tombstone(models.Model):
+    """
+    Record of a deleted loan or payment, so delta sync clients can drop it from their copy.
+
+    Customer references are kept as plain values: the customer may be deleted as well.
+    """
+
+    LOAN = 1
+    PAYMENT = 2
+    KIND_CHOICES = (
+        (LOAN, 'loan'),
+        (PAYMENT, 'payment'),
+    )
+
+    kind = models.SmallIntegerField(choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    external_id = models.CharField(max_length=60)
+    customer_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Deletions since a delta sync's timestamp, overall or for one customer
+            models.Index(fields=['kind', 'deleted_at'], name='tombstone_kind_deleted_idx'),
+            models.Index(fields=['kind', 'customer_id', 'deleted_at'], name='tombstone_customer_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_kind_display()} {self.external_id}'
@@ -0,0 +1,144 @@
+# payments/pagination.py
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination ordered by (`created_at`, `id`).
+
+    Each page is fetched with a range condition on the ordering keys of the last row of
+    the previous page, so deep pages cost the same as the first one and no count query
+    is issued. Cursors are opaque, URL-safe tokens.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 10
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Return the page of rows that follows the cursor sent in the request.
+
+        Parameters:
+            queryset: Queryset to paginate.
+            request: HTTP request.
+            view: View being paginated.
+
+        Returns:
+            list: The rows of the page.
+        """
+        return self.get_page(list(self.get_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        """
+        Async variant of `paginate_queryset`, evaluated with the async ORM.
+        """
+        return self.get_page([row async for row in self.get_page_queryset(queryset, request)])
+
+    def get_page_queryset(self, queryset, request):
+        """
+        Restrict the queryset to the rows after the cursor, plus one to detect a next page.
+        """
+        self.request = request
+        self.current_page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by('created_at', 'id')
+        position = self.decode_cursor(request)
+        if position:
+            created_at, pk = position
+            queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+        return queryset[:self.current_page_size + 1]
+
+    def get_page(self, rows):
+        page = rows[:self.current_page_size]
+        self.next_position = self.get_position(page[-1]) if len(rows) > self.current_page_size else None
+        return page
+
+    def get_position(self, row):
+        # Rows are model instances, or `values()` dicts including `created_at` and `pk`
+        if isinstance(row, dict):
+            return row['created_at'], row['pk']
+        return row.created_at, row.pk
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def encode_cursor(self, position):
+        created_at, pk = position
+        payload = json.dumps({'c': created_at.isoformat(), 'i': pk}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+            created_at = parse_datetime(payload['c'])
+            pk = int(payload['i'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk
+
+
+def get_list_paginator(request, page_size=10):
+    """
+    Select the paginator of a listing from the request.
+
+    Keyset pagination is used when the client asks for it with `pagination=cursor` or
+    sends a cursor; page-number pagination remains the default.
+
+    Parameters:
+        request: HTTP request.
+        page_size: Default number of rows per page.
+
+    Returns:
+        BasePagination: The paginator to use.
+    """
+    params = request.query_params
+    if params.get('pagination') == 'cursor' or KeysetPagination.cursor_query_param in params:
+        paginator = KeysetPagination()
+    else:
+        paginator = PageNumberPagination()
+    paginator.page_size = page_size
+    return paginator
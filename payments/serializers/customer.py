@@ -4,7 +4,6 @@ from django.utils import timezone
 from rest_framework import serializers
 
 from payments.models.customer import Customer
-from payments.models.loan import Loan
 
 
 class CustomerSerializer(serializers.ModelSerializer):
@@ -34,18 +33,33 @@ class CustomerSerializer(serializers.ModelSerializer):
         Returns:
             Customer: The created Customer instance.
         """
+        return super().create(self.with_defaults(validated_data))
+
+    @staticmethod
+    def with_defaults(validated_data):
+        """
+        Complete validated customer data with the values set on creation.
+
+        Parameters:
+            validated_data (dict): Data validated by the serializer.
+
+        Returns:
+            dict: The same data with a score (random if missing) and the preapproval timestamp.
+        """
         if 'score' not in validated_data:
             validated_data['score'] = random.randint(1, 100)
 
         validated_data['preapproved_at'] = timezone.now()
-
-        return super().create(validated_data)
+        return validated_data
 
 
 class CustomerBalanceSerializer(serializers.ModelSerializer):
     """
     Serializer for representing a customer's balance and total debt.
 
+    Expects customers annotated by `Customer.objects.with_balance()`; the total debt is
+    read from the customer's debt summary, so no query is issued per customer.
+
     Fields:
         - external_id (str): External identifier for the customer.
         - score (float): Credit score of the customer.
@@ -63,18 +77,14 @@ class CustomerBalanceSerializer(serializers.ModelSerializer):
         Customize the representation of the customer instance to include balance and debt information.
 
         Parameters:
-            instance (Customer): The customer instance being serialized.
+            instance (Customer): The annotated customer instance being serialized.
 
         Returns:
             dict: A dictionary containing the external_id, score, available amount, and total debt of the customer.
         """
-        loans = Loan.objects.filter(customer=instance)
-        total_debt = sum(loan.outstanding for loan in loans)
-        available_amount = instance.score - total_debt
-
         return {
             'external_id': instance.external_id,
             'score': instance.score,
-            'available_amount': available_amount,
-            'total_debt': total_debt
+            'available_amount': instance.available_amount,
+            'total_debt': instance.total_debt
         }
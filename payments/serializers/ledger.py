@@ -0,0 +1,22 @@
+from rest_framework import serializers
+
+from payments.models.ledger import LoanLedgerEntry
+
+
+class LoanLedgerEntrySerializer(serializers.ModelSerializer):
+    """
+    Serializer for loan ledger entries, as returned by the change feed.
+
+    Fields:
+        - id (int): Position of the entry in the feed.
+        - kind (int): Movement kind: opening, origination, payment or adjustment.
+        - amount (decimal): Signed change of the loan's outstanding amount.
+        - balance (decimal): Outstanding amount of the loan after the movement.
+        - created_at (datetime): Timestamp of the movement.
+        - loan, customer, payment (int): Primary keys of the related rows; `payment` is null
+          for movements not caused by a payment.
+    """
+
+    class Meta:
+        model = LoanLedgerEntry
+        fields = ['id', 'kind', 'amount', 'balance', 'created_at', 'loan', 'customer', 'payment']
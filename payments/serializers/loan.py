@@ -25,7 +25,5 @@ class LoanSerializer(serializers.ModelSerializer):
         Returns:
             loan: The created Loan instance.
         """
-        loan = Loan.objects.create(**validated_data)
-        loan.outstanding = validated_data['amount']
-        loan.save()
-        return loan
+        validated_data['outstanding'] = validated_data['amount']
+        return Loan.objects.create(**validated_data)
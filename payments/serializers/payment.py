@@ -1,7 +1,10 @@
-from django.db.models import Sum
+from decimal import Decimal
+
+from django.db import transaction
 from rest_framework import serializers
 
 from payments.models import Customer, Loan, Payment, PaymentDetail
+from payments.services.payment_queue import PENDING, pending_targets
 
 
 class PaymentDetailSerializer(serializers.ModelSerializer):
@@ -42,36 +45,96 @@ class PaymentSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         """
-        Validate the payment data to ensure the customer exists and the payment amount does not exceed the customer's total debt.
+        Validate the payment data to ensure the customer exists, the detail loans belong to
+        it and the payment amount does not exceed the customer's total debt.
+
+        The customer and the detail loans are resolved once here and carried through in the
+        validated data, so creating the payment does not query them again.
 
         Parameters:
             data: Dictionary containing payment data.
 
         Returns:
-            data: Validated payment data.
+            data: Validated payment data, with the `customer` and each detail's `loan`.
 
         Raises:
-            serializers.ValidationError: If the customer does not exist or the payment amount exceeds the customer's total debt.
+            serializers.ValidationError: If the customer does not exist, a detail loan is
+                unknown or belongs to another customer, or the payment amount exceeds the
+                details total or the customer's total debt.
         """
 
-        customer_external_id = data.get('customer_external_id')
-        try:
-            customer = Customer.objects.get(external_id=customer_external_id)
-        except Customer.DoesNotExist:
+        customer = self.get_customer(data.get('customer_external_id'))
+        if customer is None:
             raise serializers.ValidationError(
                 {'customer_external_id': 'Customer does not exist'})
 
-        total_debt = customer.loans.filter(status__in=[1, 2]).aggregate(
-            Sum('outstanding'))['outstanding__sum'] or 0
-        if data['total_amount'] > total_debt:
+        details = data.get('details', [])
+        loans = self.get_loans({detail['loan_external_id'] for detail in details})
+        detail_errors = []
+        for detail in details:
+            loan = loans.get(detail['loan_external_id'])
+            if loan is None:
+                detail_errors.append({'loan_external_id': 'Loan does not exist'})
+            elif loan.customer_id != customer.pk:
+                detail_errors.append({'loan_external_id': 'Loan does not belong to the customer'})
+            else:
+                detail_errors.append({})
+                detail['loan'] = loan
+        if any(detail_errors):
+            raise serializers.ValidationError({'details': detail_errors})
+
+        if sum(detail['amount'] for detail in details) > data['total_amount']:
+            raise serializers.ValidationError(
+                {'details': 'Payment details exceed the payment total amount'})
+
+        if data['total_amount'] > customer.total_debt:
             raise serializers.ValidationError(
                 {'total_amount': 'Payment amount exceeds customer\'s total debt'})
 
+        data['customer'] = customer
         return data
 
+    def get_customer(self, customer_external_id):
+        """
+        Look up the payment's customer, in the preloaded `customers` context if provided.
+
+        Parameters:
+            customer_external_id: External ID of the customer.
+
+        Returns:
+            Customer: The customer, or None if it does not exist.
+        """
+        customers = self.context.get('customers')
+        if customers is not None:
+            return customers.get(str(customer_external_id))
+        return Customer.objects.filter(external_id=customer_external_id).first()
+
+    def get_loans(self, loan_external_ids):
+        """
+        Look up the detail loans with one keyed query, or in the preloaded `loans` context.
+
+        Parameters:
+            loan_external_ids: Set of loan external IDs referenced by the details.
+
+        Returns:
+            dict: Loans keyed by external ID.
+        """
+        loans = self.context.get('loans')
+        if loans is not None:
+            return loans
+        if not loan_external_ids:
+            return {}
+        return Loan.objects.in_bulk(loan_external_ids, field_name='external_id')
+
     def create(self, validated_data):
         """
-        Create a new payment and its related payment details.
+        Create a new payment and allocate it to the customer's active loans.
+
+        The detail amounts are applied to their loans first and the rest of the payment flows
+        through the oldest-first waterfall; the resulting details are inserted in bulk by
+        the allocation engine, in the transaction that inserts the payment. With the
+        `defer_allocation` context the payment is stored as pending, with its declared
+        details, for the `process_payments` worker.
 
         Parameters:
             validated_data: Validated payment data.
@@ -80,17 +143,52 @@ class PaymentSerializer(serializers.ModelSerializer):
             payment: The created Payment instance.
         """
 
-        details_data = validated_data.pop('details')
-        customer_external_id = validated_data.pop('customer_external_id')
-        customer = Customer.objects.get(external_id=customer_external_id)
+        details = validated_data.pop('details')
+        validated_data.pop('customer_external_id')
 
-        payment = Payment.objects.create(customer=customer, **validated_data)
-        for detail_data in details_data:
-            loan_external_id = detail_data.pop('loan_external_id')
-            loan = Loan.objects.get(external_id=loan_external_id)
-            PaymentDetail.objects.create(
-                payment=payment, loan=loan, **detail_data)
+        if self.context.get('defer_allocation'):
+            return Payment.objects.create(
+                **validated_data, status=PENDING, pending_targets=pending_targets(details))
 
-        # Update loans after saving the payment
-        payment.update_loans()
+        # The payment and its allocation commit together, so no reader ever sees a
+        # payment without its details and a failed allocation leaves no payment behind
+        with transaction.atomic():
+            payment = Payment.objects.create(**validated_data)
+            payment.update_loans(targets=[(detail['loan'].pk, detail['amount']) for detail in details])
         return payment
+
+
+class PaymentBatchItemSerializer(PaymentSerializer):
+    """
+    Serializer for one item of a payment batch.
+
+    Validates the same fields as `PaymentSerializer` without issuing queries: customers and
+    loans are read from the preloaded `customers` and `loans` contexts and the uniqueness
+    of `external_id` is checked by the batch processor for the whole batch at once.
+    """
+
+    external_id = serializers.CharField(max_length=60)
+
+
+class StatementLineSerializer(serializers.Serializer):
+    """
+    Serializer for one line of a bank statement to reconcile.
+
+    Fields:
+        reference: External ID of the payment the line records.
+        amount: Amount credited by the bank.
+        loan_external_id: External ID of the loan the payment is for (optional).
+        customer_external_id: External ID of the paying customer (optional).
+
+    A line must identify its customer, directly or through the loan.
+    """
+
+    reference = serializers.CharField(max_length=60)
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0.01'))
+    loan_external_id = serializers.CharField(max_length=60, required=False)
+    customer_external_id = serializers.UUIDField(required=False)
+
+    def validate(self, data):
+        if 'loan_external_id' not in data and 'customer_external_id' not in data:
+            raise serializers.ValidationError('A statement line needs a loan_external_id or a customer_external_id')
+        return data
@@ -0,0 +1,185 @@
+# payments/services/allocation.py
+from decimal import ROUND_DOWN, Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from payments.cache import invalidate_customers
+from payments.models import Loan, LoanLedgerEntry, Payment, PaymentDetail
+from payments.services.debt import record_debt_changes
+from payments.services.ledger import PAYMENT, ledger_entry
+from payments.services.locking import lock_customer
+
+CENT = Decimal('0.01')
+
+
+class PaymentAllocator:
+    """
+    Set-based waterfall allocator for the active and overdue loans of one customer.
+
+    The customer's payable loans are locked and loaded once, any number of payments
+    are applied against them in memory (oldest `created_at` first) and every change
+    is written back with one bulk update, one bulk insert of payment details, one bulk
+    insert of ledger entries, one update for the rejected payments and one update of the
+    customer's debt summary.
+
+    Must be used inside `transaction.atomic()` so the row locks are held until the
+    changes are flushed. The customer's row is locked before its loans, so payments of
+    the same customer are applied one at a time while other customers run in parallel.
+    """
+
+    def __init__(self, customer_id):
+        self.customer_id = customer_id
+        self._customer = None
+        self._loans = None
+        self._changed = {}
+        self._details = []
+        self._entries = []
+        self._rejected = []
+
+    @property
+    def customer(self):
+        """
+        The customer, read under its row lock on first access.
+
+        Returns:
+            Customer: The locked customer.
+        """
+        self._lock_customer()
+        return self._customer
+
+    def _lock_customer(self):
+        # Takes the customer's row lock once per allocator, before any of its loans is locked
+        if self._customer is None:
+            self._customer = lock_customer(self.customer_id)
+
+    @property
+    def loans(self):
+        """
+        Payable loans of the customer, locked and ordered on first access.
+
+        Returns:
+            list: Loan instances with status 'active' or 'overdue'.
+        """
+        if self._loans is None:
+            self._lock_customer()  # Lock order: the customer before its loans
+            self._loans = list(
+                Loan.objects.select_for_update()
+                .filter(customer_id=self.customer_id, status__in=Loan.PAYABLE_STATUSES)
+                .order_by('created_at', 'id')
+            )
+        return self._loans
+
+    def allocate(self, payment, targets=()):
+        """
+        Apply a payment to the loans in memory.
+
+        The amounts declared for specific loans are applied first; whatever is left of the
+        payment then flows through the waterfall, oldest loan first.
+
+        Parameters:
+            payment: Saved Payment instance belonging to the customer.
+            targets: Iterable of `(loan_id, amount)` pairs declared by the payment details.
+
+        Returns:
+            Decimal: Amount of the payment that could not be allocated, in whole cents.
+        """
+        # Balances move in whole cents; a fraction of a cent left over cannot be applied
+        # and does not make the payment exceed the debt
+        remaining = payment.total_amount.quantize(CENT, rounding=ROUND_DOWN)
+        allocated = {}
+
+        if targets:
+            loans_by_pk = {loan.pk: loan for loan in self.loans}
+            for loan_id, amount in targets:
+                loan = loans_by_pk.get(loan_id)
+                if loan is not None and remaining > 0:
+                    remaining -= self._apply(loan, min(amount, remaining), allocated)
+
+        for loan in self.loans:
+            if remaining <= 0:
+                break
+            remaining -= self._apply(loan, remaining, allocated)
+
+        self._details.extend(
+            PaymentDetail(payment=payment, loan=loan, amount=amount) for loan, amount in allocated.items())
+        # The balance after the payment is the loan's outstanding amount at this point
+        self._entries.extend(ledger_entry(loan, -amount, PAYMENT, payment) for loan, amount in allocated.items())
+
+        if remaining > 0:
+            # The payment exceeds the active debt: it is applied but flagged as rejected
+            payment.status = 2
+            self._rejected.append(payment.pk)
+
+        return remaining
+
+    def _apply(self, loan, limit, allocated):
+        if loan.status not in Loan.PAYABLE_STATUSES:  # Paid by a previous allocation of this run
+            return 0
+
+        amount = min(limit, loan.outstanding).quantize(CENT, rounding=ROUND_DOWN)
+        if amount <= 0:
+            return 0
+
+        loan.outstanding -= amount
+        if loan.outstanding == 0:
+            loan.status = 4  # paid
+
+        self._changed[loan.pk] = loan
+        allocated[loan] = allocated.get(loan, 0) + amount
+        return amount
+
+    def flush(self):
+        """
+        Persist every change accumulated by `allocate` with set-based queries.
+
+        Returns:
+            list: The Loan instances that were updated.
+        """
+        now = timezone.now()
+        changed = list(self._changed.values())
+
+        if changed:
+            for loan in changed:
+                loan.updated_at = now
+            Loan.objects.bulk_update(changed, ['outstanding', 'status', 'updated_at'])
+            record_debt_changes(changed)
+            for loan in changed:
+                loan._recorded_outstanding = loan.outstanding
+        if self._details:
+            PaymentDetail.objects.bulk_create(self._details)
+        if self._entries:
+            LoanLedgerEntry.objects.bulk_create(self._entries)
+        if self._rejected:
+            Payment.objects.filter(pk__in=self._rejected).update(status=2, updated_at=now)
+        # Bulk writes send no model signals
+        if self._customer is not None:
+            invalidate_customers(external_ids=[self._customer.external_id])
+        else:
+            invalidate_customers([self.customer_id])
+
+        self._changed = {}
+        self._details = []
+        self._entries = []
+        self._rejected = []
+        return changed
+
+
+def allocate_payment(payment, targets=()):
+    """
+    Allocate a single payment to its customer's active loans in one transaction, or in
+    the caller's transaction when there is one.
+
+    Parameters:
+        payment: Saved Payment instance.
+        targets: Iterable of `(loan_id, amount)` pairs declared by the payment details.
+
+    Returns:
+        Decimal: Amount of the payment that could not be allocated.
+    """
+    # No savepoint when nested: a failed allocation rolls back the caller's transaction
+    with transaction.atomic(savepoint=False):
+        allocator = PaymentAllocator(payment.customer_id)
+        remaining = allocator.allocate(payment, targets)
+        allocator.flush()
+    return remaining
@@ -0,0 +1,141 @@
+# payments/services/customer_upload.py
+import codecs
+import csv
+import json
+import time
+
+from django.db import transaction
+
+from payments.models import Customer
+from payments.serializers.customer import CustomerSerializer
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+UPLOAD_FORMATS = ('csv', 'jsonl')
+
+
+def detect_format(uploaded_file, requested=None):
+    """
+    Resolve the format of an uploaded customer file.
+
+    Parameters:
+        uploaded_file: Django UploadedFile.
+        requested: Format explicitly requested by the client, if any.
+
+    Returns:
+        str: 'csv' or 'jsonl', or None if the format cannot be determined.
+    """
+    if not requested:
+        requested = (uploaded_file.name or '').rsplit('.', 1)[-1]
+
+    requested = requested.lower()
+    if requested == 'ndjson':
+        return 'jsonl'
+    return requested if requested in UPLOAD_FORMATS else None
+
+
+def iter_csv_rows(uploaded_file):
+    """
+    Yield `(row_number, data, error)` for each CSV record, reading the file line by line.
+    """
+    reader = csv.DictReader(codecs.iterdecode(uploaded_file, 'utf-8-sig'))
+    for row_number, row in enumerate(reader, start=1):
+        yield row_number, {key: value for key, value in row.items() if key and value != ''}, None
+
+
+def iter_jsonl_rows(uploaded_file):
+    """
+    Yield `(row_number, data, error)` for each JSON line, reading the file line by line.
+    """
+    row_number = 0
+    for line in uploaded_file:
+        line = line.strip()
+        if not line:
+            continue
+        row_number += 1
+        try:
+            data = json.loads(line)
+        except ValueError:
+            yield row_number, None, {'non_field_errors': ['Invalid JSON']}
+            continue
+        if not isinstance(data, dict):
+            yield row_number, None, {'non_field_errors': ['Expected a JSON object']}
+            continue
+        yield row_number, data, None
+
+
+ROW_READERS = {
+    'csv': iter_csv_rows,
+    'jsonl': iter_jsonl_rows,
+}
+
+
+class CustomerUploader:
+    """
+    Validate customer rows with the `CustomerSerializer` rules and insert them in batches.
+
+    Rows are consumed from an iterator, so memory is bounded by the batch size and the
+    capped error report, not by the size of the upload.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, max_errors=MAX_REPORTED_ERRORS):
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.rows = 0
+        self.created = 0
+        self.rejected = 0
+        self.batches = 0
+        self.errors = []
+
+    def run(self, rows):
+        """
+        Process every row and return the upload report.
+
+        Parameters:
+            rows: Iterable of `(row_number, data, error)` tuples.
+
+        Returns:
+            dict: Per-row errors and throughput stats.
+        """
+        started = time.perf_counter()
+        batch = []
+
+        for row_number, data, error in rows:
+            self.rows += 1
+            if error is None:
+                serializer = CustomerSerializer(data=data)
+                if serializer.is_valid():
+                    batch.append(Customer(**CustomerSerializer.with_defaults(serializer.validated_data)))
+                    if len(batch) >= self.batch_size:
+                        self._insert(batch)
+                        batch = []
+                    continue
+                error = serializer.errors
+            self._reject(row_number, error)
+
+        if batch:
+            self._insert(batch)
+
+        elapsed = time.perf_counter() - started
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'rejected': self.rejected,
+            'batches': self.batches,
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_second': round(self.rows / elapsed, 1) if elapsed else None,
+            'errors': self.errors,
+            'errors_truncated': self.rejected > len(self.errors),
+        }
+
+    def _insert(self, batch):
+        with transaction.atomic():
+            Customer.objects.bulk_create(batch, batch_size=self.batch_size)
+        self.created += len(batch)
+        self.batches += 1
+
+    def _reject(self, row_number, error):
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': row_number, 'errors': error})
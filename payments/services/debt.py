@@ -0,0 +1,77 @@
+# payments/services/debt.py
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from payments.cache import invalidate_customers
+from payments.models import Customer, Loan
+
+
+def record_debt_changes(loans):
+    """
+    Apply the debt summary changes of saved or deleted loans to their customers.
+
+    Each loan's current contribution is compared with the one it had when it was loaded
+    or last recorded, and every affected customer gets one atomic counter update. Loans
+    loaded without the fields needed to know their previous contribution trigger a full
+    refresh of their customer instead.
+
+    Must be called inside the transaction that wrote the loans.
+
+    Parameters:
+        loans: Iterable of Loan instances already written to the database.
+    """
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+    refresh = set()
+
+    for loan in loans:
+        previous = loan._recorded_debt
+        current = loan.debt_contribution()
+        loan._recorded_debt = current
+
+        if previous is Loan.UNKNOWN_DEBT:
+            refresh.add(current[0])
+            continue
+        if previous == current:
+            continue
+        if previous is not None:
+            deltas[previous[0]][0] -= previous[1]
+            deltas[previous[0]][1] -= previous[2]
+        deltas[current[0]][0] += current[1]
+        deltas[current[0]][1] += current[2]
+
+    now = timezone.now()
+    for customer_id, (debt, active_loans) in deltas.items():
+        if customer_id in refresh or (not debt and not active_loans):
+            continue
+        Customer.objects.filter(pk=customer_id).update(
+            total_debt=F('total_debt') + debt,
+            active_loans=F('active_loans') + active_loans,
+            debt_updated_at=now)
+
+    if refresh:
+        refresh_customer_debt(refresh)
+
+
+def refresh_customer_debt(customer_ids):
+    """
+    Recompute the debt summary of the given customers from their loans, in one query.
+
+    Parameters:
+        customer_ids: Iterable of customer primary keys.
+    """
+    customer_ids = list(customer_ids)
+    open_loans = Loan.objects.filter(customer=OuterRef('pk'), status__in=Loan.OPEN_STATUSES).values('customer')
+    active_loans = Loan.objects.filter(customer=OuterRef('pk'), status__in=Loan.PAYABLE_STATUSES).values('customer')
+
+    Customer.objects.filter(pk__in=customer_ids).update(
+        total_debt=Coalesce(
+            Subquery(open_loans.annotate(total=Sum('outstanding')).values('total')),
+            Value(Decimal('0'))),
+        active_loans=Coalesce(
+            Subquery(active_loans.annotate(total=Count('id')).values('total')), Value(0)),
+        debt_updated_at=timezone.now())
+    invalidate_customers(customer_ids)
@@ -0,0 +1,154 @@
+# payments/services/ledger.py
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from payments.models import Loan, LoanLedgerEntry
+from payments.services.debt import refresh_customer_debt
+from payments.services.locking import lock_customers
+from payments.sync import settled_before
+
+OPENING = 1
+ORIGINATION = 2
+PAYMENT = 3
+ADJUSTMENT = 4
+
+FEED_LIMIT = 500
+MAX_FEED_LIMIT = 5000
+FEED_FIELDS = ('id', 'kind', 'amount', 'balance', 'created_at', 'loan', 'customer', 'payment')
+
+
+def ledger_entry(loan, amount, kind, payment=None):
+    """
+    Build the ledger entry of a balance movement already applied to `loan.outstanding`.
+    """
+    return LoanLedgerEntry(
+        loan_id=loan.pk, customer_id=loan.customer_id, payment=payment,
+        kind=kind, amount=amount, balance=loan.outstanding)
+
+
+def ledger_balances(loan_ids):
+    """
+    Return the balance of each loan rebuilt from its ledger entries, in one query.
+
+    Parameters:
+        loan_ids: Iterable of loan primary keys.
+
+    Returns:
+        dict: Sum of the entries keyed by loan primary key; loans without entries are omitted.
+    """
+    return dict(
+        LoanLedgerEntry.objects.filter(loan_id__in=list(loan_ids))
+        .values('loan_id').annotate(total=Sum('amount')).values_list('loan_id', 'total')
+    )
+
+
+def record_balance_changes(loans, kind=ADJUSTMENT):
+    """
+    Insert one ledger entry per loan whose outstanding amount changed since it was recorded.
+
+    Each loan's outstanding amount is compared with the one it had when it was loaded or
+    last recorded; loans that were never saved start from zero. Loans loaded without
+    their outstanding amount are compared with the sum of their ledger entries instead.
+
+    Must be called inside the transaction that wrote the loans.
+
+    Parameters:
+        loans: Iterable of Loan instances already written to the database.
+        kind: Kind of the entries.
+
+    Returns:
+        list: The inserted entries.
+    """
+    loans = list(loans)
+    unknown = [loan.pk for loan in loans if loan._recorded_outstanding is Loan.UNKNOWN_DEBT]
+    balances = ledger_balances(unknown) if unknown else {}
+
+    entries = []
+    for loan in loans:
+        previous = loan._recorded_outstanding
+        if previous is Loan.UNKNOWN_DEBT:
+            previous = balances.get(loan.pk, Decimal('0'))
+        elif previous is None:  # Never saved
+            previous = Decimal('0')
+        loan._recorded_outstanding = loan.outstanding
+        if loan.outstanding != previous:
+            entries.append(ledger_entry(loan, loan.outstanding - previous, kind))
+    return LoanLedgerEntry.objects.bulk_create(entries)
+
+
+def ledger_feed(after=0, limit=FEED_LIMIT, fields=FEED_FIELDS):
+    """
+    Return the ledger entries that follow the entry `after`, in primary key order.
+
+    Entries younger than `PAYMENTS_SYNC_DELAY` seconds end the page: a transaction
+    still running may commit an entry with a lower primary key than one already visible,
+    and a consumer that moved past it would never see it.
+
+    Parameters:
+        after: Primary key of the last entry the consumer has seen.
+        limit: Maximum number of entries.
+        fields: Columns to read, `created_at` included.
+
+    Returns:
+        tuple: The entries as `values()` dicts, and whether more entries may follow.
+    """
+    rows = list(
+        LoanLedgerEntry.objects.filter(pk__gt=after).order_by('pk')
+        .values(*fields)[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    horizon = settled_before()
+    for index, row in enumerate(rows):
+        if row['created_at'] > horizon:
+            rows, has_more = rows[:index], True
+            break
+    return rows, has_more
+
+
+def ledger_balance():
+    """
+    Expression of a loan's balance rebuilt from its ledger entries, zero without entries.
+    """
+    total = (
+        LoanLedgerEntry.objects.filter(loan_id=OuterRef('pk'))
+        .values('loan_id').annotate(total=Sum('amount')).values('total')
+    )
+    output_field = DecimalField(max_digits=12, decimal_places=2)
+    return Coalesce(Subquery(total, output_field=output_field), Value(Decimal('0')), output_field=output_field)
+
+
+def ledger_mismatches():
+    """
+    Return the loans whose outstanding amount differs from the sum of their ledger entries.
+
+    Returns:
+        QuerySet: Loans annotated with `ledger_balance`.
+    """
+    return Loan.objects.annotate(ledger_balance=ledger_balance()).exclude(outstanding=F('ledger_balance'))
+
+
+def rebuild_balances(loan_ids):
+    """
+    Reset the outstanding amount of the given loans to the sum of their ledger entries.
+
+    The loans are written with one update under their customers' row locks, and the
+    customers' debt summaries are recomputed. Must be called inside `transaction.atomic()`.
+
+    Parameters:
+        loan_ids: Iterable of loan primary keys.
+
+    Returns:
+        int: Number of loans rebuilt.
+    """
+    loans = Loan.objects.filter(pk__in=list(loan_ids))
+    customer_ids = set(loans.values_list('customer_id', flat=True))
+    lock_customers(customer_ids)
+    rebuilt = loans.update(outstanding=ledger_balance(), updated_at=timezone.now())
+    if customer_ids:
+        refresh_customer_debt(customer_ids)
+    return rebuilt
@@ -0,0 +1,48 @@
+# payments/services/locking.py
+from django.db import connection
+from django.db.models import F
+
+from payments.models import Customer
+
+# Lock order: a customer's row is always locked before any of its loans, so origination,
+# allocation, loan updates and the overdue sweep never wait on each other in a cycle.
+
+
+def lock_customers(customer_ids, skip_locked=False, fields=None):
+    """
+    Lock the rows of the given customers until the end of the transaction, in primary key order.
+
+    Only writers of the same customers wait on each other; every other customer proceeds
+    in parallel. On databases without row locks (SQLite) a no-op update takes the write
+    lock up front instead, serializing the writers.
+
+    Must be called inside `transaction.atomic()`, before the transaction reads the rows.
+
+    Parameters:
+        customer_ids: Iterable of customer primary keys.
+        skip_locked: Leave out customers already locked by another transaction instead of
+            waiting for them.
+        fields: Columns to read, all by default.
+
+    Returns:
+        dict: The locked Customer instances, freshly read, keyed by primary key.
+    """
+    customer_ids = sorted(set(customer_ids))
+    customers = Customer.objects.filter(pk__in=customer_ids).order_by('pk')
+    if fields:
+        customers = customers.only(*fields)
+    if connection.features.has_select_for_update:
+        customers = customers.select_for_update(skip_locked=skip_locked)
+    else:
+        Customer.objects.filter(pk__in=customer_ids).update(total_debt=F('total_debt'))
+    return {customer.pk: customer for customer in customers}
+
+
+def lock_customer(customer_id):
+    """
+    Lock one customer's row until the end of the transaction.
+
+    Returns:
+        Customer: The freshly read customer, or None if it does not exist.
+    """
+    return lock_customers([customer_id]).get(customer_id)
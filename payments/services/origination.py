@@ -0,0 +1,26 @@
+# payments/services/origination.py
+from django.db import transaction
+
+from payments.services.locking import lock_customer
+
+
+def originate_loan(serializer):
+    """
+    Save a validated loan if it fits the customer's credit limit.
+
+    The limit is checked against the customer's debt read under the customer's row lock,
+    so concurrent originations for one customer are applied one at a time and can never
+    exceed the limit together, while other customers' originations run in parallel.
+
+    Parameters:
+        serializer: Validated `LoanSerializer`.
+
+    Returns:
+        Loan: The created loan, or None if it exceeds the customer's credit limit.
+    """
+    with transaction.atomic():
+        customer = lock_customer(serializer.validated_data['customer'].pk)
+        if customer.total_debt + serializer.validated_data['amount'] > customer.score:
+            return None
+        serializer.validated_data['customer'] = customer
+        return serializer.save()
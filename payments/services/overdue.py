@@ -0,0 +1,113 @@
+# payments/services/overdue.py
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from payments.cache import invalidate_customers
+from payments.models import Loan, SweepCursor
+from payments.services.debt import record_debt_changes
+from payments.services.locking import lock_customers
+
+CURSOR_NAME = 'overdue_loans'
+CHUNK_SIZE = 1000
+
+ACTIVE = 2
+PAID = 4
+OVERDUE = 5
+
+
+def transition(loan, cutoff):
+    """
+    Return the status an active loan moves to at `cutoff`, or None if it stays active.
+    """
+    if loan.outstanding == 0:
+        return PAID
+    if loan.maximum_payment_date is not None and loan.maximum_payment_date < cutoff:
+        return OVERDUE
+    return None
+
+
+def sweep_chunk(cutoff, after_id=0, size=CHUNK_SIZE):
+    """
+    Apply the status transitions of the next chunk of active loans, in one short transaction.
+
+    Following the lock order of the other writers, the customers of the chunk's candidate
+    loans are locked first, with `skip_locked`: loans of customers held by a running
+    origination or payment allocation are left for the next run instead of being waited
+    on. The remaining loans are re-read under lock and written back with one
+    `UPDATE ... WHERE id IN (...)` per target status and one debt summary update per
+    affected customer.
+
+    Parameters:
+        cutoff: Loans whose `maximum_payment_date` is before it become overdue.
+        after_id: Primary key after which the chunk starts.
+        size: Maximum number of loans in the chunk.
+
+    Returns:
+        dict: `last_id` of the chunk (None once the table is exhausted) and the number
+            of `scanned`, `overdue` and `paid` loans.
+    """
+    report = {'last_id': None, 'scanned': 0, 'overdue': 0, 'paid': 0}
+    due = Q(outstanding=0) | Q(maximum_payment_date__lt=cutoff)
+    with transaction.atomic():
+        candidates = list(
+            Loan.objects.filter(due, pk__gt=after_id, status=ACTIVE)
+            .order_by('pk').values_list('pk', 'customer_id')[:size]
+        )
+        if not candidates:
+            return report
+
+        locked = lock_customers({customer_id for _, customer_id in candidates}, skip_locked=True, fields=['id'])
+        loans = list(
+            Loan.objects.select_for_update()
+            .filter(due, pk__in=[pk for pk, customer_id in candidates if customer_id in locked], status=ACTIVE)
+            .only('id', 'status', 'outstanding', 'maximum_payment_date', 'customer_id')
+            .order_by('pk')
+        )
+
+        now = timezone.now()
+        by_status = {PAID: [], OVERDUE: []}
+        for loan in loans:
+            status = transition(loan, cutoff)
+            if status is not None:
+                loan.status = status
+                by_status[status].append(loan)
+        report['paid'], report['overdue'] = len(by_status[PAID]), len(by_status[OVERDUE])
+
+        for status, status_loans in by_status.items():
+            if status_loans:
+                Loan.objects.filter(pk__in=[loan.pk for loan in status_loans]).update(status=status, updated_at=now)
+        changed = by_status[PAID] + by_status[OVERDUE]
+        if changed:
+            record_debt_changes(changed)
+            # Bulk writes send no model signals
+            invalidate_customers({loan.customer_id for loan in changed})
+
+        report['last_id'] = candidates[-1][0]
+        report['scanned'] = len(candidates)
+        SweepCursor.objects.filter(name=CURSOR_NAME).update(last_id=report['last_id'], updated_at=now)
+    return report
+
+
+def start_sweep(restart=False):
+    """
+    Return the cursor of the overdue sweep, resuming the unfinished run if there is one.
+
+    Parameters:
+        restart: Discard the progress of an unfinished run.
+
+    Returns:
+        SweepCursor: Cursor with the run's `cutoff` and `last_id`.
+    """
+    cursor, _ = SweepCursor.objects.get_or_create(name=CURSOR_NAME)
+    if cursor.cutoff is None or restart:
+        cursor.cutoff = cursor.started_at = timezone.now()
+        cursor.last_id = 0
+        cursor.save()
+    return cursor
+
+
+def finish_sweep(cursor):
+    cursor.cutoff = None
+    cursor.last_id = 0
+    cursor.save(update_fields=['cutoff', 'last_id', 'updated_at'])
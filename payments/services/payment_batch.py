@@ -0,0 +1,170 @@
+# payments/services/payment_batch.py
+import uuid
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from payments.models import Customer, Loan, Payment
+from payments.serializers.payment import PaymentBatchItemSerializer
+from payments.services.allocation import PaymentAllocator
+
+MAX_BATCH_SIZE = 5000
+
+
+def preload_customers(external_ids):
+    """
+    Fetch the customers referenced by a batch with one query.
+
+    Parameters:
+        external_ids: Iterable of customer external IDs as sent by the client.
+
+    Returns:
+        dict: Customers keyed by the string form of their external ID.
+    """
+    valid_ids = set()
+    for external_id in external_ids:
+        try:
+            valid_ids.add(uuid.UUID(str(external_id)))
+        except ValueError:
+            continue
+    customers = Customer.objects.in_bulk(valid_ids, field_name='external_id')
+    return {str(external_id): customer for external_id, customer in customers.items()}
+
+
+def preload_loans(items):
+    """
+    Fetch the loans referenced by the details of a batch with one query.
+
+    Parameters:
+        items: Payment payloads of the batch.
+
+    Returns:
+        dict: Loans keyed by external ID.
+    """
+    external_ids = set()
+    for item in items:
+        details = item.get('details')
+        if isinstance(details, list):
+            external_ids.update(
+                str(detail['loan_external_id']) for detail in details
+                if isinstance(detail, dict) and 'loan_external_id' in detail)
+    if not external_ids:
+        return {}
+    return Loan.objects.in_bulk(external_ids, field_name='external_id')
+
+
+class PaymentBatchProcessor:
+    """
+    Validate, persist and allocate a batch of payments.
+
+    Customers, detail loans and already used payment external IDs are preloaded with one
+    query each; the payments of each customer are then inserted and allocated in one
+    transaction with a single `PaymentAllocator` pass.
+    """
+
+    def process(self, items, customers=None, loans=None):
+        """
+        Process the batch and return one result per item, in input order.
+
+        Parameters:
+            items: List of payment payloads, in the `PaymentSerializer` input format.
+            customers: Customers already loaded by the caller, keyed by the string form of
+                their external ID; preloaded from the items when omitted.
+            loans: Detail loans already loaded by the caller, keyed by external ID.
+
+        Returns:
+            list: Dicts with the item `index`, `external_id`, `result` ('created', 'rejected'
+                or 'invalid') and the validation `errors` or the payment `status`.
+        """
+        results = [None] * len(items)
+        payloads = [item for item in items if isinstance(item, dict)]
+        context = {
+            'customers': (customers if customers is not None
+                          else preload_customers(item.get('customer_external_id') for item in payloads)),
+            'loans': loans if loans is not None else preload_loans(payloads),
+        }
+        used_ids = set(Payment.objects.filter(
+            external_id__in=[item.get('external_id') for item in payloads]
+        ).values_list('external_id', flat=True))
+
+        # One instance validates every item, sparing a copy of its nested fields per item
+        serializer = PaymentBatchItemSerializer(context=context)
+        groups = defaultdict(list)
+        for index, item in enumerate(items):
+            try:
+                data = serializer.run_validation(item)
+            except ValidationError as exc:
+                results[index] = self._invalid(index, item, exc.detail)
+                continue
+
+            if data['external_id'] in used_ids:
+                results[index] = self._invalid(index, item, {'external_id': ['Payment external_id already exists']})
+                continue
+            used_ids.add(data['external_id'])
+            groups[data['customer'].pk].append((index, data))
+
+        for customer_id, group in groups.items():
+            self._process_customer(customer_id, group, results)
+        return results
+
+    def _process_customer(self, customer_id, group, results):
+        try:
+            with transaction.atomic():
+                allocator = PaymentAllocator(customer_id)
+                customer = allocator.customer
+                remaining_debt = customer.total_debt
+                now = timezone.now()
+
+                accepted = []
+                for index, data in group:
+                    if data['total_amount'] > remaining_debt:
+                        results[index] = self._invalid(
+                            index, data, {'total_amount': ['Payment amount exceeds customer\'s total debt']})
+                        continue
+                    remaining_debt -= data['total_amount']
+                    payment = Payment(
+                        external_id=data['external_id'], total_amount=data['total_amount'],
+                        customer=customer, status=1, paid_at=now)
+                    targets = [(detail['loan'].pk, detail['amount']) for detail in data['details']]
+                    accepted.append((index, payment, targets))
+
+                Payment.objects.bulk_create([payment for _, payment, _ in accepted])
+
+                for _, payment, targets in accepted:
+                    allocator.allocate(payment, targets)
+                allocator.flush()
+        except IntegrityError:
+            # A concurrent request may have stored some of the external IDs since they were
+            # checked: reject those and retry the rest of the group
+            taken = set(Payment.objects.filter(
+                external_id__in=[data['external_id'] for _, data in group]).values_list('external_id', flat=True))
+            for index, data in group:
+                if data['external_id'] in taken:
+                    results[index] = self._invalid(
+                        index, data, {'external_id': ['Payment external_id already exists']})
+                elif not taken:
+                    results[index] = self._invalid(
+                        index, data, {'non_field_errors': ['The customer\'s payments could not be stored']})
+            remaining = [(index, data) for index, data in group if data['external_id'] not in taken]
+            if taken and remaining:
+                self._process_customer(customer_id, remaining, results)
+            return
+
+        for index, payment, _ in accepted:
+            results[index] = {
+                'index': index,
+                'external_id': payment.external_id,
+                'result': 'created' if payment.status == 1 else 'rejected',
+                'status': payment.status,
+            }
+
+    @staticmethod
+    def _invalid(index, item, errors):
+        return {
+            'index': index,
+            'external_id': item.get('external_id') if isinstance(item, dict) else None,
+            'result': 'invalid',
+            'errors': errors,
+        }
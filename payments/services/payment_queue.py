@@ -0,0 +1,148 @@
+# payments/services/payment_queue.py
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from payments.models import Payment
+from payments.services.allocation import PaymentAllocator
+
+logger = logging.getLogger(__name__)
+
+PENDING = 3
+FAILED = 4
+CLAIM_SIZE = 500
+
+# A payment whose allocation keeps failing is retried with exponential backoff, then failed
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF_SECONDS = 30
+
+
+def pending_targets(details):
+    """
+    Encode the declared details of a payment for the queue.
+
+    Parameters:
+        details: Validated payment details, each with its `loan` and `amount`.
+
+    Returns:
+        list: `[loan_id, amount]` pairs, amounts as strings.
+    """
+    return [[detail['loan'].pk, str(detail['amount'])] for detail in details]
+
+
+def claim_pending(limit=CLAIM_SIZE):
+    """
+    Lock and return the oldest pending payments not locked by another worker.
+
+    Must be called inside `transaction.atomic()`; the rows stay locked until it ends, and
+    `skip_locked` lets concurrent workers claim disjoint sets of payments. Payments backing
+    off after a failed attempt are left out until their `retry_at`.
+
+    Parameters:
+        limit: Maximum number of payments to claim.
+
+    Returns:
+        list: Pending Payment instances, oldest first.
+    """
+    return list(
+        Payment.objects.select_for_update(skip_locked=True)
+        .filter(Q(retry_at__isnull=True) | Q(retry_at__lte=timezone.now()), status=PENDING)
+        .order_by('created_at', 'id')[:limit]
+    )
+
+
+def process_customer_payments(customer_id, payments):
+    """
+    Allocate the pending payments of one customer in a single allocator pass.
+
+    Payments that fit the customer's active debt are marked completed; the rest are
+    flagged as rejected by the allocator.
+
+    Parameters:
+        customer_id: Primary key of the customer.
+        payments: The customer's claimed pending payments, oldest first.
+
+    Returns:
+        tuple: Number of completed and rejected payments.
+    """
+    allocator = PaymentAllocator(customer_id)
+    completed = []
+    for payment in payments:
+        targets = [(loan_id, Decimal(amount)) for loan_id, amount in payment.pending_targets or ()]
+        if allocator.allocate(payment, targets) <= 0:
+            completed.append(payment.pk)
+
+    now = timezone.now()
+    Payment.objects.filter(pk__in=completed).update(
+        status=1, paid_at=now, pending_targets=None, updated_at=now)
+    allocator.flush()
+    return len(completed), len(payments) - len(completed)
+
+
+def record_failure(payments):
+    """
+    Count a failed allocation attempt of the given payments.
+
+    Each payment backs off for `RETRY_BACKOFF_SECONDS`, doubled on every attempt, so the
+    oldest payments of the queue cannot block it; after `MAX_ATTEMPTS` it is failed.
+
+    Parameters:
+        payments: Claimed pending Payment instances whose allocation raised.
+
+    Returns:
+        int: Number of payments failed for good.
+    """
+    now = timezone.now()
+    for payment in payments:
+        payment.attempts += 1
+        payment.updated_at = now
+        if payment.attempts >= MAX_ATTEMPTS:
+            payment.status = FAILED
+            payment.retry_at = None
+        else:
+            payment.retry_at = now + timedelta(seconds=RETRY_BACKOFF_SECONDS * 2 ** (payment.attempts - 1))
+    Payment.objects.bulk_update(payments, ['attempts', 'retry_at', 'status', 'updated_at'])
+    return sum(payment.status == FAILED for payment in payments)
+
+
+def drain_pending(limit=CLAIM_SIZE):
+    """
+    Claim one batch of pending payments and process it, coalesced per customer.
+
+    Each customer's payments are applied in their own savepoint, so a failure leaves the
+    other customers of the batch unaffected. The failed payments stay pending and back off
+    before their next attempt, until `MAX_ATTEMPTS` fails them for good.
+
+    Parameters:
+        limit: Maximum number of payments to claim.
+
+    Returns:
+        dict: Number of claimed, completed and rejected payments, of payments whose
+            attempt `failed`, and of those `abandoned` after their last attempt.
+    """
+    report = {'claimed': 0, 'completed': 0, 'rejected': 0, 'failed': 0, 'abandoned': 0}
+    with transaction.atomic():
+        payments = claim_pending(limit)
+        report['claimed'] = len(payments)
+
+        by_customer = defaultdict(list)
+        for payment in payments:
+            by_customer[payment.customer_id].append(payment)
+
+        for customer_id, customer_payments in by_customer.items():
+            try:
+                with transaction.atomic():
+                    completed, rejected = process_customer_payments(customer_id, customer_payments)
+            except Exception:
+                logger.exception('Allocation of the pending payments of customer %s failed', customer_id)
+                report['failed'] += len(customer_payments)
+                report['abandoned'] += record_failure(customer_payments)
+                continue
+            report['completed'] += completed
+            report['rejected'] += rejected
+    return report
@@ -0,0 +1,172 @@
+# payments/services/reconciliation.py
+import time
+
+from rest_framework import serializers
+
+from payments.models import Loan, Payment
+from payments.serializers.payment import StatementLineSerializer
+from payments.services.payment_batch import PaymentBatchProcessor, preload_customers
+
+BATCH_SIZE = 1000
+MAX_REPORTED_LINES = 1000
+
+
+class StatementReconciler:
+    """
+    Reconcile bank statement lines with the recorded payments, in batches.
+
+    Each batch of lines is matched against hash indexes of the payments, loans and
+    customers it references, each built with one bulk keyed query. Lines without a
+    payment are created and allocated through `PaymentBatchProcessor`. Lines are
+    consumed from an iterator, so memory is bounded by the batch size, the capped line
+    report and the set of references this run created, not by the rest of the statement.
+
+    Every line ends up in one category:
+
+    - matched: a payment with the same reference, amount and customer already exists.
+    - new: no payment existed; one was created and allocated (`rejected` counts those
+      exceeding the customer's active debt, stored flagged as rejected).
+    - duplicate: the reference repeats a line already imported by this run.
+    - unmatched: the line is invalid, references an unknown loan or customer, differs
+      from the recorded payment, or the payment could not be created.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, max_reported=MAX_REPORTED_LINES):
+        self.batch_size = batch_size
+        self.max_reported = max_reported
+        self.counts = {'lines': 0, 'matched': 0, 'new': 0, 'rejected': 0, 'duplicate': 0, 'unmatched': 0}
+        self.batches = 0
+        self.reported = []
+        # References of the payments this run created, to tell its own payments from
+        # ones other writers recorded while it ran
+        self.imported = set()
+        # One instance validates every line, sparing a copy of its fields per line
+        self.line_serializer = StatementLineSerializer()
+
+    def run(self, rows):
+        """
+        Reconcile every line and return the reconciliation report.
+
+        Parameters:
+            rows: Iterable of `(line_number, data, error)` tuples, as produced by the
+                readers of `payments.services.customer_upload.ROW_READERS`.
+
+        Returns:
+            dict: Count of lines per category, throughput stats and the unmatched and
+                duplicate lines with their reason.
+        """
+        started = time.perf_counter()
+        batch = []
+
+        for line_number, data, error in rows:
+            self.counts['lines'] += 1
+            if error is None:
+                try:
+                    batch.append((line_number, self.line_serializer.run_validation(data)))
+                except serializers.ValidationError as exc:
+                    error = serializers.as_serializer_error(exc)
+                else:
+                    if len(batch) >= self.batch_size:
+                        self._reconcile(batch)
+                        batch = []
+                    continue
+            self._report(line_number, data, 'unmatched', error)
+
+        if batch:
+            self._reconcile(batch)
+
+        elapsed = time.perf_counter() - started
+        unreported = self.counts['duplicate'] + self.counts['unmatched'] - len(self.reported)
+        return {
+            **self.counts,
+            'batches': self.batches,
+            'elapsed_seconds': round(elapsed, 3),
+            'lines_per_second': round(self.counts['lines'] / elapsed, 1) if elapsed else None,
+            'report': self.reported,
+            'report_truncated': unreported > 0,
+        }
+
+    def _reconcile(self, batch):
+        payments = {
+            external_id: (total_amount, customer_id)
+            for external_id, total_amount, customer_id in Payment.objects.filter(
+                external_id__in={line['reference'] for _, line in batch},
+            ).values_list('external_id', 'total_amount', 'customer_id')
+        }
+        loans = Loan.objects.select_related('customer').in_bulk(
+            {line['loan_external_id'] for _, line in batch if 'loan_external_id' in line}, field_name='external_id')
+        customers = preload_customers(
+            line['customer_external_id'] for _, line in batch if 'customer_external_id' in line)
+        for loan in loans.values():
+            customers.setdefault(str(loan.customer.external_id), loan.customer)
+
+        seen = {}
+        new_lines = []
+        new_items = []
+        for line_number, line in batch:
+            reference = line['reference']
+            if reference in seen:
+                self._report(line_number, line, 'duplicate', f'Repeats line {seen[reference]}')
+                continue
+            seen[reference] = line_number
+
+            customer, error = self._resolve_customer(line, loans, customers)
+            if error:
+                self._report(line_number, line, 'unmatched', error)
+                continue
+
+            payment = payments.get(reference)
+            if payment is not None:
+                total_amount, customer_id = payment
+                if reference in self.imported:
+                    self._report(line_number, line, 'duplicate', 'Payment already imported by this run')
+                elif total_amount != line['amount'] or customer_id != customer.pk:
+                    self._report(line_number, line, 'unmatched', 'Differs from the recorded payment')
+                else:
+                    self.counts['matched'] += 1
+                continue
+
+            details = []
+            if 'loan_external_id' in line:
+                details.append({'loan_external_id': line['loan_external_id'], 'amount': line['amount']})
+            new_lines.append((line_number, line))
+            new_items.append({
+                'external_id': reference,
+                'total_amount': line['amount'],
+                'customer_external_id': str(customer.external_id),
+                'details': details,
+            })
+
+        if new_items:
+            results = PaymentBatchProcessor().process(new_items, customers=customers, loans=loans)
+            for (line_number, line), result in zip(new_lines, results):
+                if result['result'] == 'invalid':
+                    self._report(line_number, line, 'unmatched', result['errors'])
+                    continue
+                self.imported.add(line['reference'])
+                self.counts['new'] += 1
+                self.counts['rejected'] += result['result'] == 'rejected'
+        self.batches += 1
+
+    @staticmethod
+    def _resolve_customer(line, loans, customers):
+        loan = None
+        if 'loan_external_id' in line:
+            loan = loans.get(line['loan_external_id'])
+            if loan is None:
+                return None, 'Unknown loan'
+        if 'customer_external_id' not in line:
+            return loan.customer, None
+
+        customer = customers.get(str(line['customer_external_id']))
+        if customer is None:
+            return None, 'Unknown customer'
+        if loan is not None and loan.customer_id != customer.pk:
+            return None, 'Loan does not belong to the customer'
+        return customer, None
+
+    def _report(self, line_number, line, result, reason):
+        self.counts[result] += 1
+        if len(self.reported) < self.max_reported:
+            reference = line.get('reference') if isinstance(line, dict) else None
+            self.reported.append({'line': line_number, 'reference': reference, 'result': result, 'reason': reason})
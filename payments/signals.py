@@ -0,0 +1,44 @@
+# payments/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from payments.cache import invalidate_customers
+from payments.models import Customer, Loan, Payment, PaymentDetail, Tombstone
+from payments.services.debt import refresh_customer_debt
+
+
+@receiver([post_save, post_delete], sender=Customer)
+def invalidate_customer(sender, instance, **kwargs):
+    invalidate_customers(external_ids=[instance.external_id])
+
+
+@receiver([post_save, post_delete], sender=Loan)
+@receiver([post_save, post_delete], sender=Payment)
+def invalidate_owner(sender, instance, **kwargs):
+    if sender.customer.is_cached(instance):
+        invalidate_customers(external_ids=[instance.customer.external_id])
+    else:
+        invalidate_customers(customer_ids=[instance.customer_id])
+
+
+@receiver([post_save, post_delete], sender=PaymentDetail)
+def invalidate_payment_owner(sender, instance, **kwargs):
+    if PaymentDetail.payment.is_cached(instance):
+        invalidate_owner(Payment, instance.payment)
+    else:
+        invalidate_customers(external_ids=Customer.objects.filter(
+            payments=instance.payment_id).values_list('external_id', flat=True))
+
+
+@receiver(post_delete, sender=Loan)
+def refresh_owner_debt(sender, instance, **kwargs):
+    # Runs for `Loan.delete` and `QuerySet.delete` alike, in the deleting transaction
+    refresh_customer_debt([instance.customer_id])
+
+
+@receiver(post_delete, sender=Loan)
+@receiver(post_delete, sender=Payment)
+def record_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(
+        kind=Tombstone.LOAN if sender is Loan else Tombstone.PAYMENT, object_id=instance.pk,
+        external_id=instance.external_id, customer_id=instance.customer_id)
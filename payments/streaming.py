@@ -0,0 +1,95 @@
+# payments/streaming.py
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+from payments.serializers.fast import FastListSerializer
+
+EXPORT_CONTENT_TYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+
+CHUNK_SIZE = 2000
+
+
+def iter_json_array(rows):
+    """
+    Encode rows as the pieces of one JSON array.
+    """
+    yield '['
+    separator = ''
+    for row in rows:
+        yield separator + row
+        separator = ','
+    yield ']'
+
+
+def iter_ndjson(rows):
+    """
+    Encode rows as newline-delimited JSON.
+    """
+    for row in rows:
+        yield row + '\n'
+
+
+ENCODERS = {
+    'json': iter_json_array,
+    'ndjson': iter_ndjson,
+}
+
+
+def iter_serialized(queryset, serializer_class, chunk_size=CHUNK_SIZE):
+    """
+    Serialize a queryset one row at a time, fetching it from the database in chunks.
+
+    Rows are read with `values()` and converted by the fast path of the serializer, which
+    renders the same representation without building model instances.
+
+    Parameters:
+        queryset: Queryset to export.
+        serializer_class: Serializer used for each row.
+        chunk_size: Number of rows fetched per database round-trip.
+
+    Yields:
+        str: The JSON encoding of each row.
+    """
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    serializer = FastListSerializer(serializer_class)
+    for row in serializer.iter_rows(serializer.values(queryset).iterator(chunk_size=chunk_size)):
+        yield encoder.encode(row)
+
+
+def buffered(pieces, chunk_size=CHUNK_SIZE):
+    """
+    Group small string pieces so the response is written in fewer, larger blocks.
+    """
+    buffer = []
+    for piece in pieces:
+        buffer.append(piece)
+        if len(buffer) >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def streaming_export(queryset, serializer_class, export_format, chunk_size=CHUNK_SIZE):
+    """
+    Build a streaming response that writes a queryset as a JSON array or as NDJSON.
+
+    Rows are fetched with server-side chunking and encoded incrementally, so peak memory
+    is bounded by the chunk size rather than by the number of rows.
+
+    Parameters:
+        queryset: Queryset to export.
+        serializer_class: Serializer used for each row.
+        export_format: 'json' or 'ndjson'.
+        chunk_size: Number of rows fetched and written per block.
+
+    Returns:
+        StreamingHttpResponse: The streaming response.
+    """
+    rows = iter_serialized(queryset, serializer_class, chunk_size)
+    return StreamingHttpResponse(
+        buffered(ENCODERS[export_format](rows), chunk_size),
+        content_type=EXPORT_CONTENT_TYPES[export_format])
@@ -0,0 +1,156 @@
+# payments/sync.py
+import base64
+import json
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from payments.models import Tombstone
+
+
+def settled_before():
+    """
+    Return the time before which every committed change is visible.
+
+    Changes younger than `PAYMENTS_SYNC_DELAY` seconds may still be joined by older ones
+    from transactions that have not committed yet, so incremental reads stop at it.
+    """
+    return timezone.now() - timedelta(seconds=getattr(settings, 'PAYMENTS_SYNC_DELAY', 0))
+
+
+class DeltaSync:
+    """
+    Delta of a listing requested with `?updated_since=<timestamp>` or `?sync_cursor=<token>`.
+
+    The delta holds a page of the rows changed and of the tombstones written after a
+    position, each in (`updated_at`, `id`) or (`deleted_at`, `id`) order. A first sync
+    starts from `updated_since`; every response carries a `sync_cursor` built from the last
+    row and tombstone returned, which the client sends back to resume exactly after them,
+    ties on the timestamp included. `has_more` tells whether the next page can be read
+    right away. Status changes are updates, so changed rows come back whole.
+    """
+
+    since_query_param = 'updated_since'
+    cursor_query_param = 'sync_cursor'
+    limit_query_param = 'limit'
+    limit = 500
+    max_limit = 5000
+
+    def __init__(self, request):
+        self.changed_after = self.deleted_after = None
+        self.has_more = False
+        params = request.query_params
+        if self.cursor_query_param in params:
+            self.changed_after, self.deleted_after = self.decode_cursor(params[self.cursor_query_param])
+        elif self.since_query_param in params:
+            since = self.parse_timestamp(params[self.since_query_param])
+            if since is None:
+                raise ValidationError({self.since_query_param: ['Expected an ISO 8601 timestamp.']})
+            self.changed_after = self.deleted_after = (since, None)
+        else:
+            return
+
+        try:
+            self.limit = min(max(int(params.get(self.limit_query_param, self.limit)), 1), self.max_limit)
+        except ValueError:
+            raise ValidationError({self.limit_query_param: ['Expected an integer.']})
+        self.settled_before = settled_before()
+
+    @property
+    def requested(self):
+        return self.changed_after is not None
+
+    @staticmethod
+    def parse_timestamp(value):
+        # An unencoded '+' of the UTC offset arrives as a space
+        try:
+            timestamp = parse_datetime(value.strip().replace(' ', '+'))
+        except ValueError:
+            return None
+        if timestamp is not None and timezone.is_naive(timestamp):
+            timestamp = timezone.make_aware(timestamp, dt_timezone.utc)
+        return timestamp
+
+    def page(self, queryset, field, position):
+        """
+        Read the rows of `queryset` that follow `position` in (`field`, `id`) order.
+
+        Rows younger than `PAYMENTS_SYNC_DELAY` seconds are left for a later call.
+
+        Returns:
+            tuple: The rows, and the position of the last one.
+        """
+        timestamp, pk = position
+        after = Q(**{f'{field}__gt': timestamp})
+        if pk is not None:
+            after |= Q(**{field: timestamp, 'id__gt': pk})
+        rows = list(
+            queryset.filter(after, **{f'{field}__lte': self.settled_before})
+            .order_by(field, 'id')[:self.limit + 1]
+        )
+        if len(rows) > self.limit:
+            rows, self.has_more = rows[:self.limit], True
+        position = (rows[-1][field], rows[-1]['id']) if rows else position
+        return rows, position
+
+    def changed(self, rows):
+        """
+        Return the page of rows updated after the cursor, oldest change first.
+
+        Parameters:
+            rows: `values()` queryset including `updated_at` and `id`.
+
+        Returns:
+            list: The rows of the page.
+        """
+        rows, self.changed_after = self.page(rows, 'updated_at', self.changed_after)
+        return rows
+
+    def deleted(self, kind, **filters):
+        """
+        Return the page of rows of `kind` deleted after the cursor.
+
+        Parameters:
+            kind: `Tombstone.LOAN` or `Tombstone.PAYMENT`.
+            filters: Additional tombstone filters, such as `customer_id`.
+
+        Returns:
+            list: Dicts with the `id`, `external_id` and `deleted_at` of each deleted row.
+        """
+        tombstones = Tombstone.objects.filter(kind=kind, **filters).values(
+            'id', 'object_id', 'external_id', 'deleted_at')
+        tombstones, self.deleted_after = self.page(tombstones, 'deleted_at', self.deleted_after)
+        return [
+            {'id': tombstone['object_id'], 'external_id': tombstone['external_id'],
+             'deleted_at': tombstone['deleted_at']}
+            for tombstone in tombstones
+        ]
+
+    def data(self, results, deleted):
+        return {
+            'results': results,
+            'deleted': deleted,
+            self.cursor_query_param: self.encode_cursor(),
+            'has_more': self.has_more,
+        }
+
+    def encode_cursor(self):
+        payload = json.dumps(
+            [[timestamp.isoformat(), pk] for timestamp, pk in (self.changed_after, self.deleted_after)],
+            separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, encoded):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+            positions = [(self.parse_timestamp(timestamp), None if pk is None else int(pk))
+                         for timestamp, pk in payload]
+        except (TypeError, ValueError, AttributeError):
+            positions = None
+        if not positions or len(positions) != 2 or any(timestamp is None for timestamp, _ in positions):
+            raise ValidationError({self.cursor_query_param: ['Invalid cursor.']})
+        return positions
@@ -1,3 +1,1604 @@
-from django.test import TestCase
+import json
+import re
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import (AsyncClient, RequestFactory, TestCase,
+                         TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.db_router import (aiter_on_replica, current_replica, next_replica,
+                            use_replica)
+from core.instrumentation import metrics, registry
+from payments.benchmarks.seed import seed_portfolio
+from payments.benchmarks.suite import (BASELINE_PATH, compare, load_baseline,
+                                       run_suite)
+from payments.cache import get_cache, requests_counter
+from payments.models import (Customer, Loan, LoanLedgerEntry, Payment,
+                             PaymentDetail, SweepCursor, Tombstone)
+from payments.serializers.customer import CustomerSerializer
+from payments.serializers.fast import FastListSerializer
+from payments.serializers.loan import LoanSerializer
+from payments.serializers.payment import PaymentSerializer
+from payments.services.allocation import PaymentAllocator
+from payments.services.customer_upload import CustomerUploader, iter_csv_rows
+from payments.services.debt import refresh_customer_debt
+from payments.services.ledger import ledger_mismatches
+from payments.services.origination import originate_loan
+from payments.services.reconciliation import StatementReconciler
+
+
+def create_customer(score=Decimal('100000.00'), **kwargs):
+    return Customer.objects.create(status=1, score=score, **kwargs)
+
+
+def create_loans(customer, count, amount=Decimal('100.00'), status=2, prefix='loan'):
+    return [
+        Loan.objects.create(
+            external_id=f'{prefix}-{customer.pk}-{index}', customer=customer,
+            amount=amount, outstanding=amount, status=status)
+        for index in range(count)
+    ]
+
+
+class APITestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='tester', password='secret'))
+
+
+class PaymentAllocationTests(TestCase):
+
+    def setUp(self):
+        self.customer = create_customer()
+
+    def create_payment(self, total_amount, external_id='payment-1'):
+        return Payment.objects.create(
+            external_id=external_id, customer=self.customer, total_amount=Decimal(total_amount))
+
+    def test_fraction_of_a_cent_does_not_reject_the_payment(self):
+        first, second = create_loans(self.customer, 2)
+
+        payment = self.create_payment('100.005')
+        remaining = payment.update_loans()
+
+        self.assertEqual(remaining, 0)
+        payment.refresh_from_db()
+        first.refresh_from_db()
+        self.assertEqual(payment.status, 1)
+        self.assertEqual((first.outstanding, first.status), (Decimal('0.00'), 4))
+
+    def test_waterfall_pays_oldest_loans_first(self):
+        first, second, third = create_loans(self.customer, 3)
+
+        payment = self.create_payment('150.00')
+        remaining = payment.update_loans()
+
+        self.assertEqual(remaining, 0)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        third.refresh_from_db()
+        self.assertEqual((first.status, first.outstanding), (4, Decimal('0.00')))
+        self.assertEqual((second.status, second.outstanding), (2, Decimal('50.00')))
+        self.assertEqual((third.status, third.outstanding), (2, Decimal('100.00')))
+
+        details = {detail.loan_id: detail.amount for detail in payment.details.all()}
+        self.assertEqual(details, {first.pk: Decimal('100.00'), second.pk: Decimal('50.00')})
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 1)
+
+    def test_payment_exceeding_active_debt_is_rejected(self):
+        create_loans(self.customer, 1)
+        create_loans(self.customer, 1, status=1, prefix='pending')
+
+        payment = self.create_payment('150.00')
+        remaining = payment.update_loans()
+
+        self.assertEqual(remaining, Decimal('50.00'))
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 2)
+        self.assertFalse(Loan.objects.filter(customer=self.customer, status=2).exists())
+
+    def test_allocator_applies_several_payments_against_the_same_loans(self):
+        loans = create_loans(self.customer, 2)
+        payments = [self.create_payment('60.00', f'payment-{index}') for index in range(3)]
+
+        allocator = PaymentAllocator(self.customer.pk)
+        for payment in payments:
+            allocator.allocate(payment)
+        allocator.flush()
+
+        self.assertEqual(
+            list(Loan.objects.filter(pk__in=[loan.pk for loan in loans])
+                 .order_by('created_at', 'id').values_list('status', 'outstanding')),
+            [(4, Decimal('0.00')), (2, Decimal('20.00'))])
+        self.assertEqual(PaymentDetail.objects.filter(payment__customer=self.customer).count(), 4)
+
+    def test_query_count_is_flat_in_the_number_of_loans(self):
+        query_counts = []
+        for index, loan_count in enumerate((2, 40)):
+            customer = create_customer()
+            create_loans(customer, loan_count)
+            payment = Payment.objects.create(
+                external_id=f'flat-{index}', customer=customer,
+                total_amount=Decimal('100.00') * loan_count)
+
+            with CaptureQueriesContext(connection) as context:
+                payment.update_loans()
+            query_counts.append(len(context.captured_queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+
+
+@override_settings(ROOT_URLCONF='payments.urls')
+class CustomerBalanceAPITests(APITestCase):
+
+    def test_balance_is_aggregated_in_the_database(self):
+        customer = create_customer(score=Decimal('1000.00'))
+        create_loans(customer, 2)
+        create_loans(customer, 1, status=1, prefix='pending')
+        create_loans(customer, 1, status=3, prefix='rejected')
+        create_customer(score=Decimal('50.00'))
+
+        response = self.client.get(reverse('customer_balance'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        balance = response.data['results'][0]
+        self.assertEqual(balance['external_id'], customer.external_id)
+        self.assertEqual(balance['total_debt'], Decimal('300.00'))
+        self.assertEqual(balance['available_amount'], Decimal('700.00'))
+        self.assertEqual(response.data['results'][1]['total_debt'], Decimal('0'))
+
+    def test_query_count_does_not_grow_with_customers(self):
+        for _ in range(15):
+            create_loans(create_customer(), 2)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('customer_balance'), {'page_size': 15})
+
+        self.assertEqual(len(response.data['results']), 15)
+        # Validators, pagination count and the page
+        self.assertLessEqual(len(context.captured_queries), 3)
+
+    def test_filter_by_customer(self):
+        customer = create_customer()
+        create_customer()
+
+        response = self.client.get(reverse('customer_balance'), {'customer_external_id': str(customer.external_id)})
+        self.assertEqual([row['external_id'] for row in response.data['results']], [customer.external_id])
+
+        response = self.client.get(reverse('customer_balance'), {'customer_external_id': 'not-a-uuid'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(ROOT_URLCONF='payments.urls')
+class CustomerDebtSummaryTests(APITestCase):
+
+    def assertDebtSummary(self, customer, total_debt, active_loans):
+        customer.refresh_from_db()
+        self.assertEqual((customer.total_debt, customer.active_loans), (Decimal(total_debt), active_loans))
+
+    def test_summary_follows_the_loan_lifecycle(self):
+        customer = create_customer(score=Decimal('1000.00'))
+
+        response = self.client.post(reverse('loan-list-create'), {
+            'external_id': 'loan-1', 'amount': '300.00', 'customer': customer.pk})
+        self.assertEqual(response.status_code, 201)
+        self.assertDebtSummary(customer, '300.00', 0)
+
+        response = self.client.put(reverse('activate_loan'), {'external_id': 'loan-1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertDebtSummary(customer, '300.00', 1)
+
+        payment = Payment.objects.create(external_id='payment-1', customer=customer, total_amount=Decimal('100'))
+        payment.update_loans()
+        self.assertDebtSummary(customer, '200.00', 1)
+
+        payment = Payment.objects.create(external_id='payment-2', customer=customer, total_amount=Decimal('200'))
+        payment.update_loans()
+        self.assertDebtSummary(customer, '0.00', 0)
+
+        Loan.objects.get(external_id='loan-1').delete()
+        self.assertDebtSummary(customer, '0.00', 0)
+
+    def test_summary_follows_updates_and_deletes(self):
+        customer = create_customer()
+        other = create_customer()
+        loan, = create_loans(customer, 1)
+        self.assertDebtSummary(customer, '100.00', 1)
+
+        loan.outstanding = Decimal('40.00')
+        loan.customer = other
+        loan.save()
+        self.assertDebtSummary(customer, '0.00', 0)
+        self.assertDebtSummary(other, '40.00', 1)
+
+        Loan.objects.only('id').get(pk=loan.pk).save()
+        self.assertDebtSummary(other, '40.00', 1)
+
+        loan.delete()
+        self.assertDebtSummary(other, '0.00', 0)
+
+    def test_credit_limit_check_does_not_aggregate_loans(self):
+        customer = create_customer(score=Decimal('150.00'))
+        create_loans(customer, 1)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('loan-list-create'), {
+                'external_id': 'loan-2', 'amount': '60.00', 'customer': customer.pk})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(any('SUM(' in query['sql'] for query in context.captured_queries))
+
+    def test_rebuild_command_verifies_and_repairs_the_summary(self):
+        customer = create_customer()
+        create_loans(customer, 2)
+        Customer.objects.filter(pk=customer.pk).update(total_debt=0, active_loans=0)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_customer_debt', '--verify', stdout=StringIO())
+
+        call_command('rebuild_customer_debt', '--batch-size', '1', stdout=StringIO())
+        self.assertDebtSummary(customer, '200.00', 2)
+        call_command('rebuild_customer_debt', '--verify', stdout=StringIO())
+
+
+@override_settings(ROOT_URLCONF='payments.urls')
+class CustomerUploadAPITests(APITestCase):
+
+    def upload(self, name, content, **data):
+        return self.client.post(
+            reverse('customer-bulk-upload'), {'file': SimpleUploadedFile(name, content), **data}, format='multipart')
+
+    def test_csv_upload_reports_created_and_rejected_rows(self):
+        content = b'status,score\n1,100.50\n3,10\n2,\n1,42\n'
+
+        response = self.upload('customers.csv', content)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['rows'], response.data['created'], response.data['rejected']), (4, 2, 2))
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3])
+        self.assertIn('status', response.data['errors'][0]['errors'])
+        self.assertIn('score', response.data['errors'][1]['errors'])
+        self.assertEqual(Customer.objects.filter(preapproved_at__isnull=False).count(), 2)
+
+    def test_jsonl_upload_inserts_in_batches(self):
+        content = b'{"status": 1, "score": "10"}\nnot json\n\n[1]\n{"status": 2, "score": "20"}\n'
+
+        response = self.upload('customers.txt', content, format='jsonl')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['rejected'], response.data['batches']), (2, 2, 1))
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3])
+
+    def test_unknown_format_is_rejected(self):
+        response = self.upload('customers.xlsx', b'')
+        self.assertEqual(response.status_code, 400)
+
+    def test_uploader_flushes_fixed_size_batches(self):
+        rows = iter_csv_rows(SimpleUploadedFile(
+            'customers.csv', b'status,score\n' + b'1,10\n' * 25))
+
+        with CaptureQueriesContext(connection) as context:
+            report = CustomerUploader(batch_size=10, max_errors=1).run(rows)
+
+        self.assertEqual((report['created'], report['batches']), (25, 3))
+        inserts = [query for query in context.captured_queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 3)
+
+
+@override_settings(ROOT_URLCONF='payments.urls')
+class PaymentBatchAPITests(APITestCase):
+
+    def payment_data(self, customer, external_id, total_amount):
+        return {
+            'external_id': external_id, 'customer_external_id': str(customer.external_id),
+            'total_amount': total_amount, 'details': [],
+        }
+
+    def test_batch_reports_one_result_per_item(self):
+        customer = create_customer()
+        create_loans(customer, 2)
+        Payment.objects.create(external_id='existing', customer=customer, total_amount=Decimal('1'))
+
+        response = self.client.post(reverse('create_payment_batch'), [
+            self.payment_data(customer, 'batch-1', '150.00'),
+            self.payment_data(customer, 'batch-2', '30.00'),
+            self.payment_data(customer, 'batch-3', '30.00'),
+            self.payment_data(customer, 'batch-1', '1.00'),
+            self.payment_data(customer, 'existing', '1.00'),
+            {'external_id': 'batch-4', 'customer_external_id': 'unknown', 'total_amount': '1', 'details': []},
+        ], format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result['result'] for result in response.data['results']],
+            ['created', 'created', 'invalid', 'invalid', 'invalid', 'invalid'])
+        self.assertIn('total_amount', response.data['results'][2]['errors'])
+        self.assertEqual((response.data['created'], response.data['invalid']), (2, 4))
+
+        customer.refresh_from_db()
+        self.assertEqual(customer.total_debt, Decimal('20.00'))
+        self.assertEqual(PaymentDetail.objects.filter(payment__external_id__startswith='batch-').count(), 3)
+
+    def test_batch_query_count_scales_with_customers_not_payments(self):
+        customers = [create_customer() for _ in range(2)]
+        for customer in customers:
+            create_loans(customer, 5)
+        items = [
+            self.payment_data(customer, f'batch-{customer.pk}-{index}', '10.00')
+            for customer in customers for index in range(20)
+        ]
+
+        with CaptureQueriesContext(connection) as batch_context:
+            response = self.client.post(reverse('create_payment_batch'), items, format='json')
+        self.assertEqual(response.data['created'], 40)
+
+        single_customer = create_customer()
+        create_loans(single_customer, 5)
+        with CaptureQueriesContext(connection) as single_context:
+            response = self.client.post(
+                reverse('create_payment'), self.payment_data(single_customer, 'single', '10.00'), format='json')
+        self.assertEqual(response.status_code, 201)
+
+        self.assertLess(len(batch_context.captured_queries) * 10, len(single_context.captured_queries) * len(items))
+
+    def test_concurrently_stored_external_id_rejects_only_that_item(self):
+        from unittest import mock
+
+        from payments.serializers.payment import PaymentBatchItemSerializer
+        from payments.services.payment_batch import PaymentBatchProcessor
+
+        customer = create_customer()
+        create_loans(customer, 2)
+        run_validation = PaymentBatchItemSerializer.run_validation
+
+        def validate_then_race(serializer, data):
+            # Another request stores `race` after the batch checked its external IDs
+            if data['external_id'] == 'race':
+                Payment.objects.create(external_id='race', customer=customer, total_amount=Decimal('1'))
+            return run_validation(serializer, data)
+
+        with mock.patch.object(PaymentBatchItemSerializer, 'run_validation', validate_then_race):
+            results = PaymentBatchProcessor().process([
+                self.payment_data(customer, 'first', '10.00'),
+                self.payment_data(customer, 'race', '10.00'),
+                self.payment_data(customer, 'last', '10.00'),
+            ])
+
+        self.assertEqual([result['result'] for result in results], ['created', 'invalid', 'created'])
+        self.assertIn('external_id', results[1]['errors'])
+        self.assertEqual(
+            set(Payment.objects.filter(customer=customer).values_list('external_id', flat=True)),
+            {'first', 'race', 'last'})
+
+    def test_batch_must_be_a_list(self):
+        response = self.client.post(reverse('create_payment_batch'), {'external_id': 'x'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(ROOT_URLCONF='payments.urls')
+class PaymentAPITests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.customer = create_customer()
+
+    def post_payment(self, external_id, total_amount, details):
+        return self.client.post(reverse('create_payment'), {
+            'external_id': external_id, 'customer_external_id': str(self.customer.external_id),
+            'total_amount': total_amount,
+            'details': [{'loan_external_id': loan.external_id, 'amount': amount} for loan, amount in details],
+        }, format='json')
+
+    def test_details_are_applied_before_the_waterfall(self):
+        oldest, newest = create_loans(self.customer, 2)
+
+        response = self.post_payment('payment-1', '120.00', [(newest, '70.00')])
+
+        self.assertEqual(response.status_code, 201)
+        details = dict(PaymentDetail.objects.filter(payment__external_id='payment-1').values_list('loan_id', 'amount'))
+        self.assertEqual(details, {newest.pk: Decimal('70.00'), oldest.pk: Decimal('50.00')})
+
+    def test_unknown_and_foreign_loans_are_rejected(self):
+        own, = create_loans(self.customer, 1)
+        foreign, = create_loans(create_customer(), 1, prefix='foreign')
+        unknown = Loan(external_id='unknown')
+
+        response = self.post_payment('payment-1', '30.00', [(own, '10.00'), (foreign, '10.00'), (unknown, '10.00')])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.data['details'],
+            [{}, {'loan_external_id': 'Loan does not belong to the customer'},
+             {'loan_external_id': 'Loan does not exist'}])
+        self.assertFalse(Payment.objects.exists())
+
+    def test_details_cannot_exceed_the_total_amount(self):
+        loan, = create_loans(self.customer, 1)
+
+        response = self.post_payment('payment-1', '10.00', [(loan, '20.00')])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('details', response.data)
+
+    def test_failed_allocation_leaves_no_payment(self):
+        from unittest import mock
+
+        from django.db import DatabaseError
+
+        create_loans(self.customer, 1)
+        serializer = PaymentSerializer(data={
+            'external_id': 'payment-1', 'customer_external_id': str(self.customer.external_id),
+            'total_amount': '50.00', 'details': []})
+        self.assertTrue(serializer.is_valid())
+
+        with mock.patch.object(PaymentAllocator, 'flush', side_effect=DatabaseError('lock timeout')):
+            with self.assertRaises(DatabaseError):
+                serializer.save()
+
+        self.assertFalse(Payment.objects.exists())
+
+    def test_query_count_is_constant_in_the_number_of_details(self):
+        query_counts = []
+        for index, detail_count in enumerate((1, 20)):
+            loans = create_loans(self.customer, detail_count, prefix=f'loans-{index}')
+            with CaptureQueriesContext(connection) as context:
+                response = self.post_payment(f'payment-{index}', '5.00', [(loan, '0.25') for loan in loans])
+            self.assertEqual(response.status_code, 201)
+            query_counts.append(len(context.captured_queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+
+
+@override_settings(ROOT_URLCONF='payments.urls')
+class KeysetPaginationTests(APITestCase):
+
+    def test_cursor_pages_walk_customers_without_count_query(self):
+        customers = [create_customer() for _ in range(25)]
+        url = reverse('customer-list-create') + '?pagination=cursor&page_size=10'
+
+        seen = []
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            self.assertFalse(any('COUNT(' in query['sql'] for query in context.captured_queries))
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(seen, [customer.pk for customer in customers])
+
+    def test_cursor_pagination_on_payments_by_customer(self):
+        customer = create_customer()
+        for index in range(3):
+            Payment.objects.create(external_id=f'payment-{index}', customer=customer, total_amount=Decimal('1'))
+        url = f'/api/payment/by-customer/{customer.external_id}/'
+
+        response = self.client.get(url, {'pagination': 'cursor', 'page_size': 2})
+        self.assertEqual([row['external_id'] for row in response.data['results']], ['payment-0', 'payment-1'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['external_id'] for row in response.data['results']], ['payment-2'])
+        self.assertIsNone(response.data['next'])
+
+    def test_page_size_is_capped_and_invalid_cursor_is_rejected(self):
+        for _ in range(3):
+            create_customer()
+
+        response = self.client.get(reverse('customer-list-create'), {'pagination': 'cursor', 'page_size': 100000})
+        self.assertEqual(len(response.data['results']), 3)
+
+        response = self.client.get(reverse('customer-list-create'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_number_mode_remains_the_default(self):
+        create_customer()
+
+        response = self.client.get(reverse('customer-list-create'))
+
+        self.assertEqual(response.data['count'], 1)
+
+
+@override_settings(ROOT_URLCONF='payments.urls')
+class LoanExportTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.customer = create_customer()
+        self.loans = create_loans(self.customer, 5)
+        create_loans(create_customer(), 2, prefix='other')
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_json_export_matches_the_regular_listing(self):
+        response = self.client.get(reverse('loan-list-create'), {'export': 'json'})
+
+        self.assertEqual(response['Content-Type'], 'application/json')
+        exported = json.loads(self.read(response))
+        listed = json.loads(self.client.get(reverse('loan-list-create')).content)
+        self.assertEqual(exported, listed)
+        self.assertEqual(len(exported), 7)
+
+    def test_ndjson_export_by_customer(self):
+        response = self.client.get(
+            reverse('loans_by_customer', args=[self.customer.external_id]), {'export': 'ndjson'})
+
+        lines = self.read(response).splitlines()
+        self.assertEqual(
+            [json.loads(line) for line in lines],
+            json.loads(json.dumps(LoanSerializer(self.loans, many=True).data)))
+
+    def test_unknown_export_format_is_rejected(self):
+        response = self.client.get(reverse('loan-list-create'), {'export': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+
+class HotQueryIndexTests(TestCase):
+    """
+    Capture the query plan of each hot query shape and check it is served by an index.
+    """
+
+    def setUp(self):
+        self.customer = create_customer()
+        create_loans(self.customer, 3)
+
+    def assertUsesIndex(self, queryset):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+            self.assertNotIn('Seq Scan', plan)
+            self.assertIn('Index', plan)
+            return
+
+        plan = queryset.explain()
+        self.assertRegex(plan, r'USING (COVERING )?INDEX')
+        self.assertIsNone(re.search(r'SCAN payments_\w+$', plan, re.MULTILINE), plan)
+
+    def test_allocation_waterfall(self):
+        self.assertUsesIndex(
+            Loan.objects.filter(customer_id=self.customer.pk, status=2).order_by('created_at', 'id'))
+
+    def test_open_debt_aggregate(self):
+        self.assertUsesIndex(
+            Loan.objects.filter(customer_id=self.customer.pk, status__in=Loan.OPEN_STATUSES)
+            .values('customer').annotate(total=Sum('outstanding')))
+
+    def test_payment_history_by_customer(self):
+        self.assertUsesIndex(
+            Payment.objects.filter(customer__external_id=self.customer.external_id).order_by('created_at', 'id'))
+
+    def test_customer_listing_page(self):
+        self.assertUsesIndex(Customer.objects.order_by('created_at', 'id')[:11])
+
+    def test_payment_details_by_loan(self):
+        self.assertUsesIndex(PaymentDetail.objects.filter(loan_id=1).order_by('created_at'))
+
+
+@override_settings(ROOT_URLCONF='payments.urls')
+class JWTAuthenticationTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='tester', password='secret')
+        self.customer = create_customer()
+        self.url = f'/api/payment/by-customer/{self.customer.external_id}/'
+
+    def get_queries(self, authorization):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, HTTP_AUTHORIZATION=authorization)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in context.captured_queries]
+
+    def test_access_token_is_verified_without_database_queries(self):
+        access = RefreshToken.for_user(self.user).access_token
+
+        queries = self.get_queries(f'Bearer {access}')
+
+        self.assertFalse(any('auth_user' in sql or 'authtoken' in sql for sql in queries))
+
+    def test_legacy_token_authentication_still_works(self):
+        token = Token.objects.create(user=self.user)
+
+        queries = self.get_queries(f'Token {token.key}')
+
+        self.assertTrue(any('authtoken' in sql for sql in queries))
+
+    def test_invalid_access_token_is_rejected(self):
+        response = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer invalid')
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(ROOT_URLCONF='payments.urls')
+class AsyncReadEndpointTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.async_client = AsyncClient()
+        self.headers = {
+            'Authorization': f'Bearer {RefreshToken.for_user(User.objects.get(username="tester")).access_token}'}
+        self.customer = create_customer()
+        self.loans = create_loans(self.customer, 3)
+        oldest = self.loans[0]
+        payment = Payment.objects.create(external_id='payment-1', customer=self.customer, total_amount=Decimal('10'))
+        payment.update_loans(targets=[(oldest.pk, Decimal('10'))])
+
+    async def test_async_loans_match_the_sync_endpoint(self):
+        response = await self.async_client.get(
+            reverse('async_loans_by_customer', args=[self.customer.external_id]), headers=self.headers)
+        sync_response = await self.sync_get(reverse('loans_by_customer', args=[self.customer.external_id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), sync_response)
+
+    async def test_async_payments_match_the_sync_endpoint(self):
+        url = f'/api/payment/by-customer/{self.customer.external_id}/'
+        response = await self.async_client.get(
+            reverse('async_payments_by_customer', args=[self.customer.external_id]), headers=self.headers)
+        sync_response = await self.sync_get(url, {'pagination': 'cursor'})
+
+        self.assertEqual(response.json()['results'], sync_response['results'])
+        self.assertEqual(response.json()['results'][0]['details'], [{'amount': '10.00'}])
+
+    async def test_async_customer_list_and_balance(self):
+        response = await self.async_client.get(reverse('async_customer_list'), headers=self.headers)
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.customer.pk])
+
+        response = await self.async_client.get(
+            reverse('async_customer_balance'), {'customer_external_id': str(self.customer.external_id)},
+            headers=self.headers)
+        self.assertEqual(response.json()['results'][0]['total_debt'], 290.0)
+
+    async def test_async_queries_are_counted(self):
+        response = await self.async_client.get(
+            reverse('async_loans_by_customer', args=[self.customer.external_id]), headers=self.headers)
+
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"')
+
+    async def test_async_endpoints_require_a_valid_access_token(self):
+        response = await self.async_client.get(reverse('async_customer_list'))
+        self.assertEqual(response.status_code, 401)
+
+        response = await self.async_client.get(
+            reverse('async_customer_list'), headers={'Authorization': 'Bearer invalid'})
+        self.assertEqual(response.status_code, 401)
+
+    async def sync_get(self, url, data=None):
+        from asgiref.sync import sync_to_async
+
+        response = await sync_to_async(self.client.get)(url, data)
+        return json.loads(response.content)
+
+
+class BenchmarkSuiteTests(TestCase):
+
+    def test_seeded_portfolio_has_consistent_debt_summaries(self):
+        report = seed_portfolio('smoke', seed=1)
+
+        self.assertEqual((report['customers'], report['loans'], report['payments']), (20, 100, 40))
+        for customer in Customer.objects.with_computed_debt():
+            self.assertEqual(customer.total_debt, customer.computed_debt)
+            self.assertEqual(customer.active_loans, customer.computed_active_loans)
+
+    def test_smoke_scale_stays_within_query_budgets(self):
+        seed_portfolio('smoke')
+        results = run_suite(repeat=1)
+
+        baseline = load_baseline(BASELINE_PATH, 'smoke')
+        self.assertEqual(set(results), set(baseline))
+        self.assertEqual(compare(results, baseline, check_latency=False), [])
+
+
+@override_settings(ROOT_URLCONF='payments.urls')
+class InstrumentationTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+        self.customer = create_customer()
+        create_loans(self.customer, 2)
+
+    def test_response_carries_server_timing(self):
+        response = self.client.get(reverse('loans_by_customer', args=[self.customer.external_id]))
+
+        timing = dict(re.findall(r'(\w+);dur=([\d.]+)', response['Server-Timing']))
+        self.assertEqual(set(timing), {'app', 'db'})
+        self.assertLessEqual(float(timing['db']), float(timing['app']))
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"')
+
+    def test_metrics_aggregate_requests_per_route(self):
+        url = reverse('loans_by_customer', args=[self.customer.external_id])
+        self.client.get(url)
+        self.client.get(url)
+        self.client.get('/api/missing/')
+
+        body = metrics(RequestFactory().get('/metrics')).content.decode()
+
+        labels = 'route="loans_by_customer",method="GET",status="200"'
+        self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 2', body)
+        self.assertIn(f'http_request_db_queries_bucket{{{labels},le="+Inf"}} 2', body)
+        self.assertIn('route="unmatched",method="GET",status="404"', body)
+
+    def test_series_are_bounded(self):
+        for index in range(600):
+            registry.observe(f'route-{index}', 'GET', 200, 0.01, 1, 0.001)
+
+        self.assertLessEqual(len(registry.series), 501)
+        self.assertIn(('other', 'GET', '200'), registry.series)
+
+
+@override_settings(ROOT_URLCONF='payments.urls')
+class ConditionalGetTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.customer = create_customer()
+        self.loans = create_loans(self.customer, 2)
+
+    def assertNotModifiedWithoutBody(self, url, data=None, lookups=0):
+        response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+
+        # One aggregate query for the validators, after any lookup of the customer
+        with self.assertNumQueries(lookups + 1):
+            cached = self.client.get(url, data, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], response['ETag'])
+        self.assertEqual(cached.content, b'')
+        return response
+
+    def test_loans_by_customer_returns_304_until_a_loan_changes(self):
+        url = reverse('loans_by_customer', args=[self.customer.external_id])
+        response = self.assertNotModifiedWithoutBody(url, lookups=1)
+
+        self.loans[0].outstanding = Decimal('10.00')
+        self.loans[0].save()
+
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+
+    def test_deleting_a_loan_changes_the_etag(self):
+        url = reverse('loans_by_customer', args=[self.customer.external_id])
+        etag = self.client.get(url)['ETag']
+
+        self.loans[0].delete()
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_if_modified_since_is_honored(self):
+        url = reverse('loans_by_customer', args=[self.customer.external_id])
+        response = self.client.get(url)
+
+        cached = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_payments_by_customer_returns_304_until_a_payment_is_made(self):
+        url = f'/api/payment/by-customer/{self.customer.external_id}/'
+        Payment.objects.create(external_id='payment-1', customer=self.customer, total_amount=Decimal('10.00'))
+        response = self.assertNotModifiedWithoutBody(url)
+
+        self.assertEqual(self.client.get(url, {'page': 2}, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 404)
+
+        Payment.objects.create(external_id='payment-2', customer=self.customer, total_amount=Decimal('10.00'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_allocating_a_payment_changes_the_etag(self):
+        url = f'/api/payment/by-customer/{self.customer.external_id}/'
+        payment = Payment.objects.create(
+            external_id='payment-1', customer=self.customer, total_amount=Decimal('10.00'))
+        response = self.client.get(url)
+        self.assertEqual(response.data['results'][0]['details'], [])
+
+        payment.update_loans()
+
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+        self.assertEqual(changed.data['results'][0]['details'][0]['amount'], '10.00')
+
+    def test_balance_returns_304_until_the_debt_changes(self):
+        response = self.assertNotModifiedWithoutBody(
+            reverse('customer_balance'), {'customer_external_id': str(self.customer.external_id)})
+
+        Payment.objects.create(
+            external_id='payment-1', customer=self.customer, total_amount=Decimal('50.00')).update_loans()
+
+        changed = self.client.get(
+            reverse('customer_balance'), {'customer_external_id': str(self.customer.external_id)},
+            HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+
+
+@override_settings(ROOT_URLCONF='payments.urls')
+class CustomerCacheTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+        self.customer = create_customer()
+        self.loans = create_loans(self.customer, 2)
+
+    def counts(self, kind):
+        return requests_counter.value(kind=kind, result='hit'), requests_counter.value(kind=kind, result='miss')
+
+    def test_loans_are_read_through_the_cache(self):
+        url = reverse('loans_by_customer', args=[self.customer.external_id])
+        first = self.client.get(url)
+        with self.assertNumQueries(2):
+            second = self.client.get(url)
+
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(self.counts('loans'), (1, 1))
+        self.assertIn('payments_cache_requests_total{kind="loans",result="hit"} 1',
+                      metrics(RequestFactory().get('/metrics')).content.decode())
+
+    def test_payment_detail_save_invalidates_the_payments_page(self):
+        payment = Payment.objects.create(
+            external_id='payment-1', customer=self.customer, total_amount=Decimal('10.00'))
+        url = f'/api/payment/by-customer/{self.customer.external_id}/'
+        self.assertEqual(self.client.get(url).data['results'][0]['details'], [])
+
+        # Does not touch the payment row, so only the signal can invalidate the page
+        PaymentDetail.objects.create(payment=Payment.objects.get(pk=payment.pk), loan=self.loans[0],
+                                     amount=Decimal('10.00'))
+
+        self.assertEqual(len(self.client.get(url).data['results'][0]['details']), 1)
+        self.assertEqual(self.counts('payments'), (0, 2))
+
+    def test_allocation_invalidates_the_balance(self):
+        url = reverse('customer_balance')
+        params = {'customer_external_id': str(self.customer.external_id)}
+        self.client.get(url, params)
+
+        Payment.objects.create(
+            external_id='payment-1', customer=self.customer, total_amount=Decimal('50.00')).update_loans()
+
+        self.assertEqual(self.client.get(url, params).data['results'][0]['total_debt'], Decimal('150.00'))
+        self.assertEqual(self.counts('balance'), (0, 2))
+
+
+@override_settings(ROOT_URLCONF='payments.urls')
+class AsyncPaymentProcessingTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.customer = create_customer()
+        self.loans = create_loans(self.customer, 2)
+
+    def post_payment(self, external_id, amount, details=()):
+        return self.client.post(reverse('create_payment'), {
+            'external_id': external_id, 'customer_external_id': str(self.customer.external_id),
+            'total_amount': amount, 'details': list(details),
+        }, format='json', HTTP_PREFER='respond-async')
+
+    def test_post_defers_allocation_and_returns_status_url(self):
+        response = self.post_payment('payment-1', '50.00')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 3)
+        self.assertEqual(response['Location'], response.data['status_url'])
+        self.assertEqual(Loan.objects.get(pk=self.loans[0].pk).outstanding, Decimal('100.00'))
+
+        status_response = self.client.get(response.data['status_url'])
+        self.assertEqual(status_response.data['state'], 'pending')
+
+    def test_worker_coalesces_payments_per_customer(self):
+        self.post_payment('payment-1', '50.00')
+        self.post_payment('payment-2', '60.00', [{'loan_external_id': self.loans[1].external_id, 'amount': '60.00'}])
+        self.post_payment('payment-3', '150.00')
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('process_payments', once=True, workers=1, stdout=StringIO())
+        # One claim, then a single pass for the customer
+        self.assertEqual(sum('"payments_loan"' in query['sql'] and query['sql'].startswith('SELECT')
+                             for query in queries.captured_queries), 1)
+
+        states = dict(Payment.objects.values_list('external_id', 'status'))
+        self.assertEqual(states, {'payment-1': 1, 'payment-2': 1, 'payment-3': 2})
+        first, second = Loan.objects.filter(pk__in=[loan.pk for loan in self.loans]).order_by('id')
+        self.assertEqual((first.outstanding, second.outstanding), (Decimal('0.00'), Decimal('0.00')))
+        self.assertEqual(Payment.objects.get(external_id='payment-2').details.get().loan_id, second.pk)
+
+        response = self.client.get(reverse('payment_status', args=['payment-3']))
+        self.assertEqual(response.data['state'], 'rejected')
+
+    def test_failing_payments_back_off_then_fail(self):
+        from unittest import mock
+
+        from payments.services import payment_queue
+
+        self.post_payment('poisoned', '10.00')
+        other = create_customer()
+        create_loans(other, 1)
+        self.client.post(reverse('create_payment'), {
+            'external_id': 'healthy', 'customer_external_id': str(other.external_id),
+            'total_amount': '10.00', 'details': [],
+        }, format='json', HTTP_PREFER='respond-async')
+        process = payment_queue.process_customer_payments
+
+        def fail_for_poisoned(customer_id, payments):
+            if customer_id == self.customer.pk:
+                raise RuntimeError('poisoned')
+            return process(customer_id, payments)
+
+        with mock.patch.object(payment_queue, 'process_customer_payments', fail_for_poisoned), \
+                self.assertLogs('payments.services.payment_queue', 'ERROR'):
+            report = payment_queue.drain_pending()
+            self.assertEqual((report['completed'], report['failed']), (1, 1))
+            # Backing off: the next pass does not claim it again
+            self.assertEqual(payment_queue.drain_pending()['claimed'], 0)
+
+            for _ in range(payment_queue.MAX_ATTEMPTS - 1):
+                Payment.objects.filter(external_id='poisoned').update(retry_at=timezone.now())
+                report = payment_queue.drain_pending()
+
+        self.assertEqual(report['abandoned'], 1)
+        poisoned = Payment.objects.get(external_id='poisoned')
+        self.assertEqual((poisoned.status, poisoned.attempts), (4, payment_queue.MAX_ATTEMPTS))
+        self.assertEqual(Payment.objects.get(external_id='healthy').status, 1)
+
+    def test_several_workers_need_skip_locked(self):
+        if connection.features.has_select_for_update_skip_locked:
+            self.skipTest('The database supports SKIP LOCKED')
+        with self.assertRaises(CommandError):
+            call_command('process_payments', once=True, workers=2, stdout=StringIO())
+
+    def test_synchronous_mode_is_the_default(self):
+        response = self.client.post(reverse('create_payment'), {
+            'external_id': 'payment-1', 'customer_external_id': str(self.customer.external_id),
+            'total_amount': '50.00', 'details': [],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['status'], 1)
+
+    def test_unknown_payment_status_is_404(self):
+        self.assertEqual(self.client.get(reverse('payment_status', args=['missing'])).status_code, 404)
+
+
+class FastListSerializerTests(TestCase):
+
+    def setUp(self):
+        self.customer = create_customer(score=Decimal('1234.5'))
+        self.loans = create_loans(self.customer, 2, amount=Decimal('100.5'))
+        Loan.objects.create(external_id='pending', customer=self.customer, amount=Decimal('7.00'),
+                            outstanding=Decimal('7.00'), status=1)
+        payment = Payment.objects.create(
+            external_id='payment-1', customer=self.customer, total_amount=Decimal('150.25'))
+        payment.update_loans()
+        Payment.objects.create(external_id='payment-2', customer=self.customer, total_amount=Decimal('1'))
+
+    def assertSameRepresentation(self, serializer_class, queryset):
+        fast = FastListSerializer(serializer_class)
+        expected = json.loads(json.dumps(serializer_class(queryset, many=True).data))
+
+        with self.assertNumQueries(1 + len(fast.nested)):
+            data = fast.serialize(fast.values(queryset))
+
+        self.assertEqual(json.loads(json.dumps(data)), expected)
+        self.assertEqual([list(row) for row in data], [list(row) for row in expected])
+
+    def test_loans(self):
+        self.assertSameRepresentation(LoanSerializer, Loan.objects.order_by('id'))
+
+    def test_payments_with_details(self):
+        self.assertSameRepresentation(PaymentSerializer, Payment.objects.order_by('id'))
+
+    def test_customers(self):
+        self.assertSameRepresentation(CustomerSerializer, Customer.objects.order_by('id'))
+
+
+@override_settings(ROOT_URLCONF='payments.urls')
+class PortfolioAnalyticsTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        get_cache().clear()
+        now = timezone.now()
+        self.small = create_customer(score=Decimal('1000.00'))
+        self.large = create_customer(score=Decimal('400.00'))
+        create_customer()  # No loans
+
+        loans = create_loans(self.small, 2, amount=Decimal('100.00'))
+        loans[0].maximum_payment_date = now - timedelta(days=45)
+        loans[0].save()
+        loans[1].maximum_payment_date = now + timedelta(days=10)
+        loans[1].save()
+        create_loans(self.large, 1, amount=Decimal('300.00'), prefix='large')
+        create_loans(self.large, 1, amount=Decimal('50.00'), status=4, prefix='paid')
+
+    def test_report_aggregates(self):
+        report = self.client.get(reverse('portfolio_analytics'), {'top': 1}).data
+
+        self.assertEqual(report['loans'], 4)
+        by_status = {row['status']: (row['loans'], row['outstanding']) for row in report['outstanding_by_status']}
+        self.assertEqual(by_status, {'pending': (0, 0), 'active': (3, 500.0), 'rejected': (0, 0), 'paid': (1, 50.0),
+                                     'overdue': (0, 0)})
+
+        aging = {row['bucket']: (row['loans'], row['outstanding']) for row in report['aging']}
+        self.assertEqual(aging['current'], (1, 100.0))
+        self.assertEqual(aging['31-60'], (1, 100.0))
+        self.assertEqual(aging['no_due_date'], (1, 300.0))
+
+        self.assertEqual(report['utilization']['customers'], 2)
+        self.assertEqual([row['customers'] for row in report['utilization']['distribution']], [1, 0, 1, 0, 0])
+        self.assertEqual(report['top_exposed'], [{
+            'customer_external_id': str(self.large.external_id), 'outstanding': 300.0, 'score': 400.0,
+            'utilization': 0.75,
+        }])
+
+    def test_report_is_cached_until_the_next_payment(self):
+        url = reverse('portfolio_analytics')
+        first = self.client.get(url).data
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        Payment.objects.create(
+            external_id='payment-1', customer=self.large, total_amount=Decimal('300.00')).update_loans()
+
+        second = self.client.get(url).data
+        self.assertGreater(second['generated_at'], first['generated_at'])
+        self.assertEqual(second['top_exposed'][0]['customer_external_id'], str(self.small.external_id))
+
+
+class OverdueSweepTests(TestCase):
+
+    def setUp(self):
+        self.customer = create_customer()
+        self.now = timezone.now()
+        self.loans = create_loans(self.customer, 4)
+        due_dates = [self.now - timedelta(days=3), self.now + timedelta(days=3), None, self.now - timedelta(days=1)]
+        for loan, due in zip(self.loans, due_dates):
+            loan.maximum_payment_date = due
+        self.loans[2].outstanding = Decimal('0')
+        Loan.objects.bulk_update(self.loans, ['maximum_payment_date', 'outstanding'])
+        refresh_customer_debt([self.customer.pk])
+
+    def statuses(self):
+        return list(Loan.objects.order_by('pk').values_list('status', flat=True))
+
+    def test_sweep_applies_transitions_and_keeps_the_debt_summary(self):
+        out = StringIO()
+        call_command('sweep_overdue_loans', stdout=out)
+
+        self.assertEqual(self.statuses(), [5, 2, 4, 5])
+        self.assertIn('3 loans: 2 overdue, 1 paid', out.getvalue())
+        customer = Customer.objects.with_computed_debt().get(pk=self.customer.pk)
+        self.assertEqual((customer.total_debt, customer.active_loans), (Decimal('300.00'), 3))
+        self.assertEqual((customer.total_debt, customer.active_loans),
+                         (customer.computed_debt, customer.computed_active_loans))
+        self.assertIsNone(SweepCursor.objects.get(name='overdue_loans').cutoff)
+
+    def test_overdue_loans_still_receive_payments(self):
+        call_command('sweep_overdue_loans', stdout=StringIO())
+
+        payment = Payment.objects.create(external_id='payment-1', customer=self.customer, total_amount=Decimal('100'))
+        self.assertEqual(payment.update_loans(), 0)
+        self.assertEqual(self.statuses(), [4, 2, 4, 5])
+
+    def test_interrupted_sweep_resumes_with_its_cutoff(self):
+        call_command('sweep_overdue_loans', chunk_size=1, max_chunks=1, stdout=StringIO())
+        cursor = SweepCursor.objects.get(name='overdue_loans')
+        self.assertEqual(cursor.last_id, self.loans[0].pk)
+        self.assertEqual(self.statuses(), [5, 2, 2, 2])
+
+        # Loans falling due after the run started wait for the next run
+        Loan.objects.filter(pk=self.loans[1].pk).update(maximum_payment_date=cursor.cutoff + timedelta(seconds=1))
+        out = StringIO()
+        call_command('sweep_overdue_loans', chunk_size=1, stdout=out)
+
+        self.assertIn('Resuming', out.getvalue())
+        self.assertEqual(self.statuses(), [5, 2, 4, 5])
+        self.assertIsNone(SweepCursor.objects.get(name='overdue_loans').cutoff)
+
+
+class ProductionSettingsTests(TestCase):
+
+    def load(self, **environ):
+        import importlib
+        import os
+        from unittest import mock
+
+        with mock.patch.dict(os.environ, {'DJANGO_SECRET_KEY': 'secret', **environ}):
+            import core.settings_production
+            return importlib.reload(core.settings_production)
+
+    def test_database_is_configured_from_the_environment(self):
+        settings = self.load(DB_HOST='db.internal', DB_NAME='payments', DB_STATEMENT_TIMEOUT='1500')
+        database = settings.DATABASES['default']
+
+        self.assertFalse(settings.DEBUG)
+        self.assertEqual(database['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((database['HOST'], database['NAME']), ('db.internal', 'payments'))
+        self.assertEqual(database['CONN_MAX_AGE'], 600)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        self.assertFalse(database['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertIn('-c statement_timeout=1500', database['OPTIONS']['options'])
+
+    def test_shared_cache_is_configured_from_the_environment(self):
+        settings = self.load(CACHE_LOCATION='redis://cache-1:6379,redis://cache-2:6379')
+        cache = settings.CACHES['default']
+
+        self.assertEqual(cache['BACKEND'], 'django.core.cache.backends.redis.RedisCache')
+        self.assertEqual(cache['LOCATION'], ['redis://cache-1:6379', 'redis://cache-2:6379'])
+
+    def test_replicas_require_a_shared_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.load(DB_REPLICA_HOSTS='replica-1')
+
+        settings = self.load(DB_REPLICA_HOSTS='replica-1', CACHE_LOCATION='redis://cache:6379')
+        self.assertEqual(settings.DATABASE_REPLICAS, ['replica_1'])
+
+    def test_pgbouncer_transaction_pooling_disables_server_side_cursors(self):
+        settings = self.load(DB_DISABLE_SERVER_SIDE_CURSORS='true', DB_CONN_MAX_AGE='0')
+
+        self.assertTrue(settings.DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertEqual(settings.DATABASES['default']['CONN_MAX_AGE'], 0)
+
+
+@override_settings(ROOT_URLCONF='payments.urls', DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='tester', password='secret'))
+        # Diverging copies of the same customer tell which database served a read
+        self.customer = create_customer(score=Decimal('1000.00'))
+        Customer.objects.using('replica').create(
+            external_id=self.customer.external_id, status=1, score=Decimal('500.00'))
+
+    def balance(self):
+        response = self.client.get(
+            reverse('customer_balance'), {'customer_external_id': str(self.customer.external_id)})
+        return response.data['results'][0]['available_amount']
+
+    def test_client_reads_from_the_primary_after_writing(self):
+        self.assertEqual(self.balance(), Decimal('500.00'))
+
+        response = self.client.post(reverse('loan-list-create'), {
+            'external_id': 'loan-1', 'amount': '100.00', 'customer': self.customer.pk})
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(Loan.objects.using('replica').exists())
+        self.assertEqual(self.balance(), Decimal('900.00'))
+
+        # The pin expires
+        get_cache().clear()
+        self.assertEqual(self.balance(), Decimal('500.00'))
+
+    def test_streamed_export_reads_from_the_replica(self):
+        replica_customer = Customer.objects.using('replica').get()
+        Loan.objects.using('replica').bulk_create([Loan(
+            external_id='replica-loan', customer=replica_customer,
+            amount=Decimal('100.00'), outstanding=Decimal('100.00'), status=2)])
+
+        response = self.client.get(reverse('loan-list-create'), {'export': 'json'})
+
+        loans = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([loan['external_id'] for loan in loans], ['replica-loan'])
+
+    async def test_async_streams_step_on_the_replica(self):
+        async def content():
+            for _ in range(2):
+                yield current_replica.get()
+
+        self.assertEqual([alias async for alias in aiter_on_replica(content(), 'replica')], ['replica'] * 2)
+        self.assertIsNone(current_replica.get())
+
+    def test_reads_inside_a_transaction_stay_on_the_primary(self):
+        with use_replica('replica'):
+            self.assertEqual(Customer.objects.get().score, Decimal('500.00'))
+            with transaction.atomic():
+                self.assertEqual(Customer.objects.get().score, Decimal('1000.00'))
+
+    @override_settings(DATABASE_REPLICAS=['replica', 'default'])
+    def test_replicas_are_selected_round_robin(self):
+        self.assertEqual({next_replica(), next_replica()}, {'replica', 'default'})
+
+
+class CustomerLockingTests(TestCase):
+
+    def test_limit_is_checked_against_the_locked_customer(self):
+        customer = create_customer(score=Decimal('150.00'))
+        serializer = LoanSerializer(data={'external_id': 'loan-1', 'amount': '100.00', 'customer': customer.pk})
+        self.assertTrue(serializer.is_valid())
+
+        # A concurrent origination commits after this request validated its customer
+        create_loans(customer, 1)
+
+        self.assertIsNone(originate_loan(serializer))
+        self.assertEqual(Loan.objects.filter(customer=customer).count(), 1)
+
+    def test_allocation_locks_the_customer_before_its_loans(self):
+        customer = create_customer()
+        create_loans(customer, 1)
+        payment = Payment.objects.create(external_id='payment-1', customer=customer, total_amount=Decimal('50'))
+
+        with CaptureQueriesContext(connection) as context:
+            payment.update_loans()
+
+        tables = [match.group(1) for query in context.captured_queries
+                  if (match := re.search(r'(?:UPDATE|FROM) "(\w+)"', query['sql']))]
+        self.assertEqual(tables[0], 'payments_customer')
+        self.assertLess(tables.index('payments_customer'), tables.index('payments_loan'))
+
+    def assert_debt_summary_is_consistent(self, customer):
+        customer = Customer.objects.with_computed_debt().get(pk=customer.pk)
+        self.assertEqual((customer.total_debt, customer.active_loans),
+                         (customer.computed_debt, customer.computed_active_loans))
+        self.assertFalse(ledger_mismatches().exists())
+
+    def test_saving_a_stale_loan_keeps_the_debt_summary(self):
+        customer = create_customer()
+        loan = create_loans(customer, 1)[0]
+        stale = Loan.objects.get(pk=loan.pk)
+        Payment.objects.create(external_id='payment-1', customer=customer, total_amount=Decimal('100')).update_loans()
+
+        # Debt fields left out of `update_fields` are taken from the committed row
+        stale.contract_version = 'v2'
+        stale.status = 4
+        stale.save(update_fields=['contract_version', 'status'])
+        self.assertEqual(stale.outstanding, Decimal('0.00'))
+        self.assertEqual(Customer.objects.get(pk=customer.pk).total_debt, Decimal('0.00'))
+        self.assert_debt_summary_is_consistent(customer)
+
+        # A full save of a stale copy is recorded against the committed row
+        stale = Loan.objects.get(pk=loan.pk)
+        stale.status, stale.outstanding = 2, Decimal('100.00')
+        Loan.objects.filter(pk=loan.pk).update(status=4, outstanding=Decimal('0.00'))
+        stale.save()
+        self.assert_debt_summary_is_consistent(customer)
+
+        stale.delete()
+        self.assert_debt_summary_is_consistent(customer)
+
+    def test_queryset_delete_keeps_the_debt_summary(self):
+        customer = create_customer()
+        loans = create_loans(customer, 3)
+
+        Loan.objects.filter(pk__in=[loans[0].pk, loans[1].pk]).delete()
+
+        customer.refresh_from_db()
+        self.assertEqual((customer.total_debt, customer.active_loans), (Decimal('100.00'), 1))
+        self.assert_debt_summary_is_consistent(customer)
+
+    def test_put_applies_the_update_to_the_locked_row(self):
+        from rest_framework.test import APIRequestFactory, force_authenticate
+
+        from payments.views.loan import LoanAPIView
+
+        customer = create_customer()
+        loan = create_loans(customer, 1)[0]
+        Payment.objects.create(external_id='payment-1', customer=customer, total_amount=Decimal('100')).update_loans()
+
+        request = APIRequestFactory().put('/', {'contract_version': 'v2'}, format='json')
+        force_authenticate(request, User.objects.create_user(username='tester'))
+        response = LoanAPIView.as_view()(request, pk=loan.pk)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['status'], response.data['outstanding']), (4, '0.00'))
+        self.assert_debt_summary_is_consistent(customer)
+
+    def test_stress_command_keeps_every_customer_within_its_limit(self):
+        out = StringIO()
+        call_command('stress_loan_origination', customers=[1, 3], threads=1, requests=12,
+                     loans_per_customer=2, stdout=out)
+
+        self.assertIn('accepted=2 rejected=10 errors=0 over_limit=0', out.getvalue())
+        self.assertIn('accepted=6 rejected=6 errors=0 over_limit=0', out.getvalue())
+        self.assertFalse(Customer.objects.exists())
+        self.assertFalse(LoanLedgerEntry.objects.exists())
+        self.assertFalse(Tombstone.objects.exists())
+
+
+@override_settings(ROOT_URLCONF='payments.urls')
+class StatementReconciliationTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.customer = create_customer()
+        self.loans = create_loans(self.customer, 2)
+        Payment.objects.create(external_id='pay-1', customer=self.customer, total_amount=Decimal('50.00'))
+        Payment.objects.create(external_id='pay-2', customer=self.customer, total_amount=Decimal('10.00'))
+
+    def test_lines_are_reconciled_in_batches(self):
+        customer_id = self.customer.external_id
+        loan_id = self.loans[1].external_id
+        rows = iter_csv_rows(SimpleUploadedFile('statement.csv', (
+            'reference,amount,loan_external_id,customer_external_id\n'
+            f'pay-1,50.00,,{customer_id}\n'
+            f'pay-3,30.00,{loan_id},\n'
+            f'pay-3,30.00,{loan_id},\n'
+            f'pay-2,99.00,,{customer_id}\n'
+            f'pay-4,20.00,,{customer_id}\n'
+            f'pay-3,30.00,{loan_id},\n'
+            'pay-5,10.00,unknown,\n'
+            ',10.00,,\n'
+        ).encode()))
+
+        with CaptureQueriesContext(connection) as context:
+            report = StatementReconciler(batch_size=3, max_reported=2).run(rows)
+
+        self.assertEqual(
+            {key: report[key] for key in ('lines', 'matched', 'new', 'duplicate', 'unmatched', 'batches')},
+            {'lines': 8, 'matched': 1, 'new': 2, 'duplicate': 2, 'unmatched': 3, 'batches': 3})
+        self.assertEqual(report['report'], [
+            {'line': 3, 'reference': 'pay-3', 'result': 'duplicate', 'reason': 'Repeats line 2'},
+            {'line': 4, 'reference': 'pay-2', 'result': 'unmatched', 'reason': 'Differs from the recorded payment'},
+        ])
+        self.assertTrue(report['report_truncated'])
+
+        self.loans[1].refresh_from_db()
+        self.assertEqual(self.loans[1].outstanding, Decimal('70.00'))
+        self.assertEqual(Payment.objects.get(external_id='pay-4').details.get().loan, self.loans[0])
+        # Lookups are batched: never one query per line
+        lookups = [query for query in context.captured_queries if 'payments_payment"."external_id" IN' in query['sql']]
+        self.assertLessEqual(len(lookups), 6)
+
+    def test_payments_recorded_by_others_during_the_run_are_matched(self):
+        # Posted through the API after the import started
+        Payment.objects.create(external_id='pay-9', customer=self.customer, total_amount=Decimal('10.00'))
+        Payment.objects.filter(external_id='pay-9').update(created_at=timezone.now() + timedelta(minutes=1))
+        rows = iter_csv_rows(SimpleUploadedFile('statement.csv', (
+            'reference,amount,customer_external_id\n'
+            f'pay-9,10.00,{self.customer.external_id}\n'
+            f'pay-3,20.00,{self.customer.external_id}\n'
+            f'pay-3,20.00,{self.customer.external_id}\n'
+        ).encode()))
+
+        report = StatementReconciler(batch_size=2).run(rows)
+
+        self.assertEqual((report['matched'], report['new'], report['duplicate']), (1, 1, 1))
+        self.assertEqual(report['report'][0]['reason'], 'Payment already imported by this run')
+
+    def test_upload_endpoint_reports_the_reconciliation(self):
+        content = (
+            f'{{"reference": "pay-3", "amount": "25.00", "customer_external_id": "{self.customer.external_id}"}}\n'
+            '{"reference": "pay-4", "amount": "25.00", "loan_external_id": "unknown"}\n'
+        ).encode()
+
+        response = self.client.post(reverse('payment_reconciliation'), {
+            'file': SimpleUploadedFile('statement.jsonl', content)}, format='multipart')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['new'], response.data['unmatched']), (1, 1))
+        self.assertEqual(response.data['report'][0]['reason'], 'Unknown loan')
+        self.assertEqual(Payment.objects.get(external_id='pay-3').status, 1)
+
+    def test_command_writes_the_report(self):
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as directory:
+            statement = f'{directory}/statement.csv'
+            with open(statement, 'w') as output:
+                output.write(f'reference,amount,customer_external_id\npay-1,50.00,{self.customer.external_id}\n')
+            out = StringIO()
+            call_command('reconcile_statement', statement, output=f'{directory}/report.json', stdout=out)
+            with open(f'{directory}/report.json') as report:
+                self.assertEqual(json.load(report)['matched'], 1)
+
+        self.assertIn('1 matched, 0 new', out.getvalue())
+
+
+@override_settings(ROOT_URLCONF='payments.urls')
+class LoanLedgerTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.customer = create_customer()
+        self.loans = create_loans(self.customer, 2)
+
+    def entries(self):
+        return list(LoanLedgerEntry.objects.order_by('pk').values_list('kind', 'loan_id', 'amount', 'balance'))
+
+    def test_allocation_appends_one_entry_per_loan_and_payment(self):
+        first, second = self.loans
+        payment = Payment.objects.create(external_id='payment-1', customer=self.customer, total_amount=Decimal('150'))
+        with CaptureQueriesContext(connection) as queries:
+            payment.update_loans()
+
+        # Both movements are written by one bulk insert
+        self.assertEqual(sum('payments_loanledgerentry' in query['sql'] for query in queries.captured_queries), 1)
+
+        self.assertEqual(self.entries(), [
+            (2, first.pk, Decimal('100.00'), Decimal('100.00')),
+            (2, second.pk, Decimal('100.00'), Decimal('100.00')),
+            (3, first.pk, Decimal('-100.00'), Decimal('0.00')),
+            (3, second.pk, Decimal('-50.00'), Decimal('50.00')),
+        ])
+        self.assertEqual(set(LoanLedgerEntry.objects.filter(kind=3).values_list('payment_id', flat=True)), {payment.pk})
+
+    def test_adjustments_keep_the_ledger_balanced(self):
+        loan = Loan.objects.get(pk=self.loans[0].pk)
+        loan.outstanding = Decimal('80.00')
+        loan.save()
+        Loan.objects.only('id', 'customer_id').get(pk=self.loans[1].pk).save(update_fields=['status'])
+        loan = Loan.objects.only('id', 'customer_id', 'status').get(pk=self.loans[1].pk)
+        loan.outstanding = Decimal('70.00')
+        loan.save(update_fields=['outstanding'])
+
+        self.assertEqual(self.entries()[2:], [
+            (4, self.loans[0].pk, Decimal('-20.00'), Decimal('80.00')),
+            (4, self.loans[1].pk, Decimal('-30.00'), Decimal('70.00')),
+        ])
+        self.assertFalse(ledger_mismatches().exists())
+
+    def test_balances_are_rebuilt_from_the_ledger(self):
+        Loan.objects.filter(pk=self.loans[0].pk).update(outstanding=Decimal('1.00'))
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_loan_balances', verify=True, stdout=StringIO())
+        out = StringIO()
+        call_command('rebuild_loan_balances', stdout=out)
+
+        self.assertIn('Checked 2 loans, 1 rebuilt.', out.getvalue())
+        self.assertEqual(Loan.objects.get(pk=self.loans[0].pk).outstanding, Decimal('100.00'))
+        customer = Customer.objects.with_computed_debt().get(pk=self.customer.pk)
+        self.assertEqual(customer.total_debt, Decimal('200.00'))
+        self.assertEqual(customer.total_debt, customer.computed_debt)
+
+    def test_feed_returns_new_entries_after_the_cursor(self):
+        url = reverse('loan_ledger_feed')
+        response = self.client.get(url, {'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertTrue(response.data['has_more'])
+        self.assertEqual(response.data['results'][0]['kind'], 2)
+        self.assertEqual(response.data['results'][0]['amount'], '100.00')
+
+        response = self.client.get(url, {'after': response.data['next_after']})
+        self.assertEqual([entry['loan'] for entry in response.data['results']], [self.loans[1].pk])
+        self.assertFalse(response.data['has_more'])
+        cursor = response.data['next_after']
+
+        payment = Payment.objects.create(external_id='payment-1', customer=self.customer, total_amount=Decimal('30'))
+        payment.update_loans()
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'after': cursor})
+        self.assertEqual(response.data['results'], [{
+            'id': cursor + 1, 'kind': 3, 'amount': '-30.00', 'balance': '70.00',
+            'created_at': response.data['results'][0]['created_at'],
+            'loan': self.loans[0].pk, 'customer': self.customer.pk, 'payment': payment.pk,
+        }])
+        self.assertEqual(self.client.get(url, {'after': 'x'}).status_code, 400)
+
+    @override_settings(PAYMENTS_SYNC_DELAY=60)
+    def test_feed_holds_back_entries_younger_than_the_delay(self):
+        LoanLedgerEntry.objects.filter(loan=self.loans[0]).update(created_at=timezone.now() - timedelta(minutes=5))
+
+        response = self.client.get(reverse('loan_ledger_feed'))
+
+        self.assertEqual([entry['loan'] for entry in response.data['results']], [self.loans[0].pk])
+        self.assertTrue(response.data['has_more'])
+
+
+@override_settings(ROOT_URLCONF='payments.urls')
+class DeltaSyncTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.customer = create_customer()
+        self.other = create_customer()
+        self.loans = create_loans(self.customer, 3)
+        create_loans(self.other, 1)
+
+    def sync(self, url, since=None, **params):
+        if since is not None:
+            params['updated_since'] = since
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_loans_after_the_cursor(self):
+        url = reverse('loan-list-create')
+        data = self.sync(url, '2000-01-01T00:00:00Z')
+        self.assertEqual(len(data['results']), 4)
+        self.assertEqual(data['deleted'], [])
+        self.assertFalse(data['has_more'])
+
+        paid, deleted = self.loans[0], self.loans[1]
+        deleted_id = deleted.pk
+        paid.status = 4
+        paid.save()
+        deleted.delete()
+
+        data = self.sync(url, sync_cursor=data['sync_cursor'])
+        self.assertEqual([(loan['id'], loan['status']) for loan in data['results']], [(paid.pk, 4)])
+        self.assertEqual([(loan['id'], loan['external_id']) for loan in data['deleted']],
+                         [(deleted_id, deleted.external_id)])
+
+        data = self.sync(url, sync_cursor=data['sync_cursor'])
+        self.assertEqual((data['results'], data['deleted']), ([], []))
+
+    def test_pages_resume_after_rows_sharing_a_timestamp(self):
+        updated_at = timezone.now() - timedelta(minutes=1)
+        Loan.objects.update(updated_at=updated_at)
+        Tombstone.objects.bulk_create(
+            Tombstone(kind=Tombstone.LOAN, object_id=index, external_id=f'gone-{index}',
+                      customer_id=self.customer.pk, deleted_at=updated_at)
+            for index in range(4))
+        url = reverse('loan-list-create')
+
+        first = self.sync(url, '2000-01-01T00:00:00Z', limit=3)
+        second = self.sync(url, sync_cursor=first['sync_cursor'], limit=3)
+
+        self.assertEqual((len(first['results']), len(first['deleted']), first['has_more']), (3, 3, True))
+        self.assertEqual((len(second['results']), len(second['deleted']), second['has_more']), (1, 1, False))
+        self.assertEqual(sorted(loan['id'] for loan in first['results'] + second['results']),
+                         sorted(Loan.objects.values_list('pk', flat=True)))
+        self.assertEqual(sorted(loan['id'] for loan in first['deleted'] + second['deleted']), [0, 1, 2, 3])
+
+    def test_loans_of_one_customer(self):
+        url = reverse('loans_by_customer', args=[self.customer.external_id])
+        sync_cursor = self.sync(url, '2000-01-01T00:00:00+00:00')['sync_cursor']
+        create_loans(self.other, 1, prefix='other')
+        self.other.loans.first().delete()
+        deleted_id = self.loans[2].pk
+        self.loans[2].delete()
+
+        with self.assertNumQueries(3):
+            data = self.sync(url, sync_cursor=sync_cursor)
+
+        self.assertEqual(data['results'], [])
+        self.assertEqual([loan['id'] for loan in data['deleted']], [deleted_id])
+        self.assertEqual(Tombstone.objects.count(), 2)
+
+    def test_payments_of_one_customer(self):
+        url = f'/api/payment/by-customer/{self.customer.external_id}/'
+        kept = Payment.objects.create(external_id='payment-1', customer=self.customer, total_amount=Decimal('50'))
+        deleted = Payment.objects.create(external_id='payment-2', customer=self.customer, total_amount=Decimal('50'))
+        high_water_mark = timezone.now()
+        kept.update_loans()
+        Payment.objects.filter(pk=kept.pk).update(status=2, updated_at=timezone.now())
+        deleted.delete()
+
+        data = self.sync(url, high_water_mark.isoformat())
+
+        self.assertEqual([(payment['external_id'], payment['status']) for payment in data['results']],
+                         [('payment-1', 2)])
+        self.assertEqual(len(data['results'][0]['details']), 1)
+        self.assertEqual([payment['external_id'] for payment in data['deleted']], ['payment-2'])
+
+    @override_settings(PAYMENTS_SYNC_DELAY=60)
+    def test_recent_changes_wait_for_the_delay(self):
+        since = timezone.now() - timedelta(minutes=5)
+        Loan.objects.filter(pk=self.loans[0].pk).update(updated_at=since + timedelta(minutes=1))
+
+        data = self.sync(reverse('loan-list-create'), since.isoformat())
+
+        self.assertEqual([loan['id'] for loan in data['results']], [self.loans[0].pk])
+        self.assertFalse(data['has_more'])
+        with self.settings(PAYMENTS_SYNC_DELAY=0):
+            data = self.sync(reverse('loan-list-create'), sync_cursor=data['sync_cursor'])
+        self.assertEqual(len(data['results']), 3)
+
+    def test_invalid_timestamp_is_rejected(self):
+        response = self.client.get(reverse('loan-list-create'), {'updated_since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('updated_since', response.data)
+
+        response = self.client.get(reverse('loan-list-create'), {'sync_cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sync_cursor', response.data)
@@ -1,7 +1,7 @@
 # payments/urls.py
 from django.urls import path
 
-from payments.views import customer, loan, payment
+from payments.views import analytics, asynchronous, customer, ledger, loan, payment
 
 urlpatterns = [
     # Customers
@@ -20,9 +20,28 @@ urlpatterns = [
     path('api/loans/<str:customer_external_id>/',
          loan.LoansByCustomerAPIView.as_view(), name='loans_by_customer'),
 
+    # Loan balance ledger
+    path('api/ledger/', ledger.LoanLedgerFeedAPIView.as_view(), name='loan_ledger_feed'),
+
     # Payments
     path('api/payment/', payment.PaymentAPIView.as_view(), name='create_payment'),
+    path('api/payment/batch/', payment.PaymentBatchAPIView.as_view(), name='create_payment_batch'),
     path('api/payment/by-customer/<str:customer_external_id>/',
          payment.PaymentAPIView.as_view()),
+    path('api/payment/reconciliation/', payment.PaymentReconciliationAPIView.as_view(),
+         name='payment_reconciliation'),
+    path('api/payment/<str:external_id>/status/', payment.PaymentStatusAPIView.as_view(),
+         name='payment_status'),
+
+    # Analytics
+    path('api/analytics/portfolio/', analytics.PortfolioAnalyticsAPIView.as_view(),
+         name='portfolio_analytics'),
 
+    # Async read endpoints, served natively under ASGI
+    path('api/async/customers/', asynchronous.customer_list, name='async_customer_list'),
+    path('api/async/customers/balance/', asynchronous.customer_balance, name='async_customer_balance'),
+    path('api/async/loans/<str:customer_external_id>/', asynchronous.loans_by_customer,
+         name='async_loans_by_customer'),
+    path('api/async/payment/by-customer/<str:customer_external_id>/', asynchronous.payments_by_customer,
+         name='async_payments_by_customer'),
 ]
@@ -0,0 +1,43 @@
+# payments/views/analytics.py
+from rest_framework.decorators import (authentication_classes,
+                                       permission_classes)
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from payments.authentication import API_AUTHENTICATION_CLASSES
+from payments.services.analytics import MAX_TOP, portfolio_report
+
+
+@authentication_classes(API_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+class PortfolioAnalyticsAPIView(APIView):
+    """
+    API endpoint for portfolio risk reports.
+
+    Methods:
+        get: Retrieve the portfolio report.
+    """
+
+    def get(self, request, format=None):
+        """
+        Retrieve outstanding by status, aging buckets, utilization distribution and the
+        most exposed customers of the whole portfolio.
+
+        The report is computed with vectorized aggregates over all loans and cached until
+        the next loan, payment or customer write.
+
+        Parameters:
+            request: HTTP request. Accepts an optional `top` query parameter (1-100, default 10).
+            format: Format suffix.
+
+        Returns:
+            Response: HTTP response with the report.
+        """
+        try:
+            top = min(max(int(request.query_params.get('top', 10)), 1), MAX_TOP)
+        except ValueError:
+            top = 10
+
+        report = portfolio_report()
+        return Response({**report, 'top_exposed': report['top_exposed'][:top]})
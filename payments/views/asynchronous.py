@@ -0,0 +1,160 @@
+# payments/views/asynchronous.py
+from collections import defaultdict
+from functools import wraps
+
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.authentication import \
+    JWTStatelessUserAuthentication
+
+from payments.models import Customer, Loan, Payment, PaymentDetail
+from payments.pagination import KeysetPagination
+from payments.serializers.customer import (CustomerBalanceSerializer,
+                                           CustomerSerializer)
+from payments.serializers.loan import LoanSerializer
+from payments.serializers.payment import (PaymentDetailSerializer,
+                                          PaymentSerializer)
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    return JsonResponse(data, encoder=JSONEncoder, safe=False, status=status_code)
+
+
+def jwt_required(view):
+    """
+    Authenticate an async view with a stateless JWT access token.
+
+    The token is verified in process, so authentication never blocks on the database.
+    Legacy `Token` keys are not accepted on the async endpoints.
+    """
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            result = JWTStatelessUserAuthentication().authenticate(request)
+        except AuthenticationFailed as exc:
+            return json_response({'detail': exc.detail}, status.HTTP_401_UNAUTHORIZED)
+        if result is None:
+            return json_response({'detail': 'Authentication credentials were not provided.'},
+                                 status.HTTP_401_UNAUTHORIZED)
+        request.user, request.auth = result
+
+        try:
+            return await view(Request(request), *args, **kwargs)
+        except APIException as exc:
+            return json_response({'detail': exc.detail}, exc.status_code)
+
+    return wrapper
+
+
+async def get_customer(customer_external_id):
+    try:
+        return await Customer.objects.filter(external_id=customer_external_id).afirst()
+    except ValidationError:
+        return None
+
+
+@jwt_required
+async def loans_by_customer(request, customer_external_id):
+    """
+    Retrieve loans associated with a specific customer, with the async ORM.
+
+    Parameters:
+        request: HTTP request.
+        customer_external_id: External ID of the customer.
+
+    Returns:
+        JsonResponse: The customer's loans, or 404 if the customer is not found.
+    """
+    customer = await get_customer(customer_external_id)
+    if not customer:
+        return json_response({'error': 'Customer not found'}, status.HTTP_404_NOT_FOUND)
+
+    loans = [loan async for loan in Loan.objects.filter(customer=customer)]
+    return json_response(LoanSerializer(loans, many=True).data)
+
+
+@jwt_required
+async def payments_by_customer(request, customer_external_id):
+    """
+    Retrieve a keyset-paginated list of a customer's payments, with the async ORM.
+
+    Payment details are fetched for the whole page with one extra query.
+
+    Parameters:
+        request: HTTP request.
+        customer_external_id: External ID of the customer.
+
+    Returns:
+        JsonResponse: The page of payments.
+    """
+    try:
+        payments = Payment.objects.filter(customer__external_id=customer_external_id)
+    except ValidationError:
+        return json_response({'error': 'Invalid customer external ID'}, status.HTTP_400_BAD_REQUEST)
+
+    paginator = KeysetPagination()
+    payments = await paginator.apaginate_queryset(payments, request)
+
+    details = defaultdict(list)
+    detail_amount = PaymentDetailSerializer().fields['amount']
+    async for payment_id, amount in PaymentDetail.objects.filter(
+            payment__in=[payment.pk for payment in payments]).order_by('id').values_list('payment_id', 'amount'):
+        details[payment_id].append({'amount': detail_amount.to_representation(amount)})
+
+    fields = PaymentSerializer().fields
+    results = [
+        {
+            'external_id': fields['external_id'].to_representation(payment.external_id),
+            'total_amount': fields['total_amount'].to_representation(payment.total_amount),
+            'status': fields['status'].to_representation(payment.status),
+            'details': details[payment.pk],
+        }
+        for payment in payments
+    ]
+    return json_response(paginator.get_paginated_data(results))
+
+
+@jwt_required
+async def customer_list(request):
+    """
+    Retrieve a keyset-paginated list of customers, with the async ORM.
+
+    Parameters:
+        request: HTTP request.
+
+    Returns:
+        JsonResponse: The page of customers.
+    """
+    paginator = KeysetPagination()
+    customers = await paginator.apaginate_queryset(Customer.objects.all(), request)
+    return json_response(paginator.get_paginated_data(CustomerSerializer(customers, many=True).data))
+
+
+@jwt_required
+async def customer_balance(request):
+    """
+    Retrieve a keyset-paginated balance report of all customers, or of a single one, with the async ORM.
+
+    Parameters:
+        request: HTTP request. Accepts an optional `customer_external_id` query parameter.
+
+    Returns:
+        JsonResponse: The page of customer balances.
+    """
+    customers = Customer.objects.with_balance()
+
+    customer_external_id = request.query_params.get('customer_external_id')
+    if customer_external_id:
+        try:
+            customers = customers.filter(external_id=customer_external_id)
+        except ValidationError:
+            return json_response({'error': 'Invalid customer external ID'}, status.HTTP_400_BAD_REQUEST)
+
+    paginator = KeysetPagination()
+    page = await paginator.apaginate_queryset(customers, request)
+    return json_response(paginator.get_paginated_data(CustomerBalanceSerializer(page, many=True).data))
@@ -1,19 +1,28 @@
-from django.db.models import Sum
+from django.core.exceptions import ValidationError
 from rest_framework import status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import (authentication_classes,
                                        permission_classes)
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from payments.authentication import API_AUTHENTICATION_CLASSES
+from payments.cache import cached_customer_data
+from payments.conditional import ConditionalGet
 from payments.models.customer import Customer
+from payments.pagination import get_list_paginator
 from payments.serializers.customer import (CustomerBalanceSerializer,
                                            CustomerSerializer)
+from payments.serializers.fast import FastListSerializer
+from payments.services.customer_upload import (ROW_READERS, CustomerUploader,
+                                               detect_format)
 
+customer_list_serializer = FastListSerializer(CustomerSerializer)
 
-@authentication_classes([TokenAuthentication])
+
+@authentication_classes(API_AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
 class CustomerAPIView(APIView):
     """
@@ -47,6 +56,11 @@ class CustomerAPIView(APIView):
         """
         Retrieve all customers with pagination.
 
+        Page-number pagination is the default; `pagination=cursor` switches to keyset
+        pagination ordered by (`created_at`, `id`), which skips the count query and keeps
+        deep pages as cheap as the first one. Rows are read with `values()` and rendered by
+        the fast list serializer.
+
         Parameters:
             request: HTTP request.
             format: Format suffix.
@@ -55,12 +69,10 @@ class CustomerAPIView(APIView):
             Response: Paginated HTTP response with customer data.
         """
 
-        paginator = PageNumberPagination()
-        paginator.page_size = 10
-        customers = Customer.objects.all()
+        paginator = get_list_paginator(request)
+        customers = customer_list_serializer.values(Customer.objects.order_by('created_at', 'id'), 'created_at', 'pk')
         result_page = paginator.paginate_queryset(customers, request)
-        serializer = CustomerSerializer(result_page, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        return paginator.get_paginated_response(customer_list_serializer.serialize(result_page))
 
     def get_balance(self, customer):
         """
@@ -73,28 +85,56 @@ class CustomerAPIView(APIView):
             dict: A dictionary with total debt and available amount.
         """
 
-        total_debt = customer.loans.filter(status__in=['pending', 'active']).aggregate(
-            total_debt=Sum('outstanding'))['total_debt'] or 0
-        available_amount = customer.score - total_debt
+        available_amount = customer.score - customer.total_debt
         return {
-            'total_debt': total_debt,
+            'total_debt': customer.total_debt,
             'available_amount': available_amount
         }
 
 
-@authentication_classes([TokenAuthentication])
+@authentication_classes(API_AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
 class CustomerUploadAPIView(APIView):
     """
-    API endpoint for uploading customer data.
+    API endpoint for uploading customer data in bulk.
 
     Methods:
-        pass: Currently not implemented.
+        post: Create customers from a CSV or JSONL file.
     """
-    pass
 
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, format=None):
+        """
+        Create customers from an uploaded CSV or JSONL file.
+
+        The file is parsed incrementally, each row is validated with the `CustomerSerializer`
+        rules and valid rows are inserted with batched bulk inserts.
 
-@authentication_classes([TokenAuthentication])
+        Parameters:
+            request: HTTP request with the file in the `file` field. The format is taken from
+                the optional `format` field (`csv` or `jsonl`) or from the file extension.
+            format: Format suffix.
+
+        Returns:
+            Response: HTTP response with the per-row error report and throughput stats.
+        """
+
+        uploaded_file = request.FILES.get('file')
+        if not uploaded_file:
+            return Response({'error': 'File not provided'}, status=status.HTTP_400_BAD_REQUEST)
+
+        upload_format = detect_format(uploaded_file, request.data.get('format'))
+        if not upload_format:
+            return Response({'error': 'Unsupported file format, use csv or jsonl'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        report = CustomerUploader().run(ROW_READERS[upload_format](uploaded_file))
+        response_status = status.HTTP_201_CREATED if report['created'] else status.HTTP_400_BAD_REQUEST
+        return Response(report, status=response_status)
+
+
+@authentication_classes(API_AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
 class CustomerBalanceAPIView(APIView):
     """
@@ -106,16 +146,49 @@ class CustomerBalanceAPIView(APIView):
 
     def get(self, request, format=None):
         """
-        Retrieve the balance of all customers.
+        Retrieve the balance of all customers, or of a single one, with pagination.
+
+        Total debt is read from the customer's maintained debt summary and the available
+        amount is computed in SQL, so a page costs one query plus the pagination count.
+
+        Responses carry `ETag` and `Last-Modified` validators computed from the matching
+        customers' count and newest `updated_at` / `debt_updated_at`; a conditional
+        request whose validators still match gets a 304 without the page being built.
+        The balance of a single customer is served from the per-customer cache when possible.
 
         Parameters:
-            request: HTTP request.
+            request: HTTP request. Accepts an optional `customer_external_id` query parameter.
             format: Format suffix.
 
         Returns:
-            Response: HTTP response with customer balance data.
+            Response: Paginated HTTP response with customer balance data, or 304 if unchanged.
         """
 
-        customers = Customer.objects.all()
-        serializer = CustomerBalanceSerializer(customers, many=True)
-        return Response(serializer.data)
+        customers = Customer.objects.with_balance().order_by('id')
+
+        customer_external_id = request.query_params.get('customer_external_id')
+        if customer_external_id:
+            try:
+                customers = customers.filter(external_id=customer_external_id)
+            except ValidationError:
+                return Response({'error': 'Invalid customer external ID'}, status=status.HTTP_400_BAD_REQUEST)
+
+        conditional = ConditionalGet(request, customers, ('updated_at', 'debt_updated_at'))
+        not_modified = conditional.not_modified()
+        if not_modified:
+            return not_modified
+
+        def build_page():
+            paginator = PageNumberPagination()
+            paginator.page_size = 10
+            paginator.page_size_query_param = 'page_size'
+            paginator.max_page_size = 1000
+            result_page = paginator.paginate_queryset(customers, request)
+            serializer = CustomerBalanceSerializer(result_page, many=True)
+            return paginator.get_paginated_response(serializer.data).data
+
+        if customer_external_id:
+            data = cached_customer_data('balance', customer_external_id, request, conditional, build_page)
+        else:
+            data = build_page()
+        return conditional.apply(Response(data))
@@ -0,0 +1,54 @@
+# payments/views/ledger.py
+from rest_framework import status
+from rest_framework.decorators import (authentication_classes,
+                                       permission_classes)
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from payments.authentication import API_AUTHENTICATION_CLASSES
+from payments.serializers.fast import FastListSerializer
+from payments.serializers.ledger import LoanLedgerEntrySerializer
+from payments.services.ledger import FEED_LIMIT, MAX_FEED_LIMIT, ledger_feed
+
+entry_list_serializer = FastListSerializer(LoanLedgerEntrySerializer)
+
+
+@authentication_classes(API_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+class LoanLedgerFeedAPIView(APIView):
+    """
+    API endpoint for the change feed of loan balances.
+
+    Methods:
+        get: Retrieve the ledger entries written after a given entry.
+    """
+
+    def get(self, request, format=None):
+        """
+        Retrieve the ledger entries that follow the entry `after`, in id order.
+
+        Consumers keep the `next_after` of each response and send it back as `after`, so a
+        sync reads only the balance movements written since the previous one. The page is
+        a primary key range scan, whatever the size of the ledger.
+
+        Parameters:
+            request: HTTP request. Accepts `after` (default 0) and `limit` (1-5000, default
+                500) query parameters.
+            format: Format suffix.
+
+        Returns:
+            Response: HTTP response with the entries, `next_after` and `has_more`.
+        """
+        try:
+            after = max(int(request.query_params.get('after', 0)), 0)
+            limit = min(max(int(request.query_params.get('limit', FEED_LIMIT)), 1), MAX_FEED_LIMIT)
+        except ValueError:
+            return Response({'error': 'after and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows, has_more = ledger_feed(after, limit, entry_list_serializer.sources)
+        return Response({
+            'results': entry_list_serializer.serialize(rows),
+            'next_after': rows[-1]['id'] if rows else after,
+            'has_more': has_more,
+        })
@@ -1,20 +1,47 @@
 # views/loan.py
-from django.db.models import Sum
+from django.db import transaction
 from django.utils import timezone
 from rest_framework import status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import (authentication_classes,
                                        permission_classes)
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from payments.authentication import API_AUTHENTICATION_CLASSES
+from payments.cache import cached_customer_data
+from payments.conditional import ConditionalGet
 from payments.models.customer import Customer
 from payments.models.loan import Loan
+from payments.models.tombstone import Tombstone
+from payments.serializers.fast import FastListSerializer
 from payments.serializers.loan import LoanSerializer
+from payments.services.locking import lock_customer
+from payments.services.origination import originate_loan
+from payments.streaming import EXPORT_CONTENT_TYPES, streaming_export
+from payments.sync import DeltaSync
 
+loan_list_serializer = FastListSerializer(LoanSerializer)
 
-@authentication_classes([TokenAuthentication])
+
+def export_loans(loans, export_format):
+    """
+    Stream loans as a JSON array or NDJSON, ordered by primary key.
+
+    Parameters:
+        loans: Loan queryset to export.
+        export_format: Requested export format.
+
+    Returns:
+        HttpResponse: Streaming response, or a 400 response for an unknown format.
+    """
+    if export_format not in EXPORT_CONTENT_TYPES:
+        return Response({'error': 'Unsupported export format, use json or ndjson'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    return streaming_export(loans.order_by('id'), LoanSerializer, export_format)
+
+
+@authentication_classes(API_AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
 class LoanAPIView(APIView):
     """
@@ -30,6 +57,9 @@ class LoanAPIView(APIView):
         """
         Create a new loan.
 
+        The credit limit is checked and the loan saved under the customer's row lock, so
+        concurrent requests for one customer cannot exceed the limit together.
+
         Parameters:
             request: HTTP request.
             format: Format suffix.
@@ -43,15 +73,11 @@ class LoanAPIView(APIView):
 
         serializer = LoanSerializer(data=request.data)
         if serializer.is_valid():
-            customer = serializer.validated_data['customer']
-            total_debt = customer.loans.filter(status__in=[1, 2]).aggregate(
-                Sum('outstanding'))['outstanding__sum'] or 0
-            if total_debt + serializer.validated_data['amount'] > customer.score:
+            loan = originate_loan(serializer)
+            if loan is None:
                 return Response({'error': 'Loan amount exceeds customer\'s credit limit'}, status=status.HTTP_400_BAD_REQUEST)
 
-            serializer.save()
-
-            customer_external_id = customer.external_id
+            customer_external_id = loan.customer.external_id
 
             response_data = serializer.data
             response_data['customer_external_id'] = customer_external_id
@@ -63,22 +89,42 @@ class LoanAPIView(APIView):
         """
         Retrieve all loans.
 
+        Loans are read with `values()` and rendered by the fast list serializer, which
+        produces the `LoanSerializer` representation without building model instances.
+        With `export=json` or `export=ndjson` the loans are streamed in chunks instead of
+        being materialized in one response body. With `updated_since=<timestamp>` only a
+        page of the loans changed and deleted since then is returned, with `has_more` and
+        the `sync_cursor` to send on the next call.
+
         Parameters:
             request: HTTP request.
             format: Format suffix.
 
         Returns:
-            Response: HTTP response.
+            Response: HTTP response, or a streaming response in export mode.
         """
 
         loans = Loan.objects.all()
-        serializer = LoanSerializer(loans, many=True)
-        return Response(serializer.data)
+
+        delta = DeltaSync(request)
+        if delta.requested:
+            return Response(delta.data(
+                loan_list_serializer.serialize(delta.changed(loan_list_serializer.values(loans, 'updated_at', 'id'))),
+                delta.deleted(Tombstone.LOAN)))
+
+        export_format = request.query_params.get('export')
+        if export_format:
+            return export_loans(loans, export_format)
+
+        return Response(loan_list_serializer.serialize(loan_list_serializer.values(loans)))
 
     def put(self, request, pk, format=None):
         """
         Update an existing loan.
 
+        The loan is re-read under its customer's row lock and its own, so the update is
+        applied to the committed row, not to one a concurrent payment has since changed.
+
         Parameters:
             request: HTTP request.
             pk: Loan primary key.
@@ -91,19 +137,24 @@ class LoanAPIView(APIView):
             Response: HTTP response if loan is not found or if validation fails.
         """
 
-        try:
-            loan = Loan.objects.get(pk=pk)
-        except Loan.DoesNotExist:
-            return Response({'error': 'Loan not found'}, status=status.HTTP_404_NOT_FOUND)
-
-        serializer = LoanSerializer(loan, data=request.data, partial=True)
-        if serializer.is_valid():
-            updated_loan = serializer.save()
-            return Response(LoanSerializer(updated_loan).data, status=status.HTTP_200_OK)
+        with transaction.atomic():
+            customer_id = Loan.objects.filter(pk=pk).values_list('customer_id', flat=True).first()
+            if customer_id is None:
+                return Response({'error': 'Loan not found'}, status=status.HTTP_404_NOT_FOUND)
+            # Lock order: the customer before its loans
+            lock_customer(customer_id)
+            loan = Loan.objects.select_for_update().filter(pk=pk).first()
+            if loan is None:
+                return Response({'error': 'Loan not found'}, status=status.HTTP_404_NOT_FOUND)
+
+            serializer = LoanSerializer(loan, data=request.data, partial=True)
+            if serializer.is_valid():
+                updated_loan = serializer.save()
+                return Response(LoanSerializer(updated_loan).data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-@authentication_classes([TokenAuthentication])
+@authentication_classes(API_AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
 class LoansByCustomerAPIView(APIView):
     """
@@ -117,13 +168,23 @@ class LoansByCustomerAPIView(APIView):
         """
         Retrieve loans associated with a specific customer.
 
+        With `export=json` or `export=ndjson` the loans are streamed in chunks instead of
+        being materialized in one response body. With `updated_since=<timestamp>` only the
+        customer's loans changed and deleted since then are returned, a page at a time and
+        uncached, with `has_more` and the `sync_cursor` to send on the next call.
+
+        Responses carry `ETag` and `Last-Modified` validators computed from the customer's
+        loan count and newest `updated_at`; a conditional request whose validators still
+        match gets a 304 without the loans being loaded. Other reads are served from the
+        per-customer cache when possible.
+
         Parameters:
             request: HTTP request.
             customer_external_id: External ID of the customer.
             format: Format suffix.
 
         Returns:
-            Response: HTTP response.
+            Response: HTTP response, a streaming response in export mode, or 304 if unchanged.
 
         Raises:
             Response: HTTP response if customer is not found.
@@ -136,9 +197,26 @@ class LoansByCustomerAPIView(APIView):
 
         loans = Loan.objects.filter(customer=customer)
 
-        serializer = LoanSerializer(loans, many=True)
+        delta = DeltaSync(request)
+        if delta.requested:
+            return Response(delta.data(
+                loan_list_serializer.serialize(delta.changed(loan_list_serializer.values(loans, 'updated_at', 'id'))),
+                delta.deleted(Tombstone.LOAN, customer_id=customer.pk)))
+
+        conditional = ConditionalGet(request, loans)
+        not_modified = conditional.not_modified()
+        if not_modified:
+            return not_modified
+
+        export_format = request.query_params.get('export')
+        if export_format:
+            return conditional.apply(export_loans(loans, export_format))
+
+        data = cached_customer_data(
+            'loans', customer.external_id, request, conditional,
+            lambda: loan_list_serializer.serialize(loan_list_serializer.values(loans)))
 
-        return Response(serializer.data)
+        return conditional.apply(Response(data))
 
 
 class ActivateLoanAPIView(APIView):
@@ -1,17 +1,30 @@
+from django.conf import settings
+from django.urls import reverse
 from rest_framework import status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import (authentication_classes,
                                        permission_classes)
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from payments.models import Payment
+from payments.authentication import API_AUTHENTICATION_CLASSES
+from payments.cache import cached_customer_data
+from payments.conditional import ConditionalGet
+from payments.models import Customer, Payment, Tombstone
+from payments.pagination import get_list_paginator
+from payments.serializers.fast import FastListSerializer
 from payments.serializers.payment import PaymentSerializer
+from payments.services.customer_upload import ROW_READERS, detect_format
+from payments.services.payment_batch import (MAX_BATCH_SIZE,
+                                             PaymentBatchProcessor)
+from payments.services.reconciliation import StatementReconciler
+from payments.sync import DeltaSync
 
+payment_list_serializer = FastListSerializer(PaymentSerializer)
 
-@authentication_classes([TokenAuthentication])
+
+@authentication_classes(API_AUTHENTICATION_CLASSES)
 @permission_classes([IsAuthenticated])
 class PaymentAPIView(APIView):
     """
@@ -28,6 +41,12 @@ class PaymentAPIView(APIView):
         """
         Create a new payment.
 
+        The payment is allocated within the request, unless asynchronous processing is
+        requested with `Prefer: respond-async` or enabled for every payment with the
+        `PAYMENTS_ASYNC_PROCESSING` setting. In that case the payment is stored as pending
+        and answered with 202 and the URL of its status; the `process_payments` worker
+        allocates it.
+
         Parameters:
         - request: HttpRequest object.
         - format: Format of the request.
@@ -35,33 +54,192 @@ class PaymentAPIView(APIView):
         Returns:
         - HTTP response with the operation status.
         """
-        serializer = PaymentSerializer(data=request.data)
+        defer = wants_async_processing(request)
+        serializer = PaymentSerializer(data=request.data, context={'defer_allocation': defer})
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            payment = serializer.save()
+            if not defer:
+                return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+            status_url = request.build_absolute_uri(reverse('payment_status', args=[payment.external_id]))
+            return Response(
+                {**serializer.data, 'status_url': status_url}, status=status.HTTP_202_ACCEPTED,
+                headers={'Location': status_url, 'Preference-Applied': 'respond-async'})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def get(self, request, customer_external_id, format=None):
         """
         Get a paginated list of payments associated with an external customer.
 
+        Responses carry `ETag` and `Last-Modified` validators computed from the count and
+        newest `updated_at` of the customer's payments and payment details; a conditional
+        request whose validators still match gets a 304 without the page being built. Other reads are served from
+        the per-customer cache when possible.
+
+        With `updated_since=<timestamp>` only the payments changed and deleted since then
+        are returned, a page at a time and uncached, with `has_more` and the `sync_cursor`
+        to send on the next call.
+
         Parameters:
         - request: HttpRequest object.
         - customer_external_id: External ID of the customer.
         - format: Format of the request.
 
         Returns:
-        - HTTP response with the paginated list of payments.
+        - HTTP response with the paginated list of payments, or 304 if unchanged.
         """
         # Get payments associated with the external customer
         payments = Payment.objects.filter(
-            customer__external_id=customer_external_id)
+            customer__external_id=customer_external_id).order_by('created_at', 'id')
+
+        delta = DeltaSync(request)
+        if delta.requested:
+            customers = Customer.objects.filter(external_id=customer_external_id).values('pk')
+            return Response(delta.data(
+                payment_list_serializer.serialize(
+                    delta.changed(payment_list_serializer.values(payments, 'updated_at', 'id'))),
+                delta.deleted(Tombstone.PAYMENT, customer_id__in=customers)))
+
+        # The page renders each payment's details, so they feed the validators too
+        conditional = ConditionalGet(
+            request, payments, ('updated_at', 'details__updated_at'), ('pk', 'details'))
+        not_modified = conditional.not_modified()
+        if not_modified:
+            return not_modified
+
+        def build_page():
+            # Paginate the results, by page number or by cursor with `pagination=cursor`
+            paginator = get_list_paginator(request)
+
+            paginated_payments = paginator.paginate_queryset(
+                payment_list_serializer.values(payments, 'created_at', 'pk'), request)
+            return paginator.get_paginated_response(payment_list_serializer.serialize(paginated_payments)).data
+
+        data = cached_customer_data('payments', customer_external_id, request, conditional, build_page)
+        return conditional.apply(Response(data))
+
+
+def wants_async_processing(request):
+    if getattr(settings, 'PAYMENTS_ASYNC_PROCESSING', False):
+        return True
+    preferences = request.headers.get('Prefer', '')
+    return 'respond-async' in (preference.strip() for preference in preferences.split(','))
+
+
+@authentication_classes(API_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+class PaymentStatusAPIView(APIView):
+    """
+    View to poll the processing status of a payment.
+
+    Supported methods:
+    - GET: Get the status of a payment.
+
+    Requires authentication and token permissions.
+    """
+
+    def get(self, request, external_id, format=None):
+        """
+        Get the status of a payment: pending, completed or rejected.
+
+        Parameters:
+        - request: HttpRequest object.
+        - external_id: External ID of the payment.
+        - format: Format of the request.
+
+        Returns:
+        - HTTP response with the payment and its status label, or 404 if it does not exist.
+        """
+        payment = Payment.objects.prefetch_related('details').filter(external_id=external_id).first()
+        if not payment:
+            return Response({'error': 'Payment not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({
+            **PaymentSerializer(payment).data,
+            'state': payment.get_status_display(),
+            'paid_at': payment.paid_at,
+        })
+
+
+@authentication_classes(API_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+class PaymentBatchAPIView(APIView):
+    """
+    View to handle the submission of payments in batches.
 
-        # Paginate the results
-        paginator = PageNumberPagination()
-        paginator.page_size = 10  # You can adjust this as per your needs
+    Supported methods:
+    - POST: Create and allocate a list of payments.
+
+    Requires authentication and token permissions.
+    """
+
+    def post(self, request, format=None):
+        """
+        Create and allocate a list of payments.
+
+        Customers and loans are preloaded for the whole batch and the payments of each
+        customer are applied in a single transaction.
+
+        Parameters:
+        - request: HttpRequest object whose body is a list of payments.
+        - format: Format of the request.
+
+        Returns:
+        - HTTP response with one result per payment, in input order.
+        """
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'Expected a non-empty list of payments'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > MAX_BATCH_SIZE:
+            return Response({'error': f'A batch accepts at most {MAX_BATCH_SIZE} payments'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        results = PaymentBatchProcessor().process(items)
+        return Response({
+            'created': sum(result['result'] == 'created' for result in results),
+            'rejected': sum(result['result'] == 'rejected' for result in results),
+            'invalid': sum(result['result'] == 'invalid' for result in results),
+            'results': results,
+        }, status=status.HTTP_200_OK)
+
+
+@authentication_classes(API_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated])
+class PaymentReconciliationAPIView(APIView):
+    """
+    View to reconcile a bank statement with the recorded payments.
+
+    Supported methods:
+    - POST: Upload a CSV or JSONL statement file.
+
+    Requires authentication and token permissions.
+    """
+
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, format=None):
+        """
+        Match the statement lines against the payments and create the missing ones.
+
+        The file is read incrementally and reconciled in batches; see
+        `StatementReconciler` for the line format and the report categories.
+
+        Parameters:
+        - request: HttpRequest object with the file in the `file` field. The format is taken
+          from the optional `format` field (`csv` or `jsonl`) or from the file extension.
+        - format: Format of the request.
+
+        Returns:
+        - HTTP response with the reconciliation report.
+        """
+        uploaded_file = request.FILES.get('file')
+        if not uploaded_file:
+            return Response({'error': 'File not provided'}, status=status.HTTP_400_BAD_REQUEST)
 
-        paginated_payments = paginator.paginate_queryset(payments, request)
-        serializer = PaymentSerializer(paginated_payments, many=True)
+        statement_format = detect_format(uploaded_file, request.data.get('format'))
+        if not statement_format:
+            return Response({'error': 'Unsupported file format, use csv or jsonl'},
+                            status=status.HTTP_400_BAD_REQUEST)
 
-        return paginator.get_paginated_response(serializer.data)
+        report = StatementReconciler().run(ROW_READERS[statement_format](uploaded_file))
+        return Response(report, status=status.HTTP_200_OK)